@@ -7,15 +7,68 @@
   - Collegare VCC e GND del sensore SHT11 rispettivamente ai pin 5V e GND della scheda Arduino.
   - Caricare questo sketch sulla scheda Arduino.
   - Aprire il monitor seriale per visualizzare i valori della temperatura letti dal sensore.
+
+  Protocollo binario (opzionale):
+  - Impostando BINARY_PROTOCOL a 1 lo sketch invia, al posto della linea di testo (~90 byte),
+    un frame compatto di 23 byte: SYNC (0xA5), LEN (20), 5 float32, CRC-8 (polinomio 0x07).
+  - Sul lato Python impostare "SERIAL_FORMAT" a "binary" (o "auto") in parameters.json.
+    Il formato è descritto in "Codici Python/ReadArduinoSensorData/binary_protocol.py".
+
+  Modalità grezza (opzionale):
+  - Impostando RAW_ONLY a 1 lo sketch invia solo umidità e temperatura in °C
+    ("Humidity: 45.00%,  Temperature: 23.00°C", circa 40 byte, oppure un frame binario di 11 byte).
+  - °F e indice di calore vengono calcolati sul PC con le stesse formule della libreria DHT
+    ("Codici Python/ReadArduinoSensorData/derived.py"): meno byte sulla seriale per campione,
+    quindi più campioni al secondo alla stessa velocità della porta.
 */
 
 #include <DHT.h>  // Include la libreria DHT per gestire il sensore DHT11
 
 #define DHTPIN 2       // Definisce il pin usato per connettere il sensore, in questo caso il pin digitale 2
 #define DHTTYPE DHT11  // Definisce il tipo di sensore, in questo caso DHT11
+#define BINARY_PROTOCOL 0  // 0 = linea di testo leggibile, 1 = frame binario compatto
+#define RAW_ONLY 0  // 0 = invia tutti i valori, 1 = solo umidità e °C (il resto è calcolato sul PC)
+
+#define FRAME_SYNC 0xA5  // Byte di sincronizzazione all'inizio di ogni frame
+#define FRAME_PAYLOAD_SIZE 20  // Cinque valori float da 4 byte
+#define RAW_FRAME_PAYLOAD_SIZE 8  // Due valori float da 4 byte (modalità grezza)
 
 DHT dht(DHTPIN, DHTTYPE);  // Crea un oggetto DHT usando il pin e il tipo di sensore definiti
 
+// Calcola il CRC-8 (polinomio 0x07) di una sequenza di byte
+uint8_t crc8(const uint8_t *data, uint8_t len) {
+  uint8_t crc = 0;  // Valore iniziale
+  for (uint8_t i = 0; i < len; i++) {
+    crc ^= data[i];  // Combina il byte corrente
+    for (uint8_t bit = 0; bit < 8; bit++) {  // Elabora gli 8 bit
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+// Invia le cinque letture come frame binario: SYNC | LEN | 5 float | CRC
+void sendBinaryFrame(float h, float t, float f, float hic, float hif) {
+  uint8_t body[1 + FRAME_PAYLOAD_SIZE];  // LEN + dati
+  float values[5] = {h, t, f, hic, hif};  // Stesso ordine della linea di testo
+  body[0] = FRAME_PAYLOAD_SIZE;  // Lunghezza dei dati
+  memcpy(body + 1, values, FRAME_PAYLOAD_SIZE);  // Float little-endian a 32 bit (formato nativo di Arduino)
+  Serial.write(FRAME_SYNC);  // Inizio del frame
+  Serial.write(body, sizeof(body));  // Lunghezza e dati
+  Serial.write(crc8(body, sizeof(body)));  // Codice di controllo
+}
+
+// Invia umidità e °C come frame binario: SYNC | LEN (8) | 2 float | CRC
+void sendRawFrame(float h, float t) {
+  uint8_t body[1 + RAW_FRAME_PAYLOAD_SIZE];  // LEN + dati
+  float values[2] = {h, t};
+  body[0] = RAW_FRAME_PAYLOAD_SIZE;  // Lunghezza dei dati
+  memcpy(body + 1, values, RAW_FRAME_PAYLOAD_SIZE);
+  Serial.write(FRAME_SYNC);
+  Serial.write(body, sizeof(body));
+  Serial.write(crc8(body, sizeof(body)));
+}
+
 void setup() {
   Serial.begin(9600);  // Inizializza la comunicazione seriale a una velocità di 9600 baud
   //Serial.println(F("Test DHT11!"));  // Stampa una stringa di testo per indicare che il test del sensore DHT11 è iniziato
@@ -28,6 +81,25 @@ void loop() {
 
   float h = dht.readHumidity();  // Legge l'umidità dal sensore e la memorizza nella variabile h
   float t = dht.readTemperature();  // Legge la temperatura in gradi Celsius e la memorizza nella variabile t
+
+#if RAW_ONLY
+  if (isnan(h) || isnan(t)) {  // Controlla se le letture sono fallite (ritornano NaN)
+    Serial.println(F("Lettura dal sensore DHT fallita!"));
+    return;
+  }
+#if BINARY_PROTOCOL
+  sendRawFrame(h, t);  // Frame binario di 11 byte
+#else
+  Serial.print(F("Humidity: "));
+  Serial.print(h);
+  Serial.print(F("%,  Temperature: "));
+  Serial.print(t);
+  Serial.println(F("°C"));
+#endif
+  delay(1000);  // Aspetta un secondo prima della prossima iterazione del loop
+  return;  // °F e indice di calore vengono calcolati sul PC
+#endif
+
   float f = dht.readTemperature(true);  // Legge la temperatura in gradi Fahrenheit e la memorizza nella variabile f
 
   if (isnan(h) || isnan(t) || isnan(f)) {  // Controlla se le letture sono fallite (ritornano NaN)
@@ -38,6 +110,10 @@ void loop() {
   float hif = dht.computeHeatIndex(f, h);  // Calcola l'indice di calore in gradi Fahrenheit e lo memorizza nella variabile hif
   float hic = dht.computeHeatIndex(t, h, false);  // Calcola l'indice di calore in gradi Celsius e lo memorizza nella variabile hic
 
+#if BINARY_PROTOCOL
+  sendBinaryFrame(h, t, f, hic, hif);  // Invia il frame binario compatto
+#else
+
   Serial.print(F("Humidity: "));  // Stampa la stringa "Umidità: " sulla porta seriale
   Serial.print(h);  // Stampa il valore dell'umidità sulla porta seriale
   Serial.print(F("%,  Temperature: "));  // Stampa la stringa "%  Temperatura: " sulla porta seriale
@@ -49,6 +125,7 @@ void loop() {
   Serial.print(F("°C "));  // Stampa la stringa "°C " sulla porta seriale
   Serial.print(hif);  // Stampa il valore dell'indice di calore in gradi Fahrenheit sulla porta seriale
   Serial.println(F("°F"));  // Stampa la stringa "°F" e va a capo
+#endif
 
   delay(1000);  // Aspetta un secondo prima della prossima iterazione del loop
 }
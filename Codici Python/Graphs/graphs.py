@@ -18,98 +18,103 @@
 
 
 # Importa le librerie necessarie
-import serial  # Per la comunicazione seriale con dispositivi esterni
-import time    # Per gestire funzioni e ritardi relativi al tempo
-import matplotlib.pyplot as plt  # Per creare e gestire grafici
-from collections import deque    # Per creare buffer di dati efficienti a dimensione fissa
+import os      # Per costruire il percorso della cartella con i moduli condivisi
+import sys     # Per aggiungere la cartella dei moduli condivisi al percorso di ricerca
+import time    # Per il timestamp di ogni campione
+import logging # Per i messaggi (le righe lette sono a livello DEBUG)
+
+# Rende importabili i moduli condivisi della cartella ReadArduinoSensorData
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ReadArduinoSensorData'))
+from serial_reader import open_port, SerialLineReader  # Lettore di linee e porta che si riapre se il cavo viene scollegato
+from sensor_parser import parse_line, complete_raw  # Parser a passaggio singolo delle righe del sensore
+from pipeline import SampleQueue, ReaderThread, DROP_OLDEST  # Thread lettore e coda limitata
+from ring_buffer import RingBuffer  # Buffer circolare NumPy a colonne
+from history import HistoryStore, PLOT_POINTS  # Storico completo con livelli di dettaglio
+from logging_setup import setup_logging  # Messaggi scritti da un thread separato, con limite di frequenza
 
 # Configura la comunicazione seriale sulla porta COM11 con velocità 9600 baud
-ser = serial.Serial('COM11', 9600)  
+SERIAL_COM_PORT = 'COM11'
+SERIAL_DATARATE = 9600
 
 # Definisce il numero massimo di punti dati da memorizzare
 max_len = 100  
-# Crea oggetti deque (buffer a dimensione fissa) per ogni tipo di dato
-humidity_data = deque(maxlen=max_len)        # Memorizza valori di umidità
-temperature_c_data = deque(maxlen=max_len)   # Memorizza valori di temperatura Celsius
-temperature_f_data = deque(maxlen=max_len)   # Memorizza valori di temperatura Fahrenheit
-idc_f_data = deque(maxlen=max_len)          # Memorizza valori IDC Fahrenheit
-
-# Abilita la modalità interattiva per matplotlib
-plt.ion()  
-# Crea una figura con sottografici 2x2
-fig, axs = plt.subplots(2, 2, figsize=(12, 8))
-# Imposta il titolo principale per l'intera figura
-fig.suptitle('Dati Sensore in Tempo Reale')
+# Secondi di storico da mostrare (0 = solo gli ultimi max_len punti, per esempio 86400 = un giorno)
+history_seconds = 0
+# Livello dei messaggi ("DEBUG" per vedere ogni riga letta e i valori analizzati)
+LOG_LEVEL = "INFO"
+
+log = logging.getLogger(__name__)  # Logger dello script
 
 # Funzione per aggiornare tutti e quattro i grafici
-def update_plots():
-    # Aggiorna il grafico dell'umidità (in alto a sinistra)
-    axs[0, 0].clear()  # Pulisce il grafico precedente
-    axs[0, 0].plot(list(humidity_data), label='Umidità (%)', color='blue')  # Disegna i dati dell'umidità
-    axs[0, 0].legend(loc='upper right')  # Aggiunge la legenda
-    axs[0, 0].set_title('Umidità')  # Imposta il titolo del sottografico
-
-    # Aggiorna il grafico della temperatura Celsius (in alto a destra)
-    axs[0, 1].clear()  # Pulisce il grafico precedente
-    axs[0, 1].plot(list(temperature_c_data), label='Temperatura (°C)', color='red')  # Disegna i dati Celsius
-    axs[0, 1].legend(loc='upper right')  # Aggiunge la legenda
-    axs[0, 1].set_title('Temperatura Celsius')  # Imposta il titolo del sottografico
-
-    # Aggiorna il grafico della temperatura Fahrenheit (in basso a sinistra)
-    axs[1, 0].clear()  # Pulisce il grafico precedente
-    axs[1, 0].plot(list(temperature_f_data), label='Temperatura (°F)', color='orange')  # Disegna i dati Fahrenheit
-    axs[1, 0].legend(loc='upper right')  # Aggiunge la legenda
-    axs[1, 0].set_title('Temperatura Fahrenheit')  # Imposta il titolo del sottografico
-
-    # Aggiorna il grafico IDC Celsius (in basso a destra)
-    axs[1, 1].clear()  # Pulisce il grafico precedente
-    axs[1, 1].plot(list(idc_c_data), label='IdC (°C)', color='green')  # Disegna i dati IDC
-    axs[1, 1].legend(loc='upper right')  # Aggiunge la legenda
-    axs[1, 1].set_title('IdC Celsius')  # Imposta il titolo del sottografico
-
-    # Regola il layout e aggiorna il display
-    plt.tight_layout(rect=[0, 0, 1, 0.96])  # Ottimizza il layout dei sottografici
-    plt.pause(0.1)  # Piccola pausa per permettere l'aggiornamento del grafico
-
-try:
-    while True:  # Ciclo principale del programma
-        if ser.in_waiting > 0:  # Controlla se ci sono dati disponibili da leggere
-            # Legge e decodifica una riga dalla porta seriale
-            line = ser.readline().decode('utf-8').rstrip()
-            print(line)  # Stampa la riga di dati grezza
-
-            # Analizza i diversi valori dalla stringa di input
-            line_humidity = float(line.split(", ")[0].split(" ")[1].split("%")[0])  # Estrae il valore dell'umidità
-            line_temperature_celsius = float(line.split(", ")[1].split(" ")[2].split("°")[0])  # Estrae la temperatura Celsius
-            line_temperature_fahrenheit = float(line.split(", ")[1].split(" ")[3].split("°")[0])  # Estrae la temperatura Fahrenheit
-            line_idc_celsius = float(line.split(", ")[2].split(" ")[2].split("°")[0])  # Estrae il valore IDC Celsius
-            
-            # Prova a estrarre il valore IDC Fahrenheit, imposta a 0 se non disponibile
-            try:
-                line_idc_fahrenheit = float(line.split(", ")[2].split(" ")[3].split("°")[0])
-            except Exception:
-                line_idc_fahrenheit = 0.0
-
-            # Stampa i valori analizzati
-            print(f"Umidità: {line_humidity} %")
-            print(f"Temperatura: {line_temperature_celsius} C")
-            print(f"Temperatura: {line_temperature_fahrenheit} F")
-            print(f"IdC: {line_idc_celsius} C")
-            print(f"IdC: {line_idc_fahrenheit} F")
-
-            # Aggiunge i nuovi valori ai rispettivi deque
-            humidity_data.append(line_humidity)
-            temperature_c_data.append(line_temperature_celsius)
-            temperature_f_data.append(line_temperature_fahrenheit)
-            idc_c_data.append(line_idc_celsius)
-            idc_f_data.append(line_idc_fahrenheit)
-
-            update_plots()  # Aggiorna tutti i grafici con i nuovi dati
-            time.sleep(1)  # Attende 1 secondo prima della prossima iterazione
-
-except KeyboardInterrupt:  # Gestisce l'interruzione del programma (Ctrl+C)
-    print("Interruzione manuale")
-finally:  # Codice di pulizia che viene eseguito sia in caso di errore che non
-    ser.close()  # Chiude la connessione alla porta seriale
-    plt.ioff()  # Disabilita la modalità interattiva
-    plt.show()  # Mostra lo stato finale del grafico
+def update_plots(live_plot, data_buffer, history, history_seconds=history_seconds):
+    if not history_seconds:
+        live_plot.update(data_buffer)  # Le colonne del buffer sono viste NumPy: nessuna conversione in liste
+        return
+    now = time.time()  # Il bordo destro del grafico è l'istante attuale
+    curves = {}
+    for field in live_plot.lines:  # Punti proporzionali ai pixel, non ai campioni dello storico
+        x, y = history.query(field, now - history_seconds, now, PLOT_POINTS)
+        curves[field] = (x - now, y)
+    live_plot.update_xy(curves)
+
+# Funzione che estrae i valori da una riga e li aggiunge ai buffer
+def process_line(line, data_buffer, history):
+    # Analizza i diversi valori dalla stringa di input con un solo passaggio
+    reading = parse_line(line)
+    if reading is None:  # La riga non contiene una lettura completa
+        return
+    reading, = complete_raw([reading])  # °F e indice di calore calcolati sul PC per le righe grezze
+    line_humidity, line_temperature_celsius, line_temperature_fahrenheit, line_idc_celsius, line_idc_fahrenheit = reading
+
+    # Riga grezza e valori analizzati solo a livello DEBUG: nessuna stampa per campione sul percorso critico
+    log.debug("%r -> Umidità: %s %%, Temperatura: %s C %s F, IdC: %s C %s F", line, line_humidity,
+              line_temperature_celsius, line_temperature_fahrenheit, line_idc_celsius, line_idc_fahrenheit)
+
+    # Aggiunge il nuovo campione al buffer circolare
+    timestamp = time.time()
+    data_buffer.append(timestamp, *reading)
+    history.append(timestamp, *reading)
+
+# Funzione principale
+def main(serial_port=SERIAL_COM_PORT, datarate=SERIAL_DATARATE, history_seconds=history_seconds):
+    from live_plot import LivePlot  # Importato qui: matplotlib viene caricato solo quando si apre la figura
+
+    setup_logging(LOG_LEVEL)  # Messaggi sulla console
+
+    ser = open_port(serial_port, datarate)  # Riaperta automaticamente se il cavo USB viene scollegato
+    reader = SerialLineReader(ser)  # Crea il lettore che restituisce le linee complete
+
+    # Crea il buffer circolare con una colonna per il timestamp e per ogni tipo di dato
+    data_buffer = RingBuffer(max_len)  # Memorizza timestamp, umidità, temperature e IdC
+    history = HistoryStore()  # Memorizza tutti i campioni, con minimi e massimi per blocchi
+
+    # Crea la figura con i quattro grafici (linee create una sola volta, aggiornate col blitting)
+    live_plot = LivePlot('Dati Sensore in Tempo Reale', max_len, history_seconds=history_seconds)
+
+    # Il thread lettore svuota continuamente la seriale nella coda: la lettura non
+    # dipende più dal tempo impiegato per ridisegnare i grafici
+    sample_queue = SampleQueue(maxsize=max_len, drop_policy=DROP_OLDEST)  # Coda limitata tra lettura e grafici
+    reader_thread = ReaderThread(reader, sample_queue)  # Thread che legge dalla seriale
+    reader_thread.start()  # Avvia la lettura
+
+    try:
+        while not sample_queue.closed:  # Ciclo principale del programma
+            item = sample_queue.get(timeout=0.1)  # Attende una nuova riga senza consumare CPU
+            if item is None:  # Nessun dato entro il timeout
+                live_plot.idle()  # Disegna i dati rimasti e mantiene reattiva la finestra
+                continue
+            # Elabora la riga ricevuta e tutte quelle accumulate durante l'ultimo ridisegno
+            for arrival, line in [item] + sample_queue.get_all():
+                process_line(line, data_buffer, history)
+            update_plots(live_plot, data_buffer, history, history_seconds)  # Aggiorna i grafici (al più MAX_FPS fotogrammi al secondo)
+
+    except KeyboardInterrupt:  # Gestisce l'interruzione del programma (Ctrl+C)
+        print("Interruzione manuale")
+    finally:  # Codice di pulizia che viene eseguito sia in caso di errore che non
+        reader_thread.stop()  # Ferma il thread lettore
+        ser.close()  # Chiude la connessione alla porta seriale
+        live_plot.close()  # Mostra lo stato finale del grafico
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
@@ -0,0 +1,133 @@
+#########################################################################################
+# history.py                                                                            #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-10-29                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Storico completo delle letture con una piramide di livelli di dettaglio, per          #
+# disegnare ore o giorni di dati a costo costante.                                      #
+# - Il livello grezzo conserva tutti i campioni (timestamp e valori).                   #
+# - Il livello 0 raggruppa FACTOR campioni in un blocco con minimo e massimo di ogni    #
+#   campo; il livello 1 raggruppa FACTOR blocchi del livello 0, e così via.             #
+# I blocchi vengono calcolati man mano che arrivano i campioni (costo medio costante).  #
+# query() sceglie il livello più fine che sta in 'max_points' punti e restituisce per   #
+# ogni blocco il minimo e il massimo: i picchi restano visibili e il numero di punti    #
+# dipende dai pixel dello schermo, non dalla quantità di dati.                          #
+#########################################################################################
+
+
+# Importa le librerie necessarie
+import numpy as np  # Per gli array dello storico e le ricerche binarie
+from ring_buffer import FIELDS  # Campi memorizzati (timestamp per primo)
+
+
+# Valori di default
+FACTOR = 8  # Blocchi (o campioni) raggruppati passando da un livello al successivo
+PLOT_POINTS = 2000  # Punti massimi restituiti per curva (circa la larghezza in pixel)
+
+
+# Classe con un array NumPy che cresce raddoppiando
+class GrowableArray:
+    """Righe aggiunte in O(1) medio, lette come vista NumPy"""
+
+    def __init__(self, columns, capacity=1024):
+        self._data = np.empty((capacity, columns))  # Area preallocata
+        self._size = 0  # Righe presenti
+
+    def append(self, row):
+        if self._size == len(self._data):  # Area piena: raddoppia
+            grown = np.empty((2 * len(self._data), self._data.shape[1]))
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = row
+        self._size += 1
+
+    def view(self):
+        """Righe presenti (vista, senza copie)"""
+        return self._data[:self._size]
+
+    def __len__(self):
+        return self._size
+
+
+# Classe dello storico con i livelli di dettaglio
+class HistoryStore:
+    """Tutti i campioni più la piramide minimo/massimo per disegnarli velocemente"""
+
+    def __init__(self, fields=FIELDS, factor=FACTOR):
+        self.fields = tuple(fields)  # Nomi delle colonne ('ts' per primo)
+        self.factor = factor  # Elementi per blocco
+        self._width = len(self.fields) - 1  # Valori per campione (senza il timestamp)
+        self.raw = GrowableArray(len(self.fields))  # Livello grezzo: timestamp e valori
+        self.levels = []  # Livelli di blocchi: ts primo, ts ultimo, minimi, massimi
+        self._partial = []  # Blocco in costruzione di ogni livello e numero di elementi
+
+    def __len__(self):
+        return len(self.raw)
+
+    def append(self, ts, *values):
+        """Aggiunge un campione e aggiorna i blocchi dei livelli"""
+        self.raw.append((ts,) + values)
+        self._push(0, ts, ts, values, values)
+
+    def _push(self, level, ts_first, ts_last, mins, maxs):
+        """Aggiunge un elemento al blocco in costruzione del livello 'level'"""
+        if level == len(self.levels):  # Primo elemento di un nuovo livello
+            self.levels.append(GrowableArray(2 + 2 * self._width))
+            self._partial.append(None)
+        partial = self._partial[level]
+        if partial is None:  # Inizia un nuovo blocco
+            partial = self._partial[level] = [ts_first, ts_last, list(mins), list(maxs), 0]
+        else:
+            partial[1] = ts_last
+            partial[2] = [min(a, b) for a, b in zip(partial[2], mins)]
+            partial[3] = [max(a, b) for a, b in zip(partial[3], maxs)]
+        partial[4] += 1
+        if partial[4] == self.factor:  # Blocco completo: passa al livello superiore
+            self.levels[level].append([partial[0], partial[1]] + partial[2] + partial[3])
+            self._partial[level] = None
+            self._push(level + 1, partial[0], partial[1], partial[2], partial[3])
+
+    def _count(self, level, t0, t1):
+        """Elementi del livello compresi tra t0 e t1 (-1 = livello grezzo)"""
+        data = self.raw.view() if level < 0 else self.levels[level].view()
+        last = 0 if level < 0 else 1  # Colonna del timestamp finale
+        return np.searchsorted(data[:, last], t1, 'right') - np.searchsorted(data[:, 0], t0, 'left')
+
+    def choose_level(self, t0, t1, max_points=PLOT_POINTS):
+        """Livello più fine che rappresenta [t0, t1] in al più 'max_points' punti"""
+        if self._count(-1, t0, t1) <= max_points:
+            return -1
+        for level in range(len(self.levels)):
+            if 2 * self._count(level, t0, t1) <= max_points:  # Due punti (minimo e massimo) per blocco
+                return level
+        return len(self.levels) - 1
+
+    def query(self, field, t0, t1, max_points=PLOT_POINTS, level=None):
+        """Ritorna (x, y) del campo tra t0 e t1 con al più circa 'max_points' punti"""
+        column = self.fields.index(field) - 1  # Posizione del campo tra i valori
+        if level is None:
+            level = self.choose_level(t0, t1, max_points)
+        xs, ys = [], []
+        start, side = t0, 'left'  # Gli elementi dei livelli più fini iniziano dopo l'ultimo blocco preso
+        for current in range(level, -2, -1):  # Dal livello scelto fino a quello grezzo
+            if current < 0:  # Campioni grezzi (la coda non ancora raggruppata)
+                data = self.raw.view()
+                i0 = np.searchsorted(data[:, 0], start, side)
+                i1 = np.searchsorted(data[:, 0], t1, 'right')
+                xs.append(data[i0:i1, 0])
+                ys.append(data[i0:i1, 1 + column])
+                break
+            data = self.levels[current].view()
+            i0 = np.searchsorted(data[:, 1], start, side)  # Include il blocco a cavallo di t0
+            i1 = np.searchsorted(data[:, 1], t1, 'right')
+            if i1 <= i0:
+                continue
+            blocks = data[i0:i1]
+            xs.append(blocks[:, :2].ravel())  # ts primo e ts ultimo di ogni blocco
+            ys.append(np.column_stack((blocks[:, 2 + column], blocks[:, 2 + self._width + column])).ravel())  # minimo e massimo
+            start, side = blocks[-1, 1], 'right'
+        if not xs:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(xs), np.concatenate(ys)
@@ -0,0 +1,133 @@
+#########################################################################################
+# live_plot.py                                                                          #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-10-29                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Figura 2x2 condivisa da graphs.py e graphs_synth.py, aggiornata in modo incrementale: #
+# - le quattro linee (Line2D) vengono create una sola volta e aggiornate con set_data;  #
+# - titoli, legende e layout (tight_layout) sono calcolati una sola volta;              #
+# - a ogni fotogramma si ridisegnano solo le linee sopra lo sfondo salvato (blitting);  #
+#   la figura intera viene ridisegnata solo quando cambia la scala di un asse;          #
+# - i fotogrammi sono limitati a MAX_FPS al secondo, qualunque sia la frequenza dei     #
+#   campioni: i dati arrivati nel frattempo compaiono nel fotogramma successivo.        #
+# Con 'history_seconds' l'asse x mostra i secondi trascorsi (da -history_seconds a 0)   #
+# e le curve arrivano già ridotte dallo storico (history.py) con update_xy().           #
+#########################################################################################
+
+
+# Importa le librerie necessarie
+import time  # Per limitare la frequenza dei fotogrammi
+import numpy as np  # Per le coordinate x dei punti
+import matplotlib.pyplot as plt  # Per creare e gestire grafici
+
+
+# Valori di default
+MAX_FPS = 10  # Fotogrammi massimi al secondo
+Y_MARGIN = 0.1  # Margine (frazione dell'intervallo) aggiunto quando la scala y si allarga
+
+# Sottografici: campo, titolo, etichetta della legenda, colore (nell'ordine della griglia 2x2)
+PANELS = (
+    ('humidity', 'Umidità', 'Umidità (%)', 'blue'),
+    ('temp_c', 'Temperatura Celsius', 'Temperatura (°C)', 'red'),
+    ('temp_f', 'Temperatura Fahrenheit', 'Temperatura (°F)', 'orange'),
+    ('idc_c', 'IdC Celsius', 'IdC (°C)', 'green'),
+)
+
+
+# Classe che gestisce la figura con i quattro grafici
+class LivePlot:
+    """Quattro grafici aggiornati con set_data e blitting, a frequenza limitata"""
+
+    def __init__(self, title, max_len=100, max_fps=MAX_FPS, history_seconds=0):
+        plt.ion()  # Abilita la modalità interattiva
+        self.fig, self.axs = plt.subplots(2, 2, figsize=(12, 8))  # Figura con sottografici 2x2
+        self.fig.suptitle(title)  # Titolo principale della figura
+        self.canvas = self.fig.canvas  # Superficie di disegno
+        self.lines = {}  # Linea di ogni campo
+        for ax, (field, panel_title, label, color) in zip(self.axs.flat, PANELS):
+            line, = ax.plot([], [], label=label, color=color, animated=True)  # Linea disegnata solo col blitting
+            ax.legend(loc='upper right')  # Legenda (una sola volta)
+            ax.set_title(panel_title)  # Titolo del sottografico (una sola volta)
+            if history_seconds:  # Asse x fisso: secondi prima dell'ultimo aggiornamento
+                ax.set_xlim(-history_seconds, 0)
+                ax.set_xlabel('secondi fa')
+            else:  # Asse x fisso: indice del punto nella finestra
+                ax.set_xlim(0, max_len - 1)
+            self.lines[field] = line
+        self.fig.tight_layout(rect=[0, 0, 1, 0.96])  # Layout calcolato una sola volta
+        self.x = np.arange(max_len)  # Coordinate x riutilizzate a ogni fotogramma
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0  # Tempo minimo tra due fotogrammi
+        self.background = None  # Sfondo senza linee (assi, griglia, testi)
+        self._last_frame = 0.0  # Istante dell'ultimo fotogramma
+        self._pending = False  # Dati nuovi non ancora disegnati
+        self._rescale = False  # Serve un ridisegno completo (scala y cambiata)
+        self.frames = 0  # Fotogrammi disegnati
+        self.canvas.mpl_connect('draw_event', self._on_draw)  # Salva lo sfondo a ogni ridisegno completo
+        plt.show(block=False)  # Mostra la finestra senza bloccare
+        self.canvas.draw()  # Primo disegno completo (salva lo sfondo)
+
+    def _on_draw(self, event):
+        """Dopo un ridisegno completo salva lo sfondo e ridisegna le linee"""
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in self.lines.values():
+            line.axes.draw_artist(line)
+
+    def update(self, series):
+        """Aggiorna i dati: 'series' associa a ogni campo la sequenza dei valori"""
+        self.update_xy({field: (self.x[:len(series[field])], series[field]) for field in self.lines})
+
+    def update_xy(self, curves):
+        """Aggiorna i dati: 'curves' associa a ogni campo la coppia (x, y)"""
+        for field, line in self.lines.items():
+            x, values = curves[field]
+            line.set_data(x, values)  # Nessuna nuova linea, solo nuovi dati
+            if len(values):
+                self._check_scale(line.axes, np.min(values), np.max(values))
+        self._pending = True
+        self.render()
+
+    def _check_scale(self, ax, low, high):
+        """Allarga la scala y se i dati escono dall'intervallo visibile"""
+        bottom, top = ax.get_ylim()
+        if low >= bottom and high <= top and self.frames:  # I dati sono già visibili
+            return
+        margin = max(high - low, 1.0) * Y_MARGIN  # Evita ridisegni a ogni piccola variazione
+        if self.frames:  # Allarga soltanto, per mantenere stabile la scala
+            low, high = min(low, bottom), max(high, top)
+        ax.set_ylim(low - margin, high + margin)
+        self._rescale = True
+
+    def render(self):
+        """Disegna un fotogramma se ci sono dati nuovi ed è trascorso l'intervallo minimo"""
+        now = time.monotonic()
+        if not self._pending or now - self._last_frame < self.min_interval:
+            return False
+        if self._rescale or self.background is None:  # Scala cambiata: ridisegno completo
+            self.canvas.draw()
+            self._rescale = False
+        else:  # Solo le linee sopra lo sfondo salvato
+            self.canvas.restore_region(self.background)
+            self._draw_lines()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()  # Elabora gli eventi della finestra
+        self._pending = False
+        self._last_frame = now
+        self.frames += 1
+        return True
+
+    def idle(self, timeout=0.01):
+        """Da chiamare quando non arrivano dati: disegna i dati rimasti e mantiene reattiva la finestra"""
+        self.render()
+        self.canvas.start_event_loop(timeout)
+
+    def close(self):
+        """Lascia la figura aperta con l'ultimo stato dei dati"""
+        plt.ioff()  # Disabilita la modalità interattiva
+        for line in self.lines.values():
+            line.set_animated(False)  # Le linee tornano a far parte del disegno normale
+        plt.show()  # Mostra lo stato finale del grafico
@@ -0,0 +1,86 @@
+#########################################################################################
+# ring_buffer.py                                                                        #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-10-29                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Buffer circolare a colonne per le letture del sensore, basato su un array NumPy       #
+# preallocato: una riga per campo (timestamp, umidità, temperature, IdC).               #
+# Ogni campione è scritto due volte, in posizione i e i + capacità: così gli ultimi     #
+# N campioni sono sempre contigui e in ordine, e ogni colonna si ottiene come vista     #
+# (senza copie né conversioni in liste) anche con finestre di milioni di campioni.      #
+# L'aggiunta di un campione costa O(1), indipendentemente dalla capacità.              #
+#########################################################################################
+
+
+# Importa le librerie necessarie
+import numpy as np  # Per l'array preallocato e le viste
+
+
+# Campi memorizzati: timestamp e i cinque valori del sensore
+FIELDS = ('ts', 'humidity', 'temp_c', 'temp_f', 'idc_c', 'idc_f')
+
+
+# Classe del buffer circolare a colonne
+class RingBuffer:
+    """Ultimi 'capacity' campioni, con viste ordinate a costo zero per ogni campo"""
+
+    def __init__(self, capacity, fields=FIELDS, dtype=np.float64):
+        self.capacity = capacity  # Campioni massimi conservati
+        self.fields = tuple(fields)  # Nomi delle colonne
+        self._index = {field: row for row, field in enumerate(self.fields)}  # Riga di ogni campo
+        self._data = np.full((len(self.fields), 2 * capacity), np.nan, dtype=dtype)  # Area doppia, preallocata
+        self._head = 0  # Posizione del prossimo campione (0 .. capacity-1)
+        self._size = 0  # Campioni presenti
+        self.total = 0  # Campioni aggiunti dall'inizio
+
+    def append(self, *values):
+        """Aggiunge un campione: un valore per campo, nell'ordine di 'fields'"""
+        head = self._head
+        self._data[:, head] = values  # Copia principale
+        self._data[:, head + self.capacity] = values  # Copia speculare: mantiene contigua la finestra
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+        self.total += 1
+
+    def extend(self, rows):
+        """Aggiunge più campioni insieme: 'rows' ha forma (campioni, campi)"""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, len(self.fields))
+        added = len(rows)  # Campioni ricevuti
+        rows = rows[-self.capacity:].T  # Servono solo gli ultimi 'capacity'
+        count = rows.shape[1]
+        first = min(count, self.capacity - self._head)  # Parte prima del giro
+        for start, block in ((self._head, rows[:, :first]), (0, rows[:, first:])):
+            width = block.shape[1]
+            self._data[:, start:start + width] = block
+            self._data[:, start + self.capacity:start + self.capacity + width] = block
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+        self.total += added
+
+    def __len__(self):
+        return self._size
+
+    def view(self):
+        """Array (campi, campioni) dal più vecchio al più recente, senza copie"""
+        end = self._head + self.capacity  # Il campione più recente è appena prima di 'end'
+        return self._data[:, end - self._size:end]
+
+    def column(self, field):
+        """Valori di un campo dal più vecchio al più recente (vista, senza copie)"""
+        return self.view()[self._index[field]]
+
+    __getitem__ = column  # buffer['humidity'] come per un dizionario di sequenze
+
+    def last(self):
+        """Ultimo campione come dizionario, o None se il buffer è vuoto"""
+        if not self._size:
+            return None
+        return dict(zip(self.fields, self.view()[:, -1].tolist()))
+
+    def clear(self):
+        """Svuota il buffer senza liberare la memoria"""
+        self._head = 0
+        self._size = 0
@@ -0,0 +1,49 @@
+#########################################################################################
+# test_history.py                                                                       #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test dello storico con livelli di dettaglio (history.py): blocchi minimo/massimo,     #
+# scelta del livello e picchi conservati nelle query ridotte.                           #
+#########################################################################################
+
+# Importa le librerie necessarie
+import numpy as np  # Importa NumPy per i confronti tra array
+from history import HistoryStore, GrowableArray
+
+
+def test_growable_array_doubles():
+    array = GrowableArray(2, capacity=2)
+    for i in range(5):
+        array.append((i, -i))
+    assert len(array) == 5
+    assert array.view()[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_levels_hold_min_and_max():
+    store = HistoryStore(fields=('ts', 'x'), factor=4)
+    for t in range(20):
+        store.append(float(t), float(t % 7))
+    assert len(store) == 20
+    assert len(store.levels[0]) == 5 and len(store.levels[1]) == 1
+    first_block = store.levels[0].view()[0]
+    assert first_block.tolist() == [0.0, 3.0, 0.0, 3.0]  # ts primo, ts ultimo, minimo, massimo
+    top = store.levels[1].view()[0]
+    assert top.tolist() == [0.0, 15.0, 0.0, 6.0]
+
+
+def test_query_raw_and_reduced():
+    store = HistoryStore(fields=('ts', 'x'), factor=8)
+    values = np.zeros(10000)
+    values[4321] = 99.0  # Picco isolato
+    for t, value in enumerate(values):
+        store.append(float(t), value)
+    xs, ys = store.query('x', 100, 149)  # Pochi punti: campioni grezzi
+    assert xs.tolist() == list(range(100, 150))
+    assert store.choose_level(0, 9999, max_points=500) >= 0
+    xs, ys = store.query('x', 0, 9999, max_points=500)
+    assert len(xs) <= 1000 and ys.max() == 99.0  # Il picco resta visibile
+    assert xs[0] == 0 and xs[-1] == 9999  # Anche la coda non ancora raggruppata
+    assert np.all(np.diff(xs) >= 0)
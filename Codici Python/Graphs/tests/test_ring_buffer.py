@@ -0,0 +1,48 @@
+#########################################################################################
+# test_ring_buffer.py                                                                   #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del buffer circolare a colonne (ring_buffer.py): ordine dopo il giro, viste      #
+# contigue e aggiunta a blocchi.                                                        #
+#########################################################################################
+
+# Importa le librerie necessarie
+import numpy as np  # Importa NumPy per i confronti tra array
+from ring_buffer import RingBuffer
+
+
+def test_wraparound_keeps_order():
+    buffer = RingBuffer(4, fields=('ts', 'x'))
+    assert len(buffer) == 0 and buffer.last() is None
+    for t in range(10):  # Più di due giri completi
+        buffer.append(t, t * 10)
+    assert len(buffer) == 4 and buffer.total == 10
+    assert buffer['ts'].tolist() == [6, 7, 8, 9]
+    assert buffer.column('x').tolist() == [60, 70, 80, 90]
+    assert np.shares_memory(buffer.view(), buffer._data)  # Vista, non copia
+    assert buffer.last() == {'ts': 9.0, 'x': 90.0}
+
+
+def test_extend_matches_append():
+    rows = np.array([(t, t * 2) for t in range(11)], dtype=float)
+    appended, extended = RingBuffer(4, fields=('ts', 'x')), RingBuffer(4, fields=('ts', 'x'))
+    appended.append(-1, -1)
+    extended.append(-1, -1)
+    for row in rows:
+        appended.append(*row)
+    extended.extend(rows[:3])  # Un blocco che non fa il giro
+    extended.extend(rows[3:])  # Un blocco più lungo della capacità
+    assert np.array_equal(appended.view(), extended.view())
+    assert extended.total == appended.total == 12
+
+
+def test_clear():
+    buffer = RingBuffer(3, fields=('ts',))
+    buffer.extend([[1], [2]])
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.append(5)
+    assert buffer['ts'].tolist() == [5]
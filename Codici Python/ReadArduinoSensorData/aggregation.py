@@ -0,0 +1,256 @@
+#########################################################################################
+# aggregation.py                                                                        #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Statistiche su finestre temporali calcolate man mano che arrivano i campioni, da      #
+# pubblicare come riepiloghi su topic separati (<prefisso>/summary/<nome finestra>).    #
+# Finestre configurate in 'parameters.json', chiave AGGREGATE_WINDOWS, per esempio:     #
+#   "AGGREGATE_WINDOWS": [                                                              #
+#       {"name": "1m", "length": 60, "mode": "tumbling"},                               #
+#       {"name": "5m", "length": 300, "mode": "sliding", "step": 30}                    #
+#   ]                                                                                   #
+# - "tumbling": finestre consecutive e non sovrapposte, allineate all'orologio; media,  #
+#   minimo e massimo in O(1), percentili con lo stimatore P² (5 marcatori per           #
+#   percentile, memoria costante qualunque sia la lunghezza della finestra);            #
+# - "sliding": finestra mobile degli ultimi 'length' secondi, riepilogo ogni 'step'     #
+#   secondi; minimo e massimo con code monotone (O(1) ammortizzato), media con somma    #
+#   mobile, percentili esatti su una lista ordinata della finestra (P² non permette di  #
+#   togliere i campioni che escono dalla finestra).                                     #
+# I percentili calcolati sono in AGGREGATE_QUANTILES (default 0.5 e 0.95).              #
+#########################################################################################
+
+# Importa le librerie necessarie
+import math  # Importa la libreria math per l'indice dei percentili
+import bisect  # Importa la libreria bisect per la lista ordinata della finestra mobile
+from collections import deque  # Importa deque per le code monotone
+from sensor_parser import SensorReading  # Importa il record con i cinque valori
+
+
+# Modalità delle finestre
+MODE_TUMBLING = "tumbling"  # Finestre consecutive
+MODE_SLIDING = "sliding"  # Finestra mobile
+
+# Valori di default
+QUANTILES = (0.5, 0.95)  # Percentili calcolati
+FIELDS = SensorReading._fields  # Campi di ogni campione
+
+
+# Stimatore P² di un percentile (Jain e Chlamtac, 1985)
+class P2Quantile:
+    """Stima il percentile 'p' di un flusso con 5 marcatori, senza memorizzare i campioni"""
+
+    def __init__(self, p):
+        self.p = p  # Percentile da stimare (0..1)
+        self.heights = []  # Altezze dei marcatori (i primi 5 campioni, ordinati)
+        self.positions = [1, 2, 3, 4, 5]  # Posizioni attuali dei marcatori
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]  # Posizioni desiderate
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]  # Incremento delle posizioni desiderate
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:  # Fase iniziale: memorizza i primi campioni
+            bisect.insort(heights, x)
+            return
+        if x < heights[0]:  # Cella in cui cade il campione
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(heights, x) - 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):  # Aggiusta i marcatori centrali
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:  # Fuori dall'ordine: formula lineare
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """Stima attuale (esatta finché i campioni sono al più 5)"""
+        if self.count > 5:
+            return self.heights[2]
+        if not self.heights:
+            return None
+        return exact_quantile(self.heights, self.p)
+
+
+def exact_quantile(ordered, p):
+    """Percentile di una lista già ordinata (metodo del rango più vicino)"""
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+# Finestre consecutive e non sovrapposte
+class TumblingWindow:
+    """Riepilogo di ogni intervallo [k*length, (k+1)*length) dell'orologio"""
+
+    def __init__(self, name, length, fields=FIELDS, quantiles=QUANTILES):
+        self.name = name
+        self.length = length
+        self.fields = fields
+        self.quantiles = quantiles
+        self.end = None  # Fine della finestra corrente
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.sums = [0.0] * len(self.fields)
+        self.mins = [math.inf] * len(self.fields)
+        self.maxs = [-math.inf] * len(self.fields)
+        self.sketches = [[P2Quantile(q) for q in self.quantiles] for _ in self.fields]
+
+    def add(self, timestamp, values):
+        """Aggiunge un campione; ritorna il riepilogo della finestra appena chiusa oppure None"""
+        summary = self.poll(timestamp)
+        if self.end is None:  # Prima finestra, allineata a un multiplo di 'length'
+            self.end = (timestamp // self.length + 1) * self.length
+        self.count += 1
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+            for sketch in self.sketches[i]:
+                sketch.add(value)
+        return summary
+
+    def poll(self, timestamp):
+        """Chiude la finestra se 'timestamp' ne ha superato la fine"""
+        if self.end is None or timestamp < self.end:
+            return None
+        summary = None
+        if self.count:
+            summary = {'start': self.end - self.length, 'end': self.end, 'count': self.count}
+            for i, field in enumerate(self.fields):
+                stats = {'mean': self.sums[i] / self.count, 'min': self.mins[i], 'max': self.maxs[i]}
+                stats.update((f"p{round(q * 100)}", sketch.value()) for q, sketch in zip(self.quantiles, self.sketches[i]))
+                summary[field] = stats
+        self._reset()
+        self.end = None  # La prossima finestra si allinea al prossimo campione
+        return summary
+
+
+# Finestra mobile degli ultimi 'length' secondi
+class SlidingWindow:
+    """Riepilogo degli ultimi 'length' secondi, emesso ogni 'step' secondi"""
+
+    def __init__(self, name, length, step, fields=FIELDS, quantiles=QUANTILES):
+        self.name = name
+        self.length = length
+        self.step = step
+        self.fields = fields
+        self.quantiles = quantiles
+        self.samples = deque()  # Campioni nella finestra (numero, timestamp, valori)
+        self._seq = 0  # Numero progressivo dei campioni (distingue campioni con lo stesso timestamp)
+        self.sums = [0.0] * len(fields)  # Somme mobili
+        self.min_queues = [deque() for _ in fields]  # Code monotone crescenti (numero, valore)
+        self.max_queues = [deque() for _ in fields]  # Code monotone decrescenti
+        self.ordered = [[] for _ in fields]  # Valori della finestra in ordine (per i percentili)
+        self.next_emit = None  # Istante del prossimo riepilogo
+
+    def add(self, timestamp, values):
+        """Aggiunge un campione; ritorna il riepilogo se è il momento di emetterlo, altrimenti None"""
+        self._seq += 1
+        seq = self._seq
+        self.samples.append((seq, timestamp, values))
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            queue = self.min_queues[i]
+            while queue and queue[-1][1] >= value:  # I valori maggiori non saranno più il minimo
+                queue.pop()
+            queue.append((seq, value))
+            queue = self.max_queues[i]
+            while queue and queue[-1][1] <= value:  # I valori minori non saranno più il massimo
+                queue.pop()
+            queue.append((seq, value))
+            bisect.insort(self.ordered[i], value)
+        if self.next_emit is None:
+            self.next_emit = (timestamp // self.step + 1) * self.step
+        return self.poll(timestamp)
+
+    def _evict(self, timestamp):
+        """Toglie i campioni più vecchi di 'length' secondi"""
+        limit = timestamp - self.length
+        while self.samples and self.samples[0][1] <= limit:
+            old_seq, _, old_values = self.samples.popleft()
+            for i, value in enumerate(old_values):
+                self.sums[i] -= value
+                for queue in (self.min_queues[i], self.max_queues[i]):
+                    if queue and queue[0][0] == old_seq:
+                        queue.popleft()
+                ordered = self.ordered[i]
+                del ordered[bisect.bisect_left(ordered, value)]
+
+    def poll(self, timestamp):
+        """Emette il riepilogo se è passato 'step' dall'ultimo"""
+        if self.next_emit is None or timestamp < self.next_emit:
+            return None
+        self.next_emit += self.step * ((timestamp - self.next_emit) // self.step + 1)  # Salta gli intervalli senza dati
+        self._evict(timestamp)
+        if not self.samples:
+            self.next_emit = None
+            return None
+        count = len(self.samples)
+        summary = {'start': timestamp - self.length, 'end': timestamp, 'count': count}
+        for i, field in enumerate(self.fields):
+            stats = {'mean': self.sums[i] / count, 'min': self.min_queues[i][0][1], 'max': self.max_queues[i][0][1]}
+            stats.update((f"p{round(q * 100)}", exact_quantile(self.ordered[i], q)) for q in self.quantiles)
+            summary[field] = stats
+        return summary
+
+
+# Insieme delle finestre configurate
+class WindowAggregator:
+    """Passa ogni campione a tutte le finestre e raccoglie i riepiloghi pronti"""
+
+    def __init__(self, windows):
+        self.windows = windows
+        self.summaries = 0  # Riepiloghi emessi
+
+    def add(self, timestamp, reading):
+        """Ritorna la lista dei riepiloghi (nome finestra, riepilogo) pronti dopo questo campione"""
+        return self._collect(window.add(timestamp, reading) for window in self.windows)
+
+    def poll(self, timestamp):
+        """Chiude le finestre scadute anche se non arrivano campioni"""
+        return self._collect(window.poll(timestamp) for window in self.windows)
+
+    def _collect(self, results):
+        ready = [(window.name, summary) for window, summary in zip(self.windows, results) if summary]
+        self.summaries += len(ready)
+        return ready
+
+
+def build_aggregator(configs, quantiles=QUANTILES):
+    """Crea l'aggregatore dalle finestre di AGGREGATE_WINDOWS (None se non ce ne sono)"""
+    windows = []
+    for config in configs:
+        mode = config.get('mode', MODE_TUMBLING)
+        name = config.get('name', f"{config['length']}s")
+        if mode == MODE_TUMBLING:
+            windows.append(TumblingWindow(name, config['length'], quantiles=quantiles))
+        elif mode == MODE_SLIDING:
+            windows.append(SlidingWindow(name, config['length'], config.get('step', config['length']), quantiles=quantiles))
+        else:
+            raise ValueError(f"Modalità della finestra non valida: {mode}")
+    return WindowAggregator(windows) if windows else None
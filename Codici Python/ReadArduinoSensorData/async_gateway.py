@@ -0,0 +1,274 @@
+###########################################################################################
+# asyncio gateway: read serial devices and send data to MQTT broker in one event loop     #
+# author: Pietro Boccadoro                                                                #
+# email: pieroboccadoro13[at]gmail[dot]com                                                #
+# date: 2025-02-01                                                                        #
+# version: 0.1                                                                            #
+#                                                                                         #
+# Versione asyncio di gateway.py: lettura della seriale, elaborazione e pubblicazione     #
+# sono coroutine collegate da asyncio.Queue di dimensione limitata. Quando una coda è     #
+# piena la coroutine precedente si ferma (backpressure), senza thread aggiuntivi.         #
+# Anche il client paho gira nello stesso ciclo di eventi (niente loop_start()).           #
+# Per aggiungere uno stadio (filtro, aggregazione) basta una funzione che riceve          #
+# (istante di arrivo, lettura) e ritorna l'elemento da passare avanti oppure None.        #
+#                                                                                         #
+# Usa gli stessi parametri di gateway.py ('parameters.json', chiave DEVICES).             #
+# Con l'opzione --memory-broker i messaggi vanno a un broker interno al processo          #
+# (memory_broker.py): utile per provare la pipeline con una pseudo-seriale (pty).         #
+# I dispositivi si indicano come in gateway.py: "port", "vid"/"pid" (porta cercata        #
+# all'avvio) oppure "replay" (registrazione di capture.py, letta fino alla fine).         #
+# Una porta scollegata viene riaperta come in gateway.py ("SERIAL_RECONNECT"); con        #
+# "SERIAL_RECONNECT": false la chiusura della porta (es. EIO) termina il suo flusso.      #
+# Il gateway termina quando tutti i flussi sono finiti, o con l'errore di una coroutine.  #
+#                                                                                         #
+# Per eseguire questo script, è necessario installare la libreria paho-mqtt e pyserial.   #
+# pip install paho-mqtt pyserial                                                          #
+###########################################################################################
+
+
+# Importa le librerie necessarie
+import sys  # Importa la libreria sys per riconoscere Windows
+import time  # Importa la libreria time per gli istanti di arrivo e le statistiche
+import logging  # Importa la libreria logging per i messaggi
+import asyncio  # Importa la libreria asyncio per il ciclo di eventi
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import serial  # Importa la libreria pyserial per l'errore di porta non trovata
+from serial_reader import open_serial, open_port, open_reader, find_port, usb_id  # Importa il lettore condiviso (testo o binario)
+from gateway import read_parameters, on_connect, parameters_file, STATS_INTERVAL  # Parametri condivisi con gateway.py
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from logging_setup import setup_logging_from  # Importa la configurazione del logging (coda e limite di frequenza)
+import mqtt_publisher  # Importa il modulo di pubblicazione (valori singoli, JSON, binario, lotti)
+import pipeline  # Importa i valori di default e il limitatore di frequenza
+import paho.mqtt.client as mqtt  # Importa la libreria paho-mqtt per la comunicazione MQTT
+
+
+# Variabili globali
+log = logging.getLogger(__name__)  # Logger del gateway asyncio
+
+
+# Classe che fa girare il client paho nel ciclo asyncio (come nell'esempio ufficiale di paho)
+class AsyncioMqttHelper:
+    """Registra il socket MQTT nel ciclo di eventi al posto del thread di loop_start()"""
+
+    def __init__(self, loop, client):
+        self.loop = loop  # Ciclo di eventi asyncio
+        self.client = client  # Client paho
+        self.misc = None  # Coroutine dei compiti periodici di paho (keepalive)
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)  # Legge quando il broker invia dati
+        self.misc = self.loop.create_task(self.misc_loop())  # Avvia i compiti periodici
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc:
+            self.misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)  # Scrive quando il socket è pronto
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:  # Keepalive e ritrasmissioni
+            await asyncio.sleep(1)
+
+
+# Coroutine che legge i byte dalla seriale e accoda le letture decodificate
+async def read_serial(reader, out_queue):
+    """Sorgente: legge la seriale senza bloccare il ciclo di eventi; a fine flusso accoda None"""
+    loop = asyncio.get_running_loop()  # Ciclo di eventi corrente
+    serial_port = reader.serial_port  # Porta seriale già aperta
+    if sys.platform == 'win32' or not hasattr(serial_port, 'fileno'):  # Windows o registrazione: nessun descrittore
+        while True:  # Lettura bloccante in un thread del pool, un blocco per volta
+            data = await loop.run_in_executor(None, reader.read_chunk)
+            if not data and getattr(serial_port, 'finished', False):  # Registrazione riprodotta fino alla fine
+                break
+            arrival = reader.clock()  # Istante di arrivo del blocco (originale per una registrazione)
+            for reading in reader.decode(data):
+                await out_queue.put((arrival, reading))  # Attende se la coda è piena (backpressure)
+    else:
+        while True:  # Termina quando la porta semplice si chiude, o con la cancellazione (stop())
+            if not getattr(serial_port, 'is_open', True):  # ReconnectingSerial senza porta
+                await loop.run_in_executor(None, serial_port.read, 1)  # Attende o riprova l'apertura (senza leggere byte)
+            elif not await watch_serial(serial_port, reader, out_queue):  # Porta semplice chiusa (es. EIO): fine del flusso
+                break
+    await out_queue.put(None)  # Fine del flusso: gli stadi successivi terminano dopo l'ultima lettura
+
+
+# Coroutine che legge la porta quando il ciclo di eventi segnala byte disponibili
+async def watch_serial(serial_port, reader, out_queue):
+    """Ritorna True se la porta è stata persa e va riaperta, False se il flusso è finito"""
+    loop = asyncio.get_running_loop()
+    fd = serial_port.fileno()  # Descrittore del file (solo POSIX), cambia a ogni riapertura
+    ready = asyncio.Event()  # Segnala che ci sono byte da leggere
+    loop.add_reader(fd, ready.set)  # Il ciclo di eventi sorveglia il descrittore
+    try:
+        while True:
+            await ready.wait()  # Attende nuovi byte senza consumare CPU
+            ready.clear()
+            try:
+                waiting = serial_port.in_waiting  # Byte disponibili (0 se già letti in un giro precedente)
+                data = serial_port.read(waiting) if waiting else b""  # Senza byte non si chiama read(): bloccherebbe il ciclo
+            except (serial.SerialException, OSError) as e:  # Porta semplice scollegata (pty chiuso: errno 5, EIO)
+                log.warning("%s: porta chiusa (%s)", serial_port.port, e)
+                return False
+            if not getattr(serial_port, 'is_open', True):  # ReconnectingSerial ha perso la porta: va riaperta
+                return True
+            if not data:
+                continue
+            arrival = time.monotonic()  # Istante di arrivo del blocco
+            for reading in reader.decode(data):
+                await out_queue.put((arrival, reading))  # Attende se la coda è piena (backpressure)
+    finally:
+        loop.remove_reader(fd)  # Smette di sorvegliare il descrittore
+
+
+# Coroutine che applica una funzione a ogni elemento tra due code
+async def run_stage(stage, in_queue, out_queue):
+    """Stadio intermedio: 'stage(item)' ritorna l'elemento da passare avanti o None per scartarlo"""
+    while True:
+        item = await in_queue.get()  # Elemento successivo
+        if item is None:  # Fine del flusso: la passa avanti e termina
+            await out_queue.put(None)
+            return
+        item = stage(item)  # Elabora l'elemento
+        if item is not None:
+            await out_queue.put(item)  # Attende se lo stadio successivo è in ritardo
+
+
+# Coroutine che pubblica le letture sul broker
+async def publish_samples(in_queue, publisher, rate_limiter, flush_interval=0.5):
+    """Destinazione: pubblica ogni lettura e invia i lotti scaduti quando non arrivano dati"""
+    while True:
+        try:
+            item = await asyncio.wait_for(in_queue.get(), flush_interval)  # Attende la prossima lettura
+        except asyncio.TimeoutError:  # Nessun dato: invia i lotti scaduti
+            publisher.flush()
+            continue
+        if item is None:  # Fine del flusso: invia l'eventuale lotto incompleto e termina
+            publisher.flush(force=True)
+            return
+        arrival, reading = item
+        delay = rate_limiter.reserve()  # Limite di frequenza (senza bloccare il ciclo di eventi)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        publisher.publish(reading, arrival)
+
+
+# Classe con le coroutine e le code di un singolo dispositivo
+class AsyncDevice:
+    """Un dispositivo Arduino servito da coroutine: seriale -> stadi -> pubblicazione"""
+
+    def __init__(self, config, client, params, stages=()):
+        self.port = config.get('replay') or config.get('port') or f"USB {config['vid']}:{config['pid']}"  # Nome della porta seriale
+        if 'replay' in config:
+            from capture import ReplaySerial  # Importato qui: solo per i dispositivi che riproducono una registrazione
+            self.serial = ReplaySerial(config['replay'], config.get('speed', 1))  # Registrazione al posto della porta
+        elif params.get('SERIAL_RECONNECT', True):  # Porta riaperta se scollegata, come in gateway.py
+            self.serial = open_port(config.get('port'), config['datarate'], vid=config.get('vid'), pid=config.get('pid'),
+                                    serial_number=config.get('serial_number'))
+        else:
+            port = config.get('port')
+            if config.get('vid') and config.get('pid'):  # Porta cercata per VID/PID (il nome può cambiare)
+                port = find_port(usb_id(config['vid']), usb_id(config['pid']), config.get('serial_number')) or port
+            if port is None:
+                raise serial.SerialException(f"{self.port}: porta USB non trovata")
+            self.serial = open_serial(port, config['datarate'])  # Apre la porta seriale
+        self.reader = open_reader(self.serial, config['format'])  # Decodificatore adatto al formato
+        self.publisher = mqtt_publisher.SamplePublisher(
+            client, params.get('PUBLISH_MODE', mqtt_publisher.MODE_JSON), config['topic_prefix'],
+            params.get('BATCH_SIZE', mqtt_publisher.BATCH_SIZE), params.get('BATCH_INTERVAL', mqtt_publisher.BATCH_INTERVAL),
+            params.get('PUBLISH_FIELD_TOPICS', False), f"{config['topic_prefix']}/")  # Pubblicazione sul prefisso del dispositivo
+        self.rate_limiter = pipeline.RateLimiter(params.get('PUBLISH_RATE', pipeline.PUBLISH_RATE))  # Limite di frequenza
+        queue_size = params.get('QUEUE_SIZE', pipeline.QUEUE_SIZE)  # Dimensione di ogni coda
+        self.queues = [asyncio.Queue(queue_size) for _ in range(len(stages) + 1)]  # Una coda prima di ogni stadio
+        self.stages = stages  # Stadi intermedi (funzioni)
+        self.tasks = []  # Coroutine avviate
+
+    def start(self):
+        """Crea le coroutine: sorgente, stadi intermedi e pubblicazione"""
+        self.tasks.append(asyncio.create_task(read_serial(self.reader, self.queues[0])))
+        for index, stage in enumerate(self.stages):
+            self.tasks.append(asyncio.create_task(run_stage(stage, self.queues[index], self.queues[index + 1])))
+        self.tasks.append(asyncio.create_task(publish_samples(self.queues[-1], self.publisher, self.rate_limiter)))
+
+    def stats(self):
+        """Ritorna la riga di statistiche della porta"""
+        depths = "/".join(str(queue.qsize()) for queue in self.queues)  # Occupazione di ogni coda
+        return (f"{self.port}: {self.reader.lines_read} letture, {self.publisher.samples} campioni, "
+                f"{self.publisher.messages} messaggi, code {depths}")
+
+    async def stop(self):
+        """Ferma le coroutine, invia i lotti rimasti e chiude la porta"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)  # Attende la cancellazione
+        self.publisher.flush(force=True)  # Invia l'eventuale lotto incompleto
+        self.serial.close()  # Chiude la porta seriale
+
+
+# Coroutine principale: avvia i dispositivi e stampa le statistiche
+async def run_gateway(params, client, stages=(), stats_interval=STATS_INTERVAL, ready=None):
+    """Termina quando tutti i flussi sono finiti; l'errore di una coroutine ferma il gateway.
+    'ready' (asyncio.Event, facoltativo) viene impostato quando tutte le porte sono aperte"""
+    devices = []
+    try:
+        for config in params['DEVICES']:  # Apre tutte le porte (se una non si apre, le precedenti vengono chiuse)
+            device = AsyncDevice(config, client, params, stages)
+            device.start()
+            devices.append(device)
+        log.info("Gateway asyncio avviato su %d porte", len(devices))
+        if ready is not None:
+            ready.set()
+        pending = [task for device in devices for task in device.tasks]  # Coroutine ancora attive
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=stats_interval, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:  # Un dispositivo fermo non passa inosservato
+                    raise task.exception()
+            for device in devices:
+                log.info(device.stats(), extra={'rate_key': device.port})  # Limite per porta, non per riga di codice
+    finally:
+        for device in devices:
+            await device.stop()
+
+
+# Coroutine che collega il client MQTT al ciclo di eventi e avvia il gateway
+async def main_async(params, memory_broker=False):
+    if memory_broker:  # Broker interno al processo (prove senza rete)
+        client = InMemoryBroker()
+    else:
+        client = mqtt.Client()  # Crea un'istanza del client MQTT
+        client.username_pw_set(params['username'], params['password'])  # Imposta username e password
+        client.on_connect = on_connect  # Imposta la funzione di callback per la connessione
+        AsyncioMqttHelper(asyncio.get_running_loop(), client)  # Il client gira nel ciclo di eventi
+        client.connect(params['broker'], params['port'], 60)  # Connessione al broker MQTT
+    try:
+        await run_gateway(params, client)
+    finally:
+        client.disconnect()  # Disconnetti il client MQTT
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Gateway asyncio seriale -> MQTT")
+    arg_parser.add_argument("--parameters", default=parameters_file, help="file JSON dei parametri")
+    arg_parser.add_argument("--memory-broker", action="store_true", help="usa il broker interno al processo")
+    args = arg_parser.parse_args()
+    params = read_parameters(args.parameters)  # Leggi i parametri dal file JSON
+    setup_logging_from(params)  # La scrittura dei messaggi non blocca il ciclo di eventi
+    try:
+        asyncio.run(main_async(params, args.memory_broker))
+    except KeyboardInterrupt:  # Gestisce l'interruzione manuale (Ctrl+C)
+        log.info("Interruzione manuale")
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
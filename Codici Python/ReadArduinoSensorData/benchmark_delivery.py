@@ -0,0 +1,87 @@
+#########################################################################################
+# benchmark_delivery.py                                                                 #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Throughput della consegna QoS 1 (delivery.py) al variare della finestra di messaggi   #
+# in volo: con finestra 1 ogni messaggio attende la propria conferma ("stop and wait"), #
+# con finestre più ampie le conferme si sovrappongono agli invii.                       #
+# Il broker interno (memory_broker.py) conferma dopo --rtt millisecondi, come un        #
+# broker remoto, e con --loss perde una frazione delle conferme: i messaggi senza       #
+# conferma da --timeout secondi sono contati come persi e liberano il loro posto (con   #
+# un broker vero paho li ritrasmetterebbe alla riconnessione, senza duplicati qui).     #
+# Con --broker i messaggi vanno a un broker vero (duplicati non osservabili).           #
+#                                                                                       #
+# Esempio (5000 messaggi, conferme dopo 5 ms, 1% di conferme perse):                    #
+# python benchmark_delivery.py --messages 5000 --rtt 5 --loss 0.01 --windows 1 10 100   #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per il contenuto dei messaggi
+import time  # Importa la libreria time per misurare i tempi
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+from collections import Counter  # Importa Counter per contare i duplicati
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from delivery import ReliablePublisher  # Importa la consegna a finestra
+
+
+# Funzione che pubblica i messaggi con una finestra e attende le conferme
+def run(client, window, messages, timeout, retries, topic):
+    """Ritorna (secondi, publisher) per 'messages' messaggi con la finestra indicata"""
+    publisher = ReliablePublisher(client, 1, window, timeout, retries)
+    start = time.monotonic()
+    for seq in range(messages):
+        publisher.publish(topic, json.dumps({'seq': seq, 'humidity': 45.0, 'temp_c': 23.0}))
+    publisher.flush(timeout * 2)  # Ultime conferme (o la loro scadenza)
+    elapsed = time.monotonic() - start
+    publisher.close()
+    return elapsed, publisher
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Throughput della consegna QoS 1 a finestra")
+    arg_parser.add_argument("--messages", type=int, default=2000, help="messaggi per ogni finestra")
+    arg_parser.add_argument("--windows", type=int, nargs='+', default=[1, 10, 100], help="finestre da provare")
+    arg_parser.add_argument("--rtt", type=float, default=5, help="millisecondi prima della conferma (broker interno)")
+    arg_parser.add_argument("--loss", type=float, default=0, help="frazione di conferme perse (broker interno)")
+    arg_parser.add_argument("--timeout", type=float, default=0.5, help="secondi senza conferma prima di considerare perso un messaggio")
+    arg_parser.add_argument("--retries", type=int, default=3, help="ritrasmissioni alla riconnessione per messaggio")
+    arg_parser.add_argument("--broker", default=None, help="host:porta di un broker vero (default: broker interno)")
+    args = arg_parser.parse_args()
+
+    client = None
+    if args.broker:  # Un solo client paho per tutte le finestre
+        import paho.mqtt.client as mqtt
+        host, _, port = args.broker.partition(':')
+        client = mqtt.Client()
+        client.max_inflight_messages_set(0)  # Come ReliablePublisher, che a connessione aperta non può cambiarlo
+        client.connect(host, int(port or 1883), 60)
+        client.loop_start()
+        time.sleep(0.5)  # Connessione stabilita
+
+    print(f"{args.messages} messaggi QoS 1, " +
+          (f"broker {args.broker}" if args.broker else f"conferme dopo {args.rtt:g} ms, {args.loss:.1%} perse"))
+    for window in args.windows:
+        received = Counter()
+        target = client
+        if target is None:  # Broker interno nuovo per ogni finestra
+            target = InMemoryBroker(keep_last=1, ack_delay=args.rtt / 1000, ack_loss=args.loss)
+            target.subscribe("bench/delivery", lambda topic, payload, arrival: received.update((json.loads(payload)['seq'],)))
+        elapsed, publisher = run(target, window, args.messages, args.timeout, args.retries, "bench/delivery")
+        line = f"finestra {window:4d}: {args.messages / elapsed:9.1f} messaggi/s in {elapsed:.2f} s; {publisher.stats()}"
+        if client is None:
+            missing = args.messages - len(received)
+            line += f"; {sum(received.values()) - len(received)} duplicati, {missing} mancanti"
+        print(line)
+
+    if client:
+        client.loop_stop()
+        client.disconnect()
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il benchmark
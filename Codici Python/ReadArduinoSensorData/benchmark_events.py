@@ -0,0 +1,136 @@
+#########################################################################################
+# benchmark_events.py                                                                   #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Latenza del canale degli eventi (events.py) mentre il gateway pubblica telemetria:    #
+# un pulsante simulato scrive "1"/"0" su un pseudo-terminale a intervalli casuali       #
+# (con qualche rimbalzo), mentre --devices Arduino simulati (load_generator.py, in      #
+# processi separati) inviano --rate linee al secondo ai dispositivi di gateway.py.      #
+# Entrambi pubblicano su broker interni al processo (memory_broker.py), oppure con      #
+# --broker gli eventi vanno su un broker vero (latenza misurata fino alla conferma).    #
+# Risultati: percentili della latenza dalla scrittura del pulsante alla consegna al     #
+# broker, istogrammi di EventPublisher e rimbalzi eliminati.                            #
+# Funziona solo su sistemi POSIX (Linux, macOS).                                        #
+#                                                                                       #
+# Esempio (200 pressioni con 4 dispositivi a 2000 linee al secondo):                    #
+# python benchmark_events.py --presses 200 --devices 4 --rate 2000                      #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per scrivere sul pseudo-terminale
+import time  # Importa la libreria time per gli istanti di scrittura
+import random  # Importa la libreria random per gli intervalli tra le pressioni
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import threading  # Importa la libreria threading per il canale degli eventi
+import multiprocessing  # Importa la libreria multiprocessing per i generatori di telemetria
+from load_generator import open_pty  # Importa il pseudo-terminale del pulsante simulato
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from serial_reader import open_serial, SerialLineReader  # Importa il lettore di linee
+from events import EventChannel, EventPublisher, low_latency_client, DEBOUNCE  # Importa il canale degli eventi
+from benchmark_pipeline import run_generator, print_latency  # Riusa i generatori e la stampa dei percentili
+from gateway import Device  # Importa la pipeline della telemetria
+
+
+# Valori di default
+BOUNCE_PROBABILITY = 0.2  # Frazione delle pressioni con un rimbalzo (1 -> 0 -> 1 in pochi ms)
+BOUNCE_DELAY = 0.002  # Secondi tra i cambiamenti di un rimbalzo
+
+
+# Funzione che simula il pulsante
+def press_button(fd, presses, interval, sent):
+    """Alterna "1" e "0" a intervalli casuali; registra (istante, stato) di ogni cambiamento valido"""
+    state = 0
+    for _ in range(presses):
+        time.sleep(random.uniform(interval / 2, interval * 1.5))
+        state = 1 - state
+        line = f"{state}\r\n".encode('ascii')
+        sent.append((time.monotonic(), str(state)))
+        os.write(fd, line)
+        if random.random() < BOUNCE_PROBABILITY:  # Rimbalzo: torna indietro e riprende lo stato
+            time.sleep(BOUNCE_DELAY)
+            os.write(fd, f"{1 - state}\r\n".encode('ascii'))
+            time.sleep(BOUNCE_DELAY)
+            os.write(fd, line)
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Latenza del canale degli eventi sotto carico")
+    arg_parser.add_argument("--presses", type=int, default=100, help="cambiamenti di stato del pulsante")
+    arg_parser.add_argument("--interval", type=float, default=0.1, help="secondi medi tra due cambiamenti")
+    arg_parser.add_argument("--devices", type=int, default=2, help="dispositivi di telemetria simulati")
+    arg_parser.add_argument("--rate", type=float, default=1000, help="linee al secondo per dispositivo")
+    arg_parser.add_argument("--qos", type=int, choices=(0, 1), default=1, help="QoS degli eventi")
+    arg_parser.add_argument("--broker", default=None, help="host:porta di un broker vero (default: broker interno)")
+    args = arg_parser.parse_args()
+
+    # Telemetria: un processo per ogni Arduino simulato
+    duration = args.presses * args.interval + 2  # Il carico copre tutte le pressioni
+    connections, processes = [], []
+    for _ in range(args.devices):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_generator, args=(child_conn, args.rate, "text", duration), daemon=True)
+        process.start()
+        connections.append(conn)
+        processes.append(process)
+    ports = [conn.recv() for conn in connections]
+
+    telemetry = InMemoryBroker(keep_last=1)
+    if args.broker:  # Eventi su un broker vero, con un client dedicato
+        host, _, port = args.broker.partition(':')
+        client = low_latency_client()
+        client.connect(host, int(port or 1883), 60)
+        client.loop_start()
+        received = None  # Consegna non osservabile: si usano le conferme
+    else:  # Eventi su un broker interno separato (come un client dedicato), nello stesso processo della telemetria
+        client = InMemoryBroker(keep_last=1)
+        received = []
+        client.subscribe("bench/pulsante", lambda topic, payload, arrival: received.append((arrival, payload.decode())))
+    devices = [Device({'port': port, 'datarate': 115200, 'format': "text", 'topic_prefix': f"bench/dev{index}"},
+                      telemetry, {'PUBLISH_MODE': 'json'}) for index, port in enumerate(ports)]
+    for device in devices:
+        device.start()
+
+    # Canale degli eventi
+    master, slave, name = open_pty()
+    reader = SerialLineReader(open_serial(name, 115200, timeout=DEBOUNCE))
+    os.close(slave)  # La porta ora è aperta dal lettore
+    publisher = EventPublisher(client, "bench/pulsante", args.qos)
+    channel = EventChannel(reader, publisher, DEBOUNCE)
+    thread = threading.Thread(target=channel.run, daemon=True)
+    thread.start()
+    time.sleep(0.5)  # Porte aperte prima di iniziare
+
+    print(f"{args.presses} cambiamenti ogni ~{args.interval * 1000:g} ms, QoS {args.qos}, "
+          f"telemetria {args.devices} x {args.rate:g} linee/s")
+    for conn in connections:
+        conn.send("start")
+    sent = []
+    press_button(master, args.presses, args.interval, sent)
+    time.sleep(DEBOUNCE * 2 + 0.5)  # Ultime conferme
+    for conn in connections:
+        conn.recv()  # Istanti della telemetria (non usati)
+    channel.stop()
+    thread.join()
+    for device in devices:
+        device.stop()  # Prima di chiudere i pty dei generatori
+    for conn, process in zip(connections, processes):
+        conn.send("stop")
+        process.join()
+    os.close(master)
+
+    # Risultati
+    print(channel.stats())
+    if received is not None:
+        latencies = [arrival - written for (written, state), (arrival, payload) in zip(sent, received) if state == payload]
+        print(f"{len(sent)} cambiamenti, {len(received)} eventi consegnati, {len(sent) - len(latencies)} diversi o mancanti")
+        print_latency("Pulsante -> broker", latencies)
+    print(f"Telemetria: {sum(device.publisher.samples for device in devices)} campioni pubblicati")
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il benchmark
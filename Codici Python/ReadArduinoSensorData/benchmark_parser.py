@@ -0,0 +1,94 @@
+#########################################################################################
+# benchmark_parser.py                                                                   #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Confronta la velocità (linee al secondo) dei diversi modi di leggere le linee         #
+# dello sketch DHT11_CORSO_IoT.ino:                                                     #
+# - le catene di split() usate in read_send_v012.py e graphs.py;                        #
+# - le tre espressioni regolari usate da parse_sensor_data() in read_send_v02.py;       #
+# - il parser a passaggio singolo di sensor_parser.py.                                  #
+#                                                                                       #
+# Esempio:                                                                              #
+# python benchmark_parser.py --lines 1000000                                            #
+#########################################################################################
+
+# Importa le librerie necessarie
+import re  # Importa la libreria re per ricreare il parser a tre espressioni regolari
+import time  # Importa la libreria time per misurare i tempi
+import random  # Importa la libreria random per generare le linee sintetiche
+import argparse  # Importa la libreria argparse per leggere le opzioni da riga di comando
+
+from sensor_parser import SensorReading, parse_line, format_line  # Parser a passaggio singolo
+
+
+# Funzione che genera linee sintetiche nel formato dello sketch Arduino
+def generate_lines(count, seed=0):
+    """Genera 'count' linee sintetiche nel formato DHT11_CORSO_IoT.ino"""
+    rng = random.Random(seed)  # Generatore ripetibile
+    lines = []  # Lista delle linee generate
+    for _ in range(count):
+        temp_c = rng.uniform(15, 35)  # Temperatura in °C
+        idc_c = temp_c + rng.uniform(-1, 2)  # Indice di calore in °C
+        lines.append(format_line(SensorReading(
+            rng.uniform(20, 90), temp_c, temp_c * 1.8 + 32, idc_c, idc_c * 1.8 + 32)))
+    return lines
+
+
+# Parser con le catene di split() (come read_send_v012.py e graphs.py)
+def parse_split_chain(line):
+    return (float(line.split(", ")[0].split(" ")[1].split("%")[0]),
+            float(line.split(", ")[1].split(" ")[2].split("°")[0]),
+            float(line.split(", ")[1].split(" ")[3].split("°")[0]),
+            float(line.split(", ")[2].split(" ")[2].split("°")[0]),
+            float(line.split(", ")[2].split(" ")[3].split("°")[0]))
+
+
+# Parser con tre espressioni regolari ricompilate a ogni chiamata (come read_send_v02.py)
+def parse_three_regex(line):
+    data_dict = {}
+    humidity_match = re.search(r"Humidity:\s*([\d.]+)%", line)
+    temperature_match = re.search(r"Temperature:\s*([\d.]+)°C", line)
+    heat_index_match = re.search(r"IdC:\s*([\d.]+)°C", line)
+    if humidity_match:
+        data_dict["Humidity"] = float(humidity_match.group(1))
+    if temperature_match:
+        data_dict["Temperature"] = float(temperature_match.group(1))
+    if heat_index_match:
+        data_dict["IdC"] = float(heat_index_match.group(1))
+    return data_dict
+
+
+# Funzione che misura le linee al secondo di un parser
+def run(name, parser, lines):
+    """Esegue 'parser' su tutte le linee e stampa le linee al secondo"""
+    start = time.perf_counter()  # Istante iniziale
+    for line in lines:  # Elabora tutte le linee
+        parser(line)
+    elapsed = time.perf_counter() - start  # Tempo impiegato
+    rate = len(lines) / elapsed  # Linee al secondo
+    print(f"{name:<24} {rate:>14,.0f} linee/s  ({elapsed:.2f} s)")
+    return rate
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark dei parser delle linee DHT11")
+    arg_parser.add_argument("--lines", type=int, default=1_000_000, help="numero di linee sintetiche")
+    args = arg_parser.parse_args()
+
+    lines = generate_lines(args.lines)  # Genera le linee una sola volta
+    assert parse_line(lines[0]) is not None  # Controlla che il parser riconosca il formato
+
+    print(f"Linee sintetiche: {len(lines):,}")
+    baseline = run("split() concatenati", parse_split_chain, lines)
+    run("tre regex (v0.2)", parse_three_regex, lines)
+    rate = run("sensor_parser", parse_line, lines)
+    print(f"Miglioramento rispetto a split(): {rate / baseline:.1f}x")
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il benchmark
@@ -0,0 +1,176 @@
+#########################################################################################
+# benchmark_pipeline.py                                                                 #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Benchmark end-to-end della pipeline del gateway: lettura dalla seriale, decodifica,   #
+# coda e pubblicazione. Ogni dispositivo è un Arduino simulato (load_generator.py) in   #
+# un processo separato che scrive su un pseudo-terminale; il gateway usa la classe      #
+# Device di gateway.py e pubblica sul broker interno al processo (memory_broker.py).    #
+# Il numero progressivo di ogni campione (campo IdC °F) permette di misurare la         #
+# latenza dalla scrittura sulla seriale alla consegna al broker.                        #
+# Risultati: linee/s sostenute, percentili della latenza, campioni persi, CPU per       #
+# dispositivo (thread lettore + pubblicazione, solo Linux) e memoria del processo.      #
+# Funziona solo su sistemi POSIX (Linux, macOS).                                        #
+#                                                                                       #
+# Esempio (4 dispositivi, 2000 linee al secondo ciascuno per 10 secondi):               #
+# python benchmark_pipeline.py --devices 4 --rate 2000 --duration 10                    #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per chiudere i pseudo-terminali e leggere /proc
+import json  # Importa la libreria json per leggere i messaggi pubblicati
+import time  # Importa la libreria time per misurare i tempi
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import multiprocessing  # Importa la libreria multiprocessing per i generatori in processi separati
+from binary_protocol import FORMAT_TEXT, FORMAT_BINARY  # Importa i formati della seriale
+from load_generator import LoadGenerator, open_pty  # Importa l'Arduino simulato
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from aggregation import exact_quantile  # Importa il calcolo dei percentili
+from gateway import Device  # Importa la pipeline di un dispositivo del gateway
+import pipeline  # Importa i valori di default della coda
+
+
+# Valori di default
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)  # Percentili della latenza riportati
+DRAIN_TIMEOUT = 2.0  # Secondi senza nuovi messaggi dopo i quali la pipeline è considerata svuotata
+
+
+# Funzione eseguita nel processo di ogni Arduino simulato
+def run_generator(conn, rate, serial_format, duration):
+    """Crea il pty, attende il via, scrive per 'duration' secondi e rimanda gli istanti di invio"""
+    master, slave, name = open_pty()
+    conn.send(name)  # Nome della porta per il gateway
+    conn.recv()  # Via: il gateway ha aperto la porta
+    os.close(slave)
+    generator = LoadGenerator(master, rate, serial_format, sequence=True)
+    generator.run(duration)
+    conn.send(generator.send_times)  # Istanti (monotoni, comuni a tutti i processi) di ogni campione
+    conn.recv()  # Chiude il pty solo quando il gateway ha finito di leggere
+    os.close(master)
+
+
+# Funzione che legge il tempo di CPU di un thread (Linux)
+def thread_cpu_time(native_id):
+    """Secondi di CPU (utente + sistema) del thread, None se /proc non è disponibile"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as file:
+            fields = file.read().rsplit(')', 1)[1].split()  # Campi dopo il nome del thread
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime + stime
+
+
+# Funzione che legge la memoria residente del processo
+def resident_memory():
+    """Byte di memoria residente (RSS) attuale, None se /proc non è disponibile"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+# Funzione che somma il tempo di CPU dei thread di un dispositivo
+def device_cpu_time(device):
+    times = [thread_cpu_time(thread.native_id) for thread in (device.reader_thread, device.publisher_thread)]
+    return None if None in times else sum(times)
+
+
+# Funzione che stampa i percentili di una lista di latenze
+def print_latency(name, latencies):
+    if not latencies:
+        print(f"{name}: nessun campione ricevuto")
+        return
+    latencies.sort()
+    values = ", ".join(f"p{q * 100:g} {exact_quantile(latencies, q) * 1000:.2f}" for q in PERCENTILES)
+    print(f"{name}: latenza ms {values}, max {latencies[-1] * 1000:.2f}")
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark end-to-end della pipeline seriale -> MQTT")
+    arg_parser.add_argument("--devices", type=int, default=1, help="numero di dispositivi simulati")
+    arg_parser.add_argument("--rate", type=float, default=1000, help="linee al secondo per dispositivo (0 = massimo)")
+    arg_parser.add_argument("--duration", type=float, default=10, help="secondi di generazione")
+    arg_parser.add_argument("--format", choices=(FORMAT_TEXT, FORMAT_BINARY), default=FORMAT_TEXT, help="formato della seriale")
+    arg_parser.add_argument("--queue-size", type=int, default=pipeline.QUEUE_SIZE, help="dimensione della coda di ogni dispositivo")
+    args = arg_parser.parse_args()
+
+    # Un processo per ogni Arduino simulato (la generazione non pesa sulla CPU misurata)
+    connections, processes = [], []
+    for _ in range(args.devices):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_generator, args=(child_conn, args.rate, args.format, args.duration), daemon=True)
+        process.start()
+        connections.append(conn)
+        processes.append(process)
+    ports = [conn.recv() for conn in connections]
+
+    # Ricezione: i messaggi vengono solo registrati, la decodifica avviene dopo la misura
+    broker = InMemoryBroker(keep_last=1)
+    received = [[] for _ in ports]  # (istante di ricezione, payload) per dispositivo
+    def subscriber(index):
+        return lambda topic, payload, arrival: received[index].append((arrival, payload))
+    for index in range(len(ports)):
+        broker.subscribe(f"bench/dev{index}/sample", subscriber(index))
+
+    memory_before = resident_memory()
+    params = {'PUBLISH_MODE': 'json', 'QUEUE_SIZE': args.queue_size}
+    devices = [Device({'port': port, 'datarate': 115200, 'format': args.format, 'topic_prefix': f"bench/dev{index}"}, broker, params)
+               for index, port in enumerate(ports)]
+    for device in devices:
+        device.start()
+    cpu_before = [device_cpu_time(device) for device in devices]
+    process_before = time.process_time()
+    start = time.monotonic()
+    for conn in connections:
+        conn.send("start")
+    print(f"{args.devices} dispositivi, {args.rate:g} linee/s ciascuno, {args.duration:g} s, formato {args.format}")
+
+    send_times = [conn.recv() for conn in connections]  # I generatori hanno finito
+    count = sum(len(received_list) for received_list in received)
+    last_change = time.monotonic()
+    while time.monotonic() - last_change < DRAIN_TIMEOUT:  # Attende che la pipeline si svuoti
+        time.sleep(0.1)
+        new_count = sum(len(received_list) for received_list in received)
+        if new_count != count:
+            count, last_change = new_count, time.monotonic()
+    cpu_after = [device_cpu_time(device) for device in devices]
+    process_cpu = time.process_time() - process_before
+    memory_after = resident_memory()
+    for device in devices:
+        device.stop()
+    for conn, process in zip(connections, processes):
+        conn.send("stop")
+        process.join()
+
+    # Risultati
+    all_latencies = []
+    last_arrival = start
+    for index, device in enumerate(devices):
+        latencies = []
+        for arrival, payload in received[index]:
+            sequence = int(json.loads(payload)['idc_f'])
+            latencies.append(arrival - send_times[index][sequence])
+            last_arrival = max(last_arrival, arrival)
+        sent = len(send_times[index])
+        lost = sent - len(latencies)
+        busy = "n/d" if None in (cpu_before[index], cpu_after[index]) else f"{cpu_after[index] - cpu_before[index]:.2f} s CPU"
+        print(f"{device.port}: {sent} inviati, {len(latencies)} pubblicati, {lost} persi ({device.queue.dropped} per coda piena), {busy}")
+        print_latency(device.port, latencies)
+        all_latencies.extend(latencies)
+    elapsed = last_arrival - start
+    print(f"Totale: {len(all_latencies) / elapsed:,.0f} linee/s sostenute in {elapsed:.2f} s, "
+          f"CPU del processo {process_cpu:.2f} s ({process_cpu / elapsed * 100:.0f}% di un core)")
+    print_latency("Totale", all_latencies)
+    if memory_before is not None:
+        growth = memory_after - memory_before
+        print(f"Memoria: {memory_after / 2**20:.1f} MiB residenti, {growth / 2**20 / args.devices:.2f} MiB per dispositivo (messaggi registrati inclusi)")
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il benchmark
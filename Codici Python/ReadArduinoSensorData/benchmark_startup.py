@@ -0,0 +1,89 @@
+#########################################################################################
+# benchmark_startup.py                                                                  #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Tempo di avvio a freddo dei sottocomandi di cli.py: ogni prova è un nuovo processo    #
+# Python che esegue "cli.py <sottocomando> --check" (lettura e controllo dei parametri  #
+# e import dei moduli, senza aprire porte o connessioni), come un riavvio di systemd.   #
+# Per ogni sottocomando: mediana, minimo e massimo su --runs prove, confrontati con il  #
+# budget (BUDGETS, in millisecondi); con --imports anche i moduli più lenti da          #
+# importare (python -X importtime). Il codice di uscita è 1 se una mediana supera il    #
+# budget: lo script si può usare come controllo automatico dopo una modifica.           #
+#                                                                                       #
+# Esempio (10 prove per sottocomando, con i 5 import più lenti):                        #
+# python benchmark_startup.py --runs 10 --imports 5                                     #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per il percorso di cli.py
+import sys  # Importa la libreria sys per l'interprete Python in uso
+import time  # Importa la libreria time per misurare i tempi
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import subprocess  # Importa la libreria subprocess per avviare i processi
+from aggregation import exact_quantile  # Importa il calcolo dei percentili
+
+
+# Valori di default
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')  # Punto di avvio misurato
+BUDGETS = {'--help': 150, 'read': 250, 'forward': 400, 'plot': 1500, 'synth': 1500}  # Millisecondi di avvio ammessi
+
+
+# Funzione che misura un avvio a freddo
+def measure(command, config):
+    """Secondi dall'avvio del processo alla sua uscita"""
+    args = [sys.executable, CLI] + (["--help"] if command == "--help" else [command, "--check", "--config", config])
+    start = time.perf_counter()
+    result = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"{command}: uscita con codice {result.returncode}\n{result.stderr}")
+    return elapsed
+
+
+# Funzione che elenca i moduli più lenti da importare
+def slowest_imports(command, config, count):
+    """Ritorna [(millisecondi cumulativi, modulo)] dei moduli di primo livello più lenti"""
+    args = [sys.executable, "-X", "importtime", CLI] + (["--help"] if command == "--help" else [command, "--check", "--config", config])
+    result = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():  # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):  # Solo gli import di primo livello
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Tempo di avvio a freddo dei sottocomandi di cli.py")
+    arg_parser.add_argument("--commands", nargs='+', default=list(BUDGETS), choices=list(BUDGETS), help="sottocomandi da misurare")
+    arg_parser.add_argument("--runs", type=int, default=5, help="prove per sottocomando")
+    arg_parser.add_argument("--config", default="parameters.json", help="file dei parametri")
+    arg_parser.add_argument("--imports", type=int, default=0, help="moduli più lenti da mostrare (0 = nessuno)")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="moltiplica i budget (es. 2 su una macchina lenta)")
+    args = arg_parser.parse_args()
+
+    over_budget = []
+    for command in args.commands:
+        measure(command, args.config)  # Prima prova non contata: riempie la cache dei file del sistema operativo
+        times = sorted(measure(command, args.config) * 1000 for _ in range(args.runs))
+        median = exact_quantile(times, 0.5)
+        budget = BUDGETS[command] * args.scale
+        status = "ok" if median <= budget else "OLTRE IL BUDGET"
+        print(f"{command:8s} mediana {median:7.1f} ms, min {times[0]:7.1f}, max {times[-1]:7.1f} "
+              f"(budget {budget:g} ms) {status}")
+        if median > budget:
+            over_budget.append(command)
+        for cumulative, name in slowest_imports(command, args.config, args.imports):
+            print(f"    {cumulative:7.1f} ms  {name}")
+    return 1 if over_budget else 0
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    sys.exit(main())  # 1 se almeno un sottocomando supera il budget
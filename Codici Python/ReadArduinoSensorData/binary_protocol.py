@@ -0,0 +1,147 @@
+#########################################################################################
+# binary_protocol.py                                                                    #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Protocollo binario compatto, alternativo alla linea di testo di ~90 byte stampata     #
+# dallo sketch DHT11_CORSO_IoT.ino (abilitato con BINARY_PROTOCOL 1 nello sketch).      #
+#                                                                                       #
+# Formato di un frame (23 byte):                                                        #
+#   SYNC (1 byte, 0xA5) | LEN (1 byte, 20) | 5 x float32 little-endian | CRC-8          #
+# I campi float sono: umidità, °C, °F, IdC °C, IdC °F. Il CRC-8 (polinomio 0x07)        #
+# è calcolato sui byte LEN + dati.                                                      #
+# Nella modalità grezza dello sketch (RAW_ONLY 1) il frame contiene solo umidità e °C   #
+# (LEN 8, 11 byte): gli altri campi valgono NaN e vengono calcolati sul PC (derived.py). #
+#                                                                                       #
+# Il decodificatore lavora direttamente sul bytearray di ricezione tramite              #
+# struct.unpack_from, senza copiare i dati, e si risincronizza sul byte SYNC            #
+# successivo se un frame è corrotto.                                                    #
+#########################################################################################
+
+# Importa le librerie necessarie
+import struct  # Importa la libreria struct per decodificare i float32
+from sensor_parser import SensorReading, MISSING  # Importa il record con i cinque valori
+
+
+# Costanti del protocollo
+SYNC = 0xA5  # Byte di sincronizzazione all'inizio di ogni frame
+PAYLOAD = struct.Struct('<5f')  # Cinque float32 little-endian (come i float di Arduino)
+PAYLOAD_SIZE = PAYLOAD.size  # Lunghezza dei dati (20 byte)
+FRAME_SIZE = 2 + PAYLOAD_SIZE + 1  # SYNC + LEN + dati + CRC
+RAW_PAYLOAD = struct.Struct('<2f')  # Modalità grezza: umidità e °C
+RAW_FRAME_SIZE = 2 + RAW_PAYLOAD.size + 1  # 11 byte
+PAYLOADS = {PAYLOAD_SIZE: PAYLOAD, RAW_PAYLOAD.size: RAW_PAYLOAD}  # Formato dei dati per ogni valore di LEN
+
+# Formati della seriale selezionabili in parameters.json (SERIAL_FORMAT)
+FORMAT_TEXT = "text"  # Linee di testo (formato originale dello sketch)
+FORMAT_BINARY = "binary"  # Frame binari compatti
+FORMAT_AUTO = "auto"  # Riconoscimento automatico dai primi byte ricevuti
+DETECT_LIMIT = 4 * FRAME_SIZE + 128  # Byte oltre i quali, senza frame validi, si assume il testo
+
+
+# Tabella precalcolata del CRC-8 (polinomio 0x07)
+def _crc8_table():
+    table = []  # Un valore per ogni byte possibile
+    for byte in range(256):
+        crc = byte  # Valore iniziale
+        for _ in range(8):  # Elabora gli 8 bit
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()  # Calcolata una sola volta all'import
+
+
+# Funzione che calcola il CRC-8 di una sequenza di byte
+def crc8(data):
+    """CRC-8 (polinomio 0x07, valore iniziale 0)"""
+    crc = 0  # Valore iniziale
+    for byte in data:  # Un accesso alla tabella per ogni byte
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+# Funzione che costruisce un frame a partire da una lettura (usata per test e simulazioni)
+def encode_frame(reading):
+    """Ritorna i byte del frame corrispondente a un SensorReading"""
+    body = bytes([PAYLOAD_SIZE]) + PAYLOAD.pack(*reading)  # LEN + dati
+    return bytes([SYNC]) + body + bytes([crc8(body)])  # SYNC + LEN + dati + CRC
+
+
+# Funzione che costruisce il frame grezzo (solo umidità e °C) di una lettura
+def encode_raw_frame(reading):
+    """Ritorna i byte del frame della modalità grezza"""
+    body = bytes([RAW_PAYLOAD.size]) + RAW_PAYLOAD.pack(reading.humidity, reading.temp_c)  # LEN + dati
+    return bytes([SYNC]) + body + bytes([crc8(body)])
+
+
+# Decodificatore incrementale dei frame ricevuti dalla seriale
+class FrameDecoder:
+    """Estrae i SensorReading dai byte ricevuti, risincronizzandosi sui frame corrotti"""
+
+    def __init__(self):
+        self._buffer = bytearray()  # Byte ricevuti ma non ancora decodificati
+        self.frames = 0  # Frame validi decodificati
+        self.crc_errors = 0  # Frame scartati per CRC errato
+        self.skipped_bytes = 0  # Byte scartati durante la ricerca del SYNC
+
+    def feed(self, data):
+        """Aggiunge i byte ricevuti e ritorna la lista delle letture complete"""
+        buffer = self._buffer  # Riferimento locale (più veloce)
+        buffer += data  # Accoda i nuovi byte
+        view = memoryview(buffer)  # Vista sui byte, senza copie
+        readings = []  # Letture decodificate in questa chiamata
+        pos = 0  # Posizione di lettura nel buffer
+        end = len(buffer)  # Fine dei dati disponibili
+        try:
+            while end - pos >= RAW_FRAME_SIZE:  # C'è spazio per almeno il frame più corto
+                if buffer[pos] != SYNC:  # Non siamo all'inizio di un frame
+                    sync = buffer.find(SYNC, pos)  # Cerca il prossimo SYNC
+                    if sync < 0:  # Nessun SYNC: tutti i byte sono spazzatura
+                        self.skipped_bytes += end - pos
+                        pos = end
+                        break
+                    self.skipped_bytes += sync - pos  # Conta i byte saltati
+                    pos = sync
+                    continue
+                payload = PAYLOADS.get(buffer[pos + 1])  # Formato indicato da LEN (None = falso SYNC)
+                if payload is not None:
+                    size = payload.size + 3  # Byte del frame
+                    if end - pos < size:  # Frame non ancora completo
+                        break
+                if payload is None or crc8(view[pos + 1:pos + size - 1]) != buffer[pos + size - 1]:
+                    self.crc_errors += 1  # Frame corrotto (o falso SYNC)
+                    self.skipped_bytes += 1
+                    pos += 1  # Riprova dal byte successivo
+                    continue
+                values = [round(value, 2) for value in payload.unpack_from(buffer, pos + 2)]  # Due decimali, come lo sketch
+                if payload is RAW_PAYLOAD:  # Campi calcolati in seguito sul PC
+                    values += [MISSING, MISSING, MISSING]
+                readings.append(SensorReading(*values))
+                self.frames += 1
+                pos += size  # Passa al frame successivo
+        finally:
+            view.release()  # Rilascia la vista prima di modificare il buffer
+        if pos:  # Rimuove in un colpo solo i byte già elaborati
+            del buffer[:pos]
+        return readings
+
+
+# Funzione che riconosce il formato della seriale dai primi byte ricevuti
+def detect_format(data):
+    """Ritorna FORMAT_BINARY, FORMAT_TEXT oppure None se servono altri byte"""
+    pos = data.find(SYNC)  # Cerca un possibile inizio di frame
+    while 0 <= pos <= len(data) - RAW_FRAME_SIZE:  # Frame (almeno quello grezzo) completo disponibile
+        payload = PAYLOADS.get(data[pos + 1])
+        size = payload.size + 3 if payload else 0
+        if payload and pos + size <= len(data) and crc8(data[pos + 1:pos + size - 1]) == data[pos + size - 1]:  # Frame valido
+            return FORMAT_BINARY
+        pos = data.find(SYNC, pos + 1)  # Prova il SYNC successivo
+    if b"Humidity" in data or (b"\n" in data and SYNC not in data):  # Linea di testo dello sketch
+        return FORMAT_TEXT
+    if len(data) >= DETECT_LIMIT:  # Nessun frame valido in abbastanza byte
+        return FORMAT_TEXT
+    return None  # Servono altri byte per decidere
@@ -0,0 +1,258 @@
+#########################################################################################
+# capture.py                                                                            #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Registrazione e riproduzione dei byte grezzi ricevuti dalla seriale, per riprodurre   #
+# in laboratorio i problemi visti sul campo, ripopolare il broker o l'archivio dopo     #
+# un'interruzione e misurare il parser su traffico reale.                               #
+#                                                                                       #
+# Formato del file (.scap), little-endian:                                              #
+#   intestazione: 'SCAP', versione (uint16), orario di inizio (float64, epoch)          #
+#   record:       microsecondi dal record precedente (uint32), lunghezza (uint16), byte #
+# Ogni record è un blocco letto dalla seriale (6 byte in più per blocco). Un record     #
+# troncato alla fine del file (es. per un'interruzione di corrente) viene ignorato.     #
+#                                                                                       #
+# ReplaySerial ha la stessa interfaccia di lettura di serial.Serial: i lettori di       #
+# serial_reader.py e tutta la pipeline (gateway, read_send_v02.py) la usano al posto    #
+# della porta vera. Il file è mappato in memoria (mmap) e riprodotto a velocità 1x, Nx  #
+# oppure massima (speed=0); gli istanti di arrivo sono quelli originali, quindi broker  #
+# e archivio (tsdb.py) ricevono i timestamp della registrazione.                        #
+#                                                                                       #
+# Esempi:                                                                               #
+# python capture.py record COM5 --baud 9600 --out campo.scap                            #
+# python capture.py info campo.scap                                                     #
+# python capture.py replay campo.scap --speed 0        (linee/s del parser)             #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per le dimensioni del file
+import mmap  # Importa la libreria mmap per leggere il file senza caricarlo in memoria
+import time  # Importa la libreria time per gli istanti dei record e la velocità di riproduzione
+import struct  # Importa la libreria struct per intestazione e record
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+
+
+# Formato del file
+MAGIC = b"SCAP"  # Firma del file
+VERSION = 1  # Versione del formato
+HEADER = struct.Struct('<4sHd')  # Firma, versione, orario di inizio
+RECORD = struct.Struct('<IH')  # Microsecondi dal record precedente, lunghezza
+MAX_DELTA = 2**32 - 1  # Intervallo massimo (µs) di un record (circa 71 minuti)
+MAX_CHUNK = 2**16 - 1  # Byte massimi di un record
+
+# Valori di default
+FLUSH_INTERVAL = 1.0  # Secondi massimi prima di scrivere su disco i record in memoria
+READ_TIMEOUT = 0.5  # Attesa massima di read() durante la riproduzione (come la porta vera)
+
+
+# Classe che registra i blocchi letti dalla seriale
+class CaptureWriter:
+    """Scrive i blocchi di byte con il loro istante di arrivo"""
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        self._last = time.monotonic()  # Istante del record precedente (monotono: immune ai cambi di orario)
+        self._flushed = self._last  # Istante dell'ultima scrittura su disco
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data):
+        """Registra un blocco appena letto"""
+        now = time.monotonic()
+        delta = round((now - self._last) * 1e6)
+        self._last = now
+        while delta > MAX_DELTA:  # Pausa più lunga di un record: record vuoti intermedi
+            self.file.write(RECORD.pack(MAX_DELTA, 0))
+            delta -= MAX_DELTA
+        for start in range(0, len(data), MAX_CHUNK):  # Blocchi molto lunghi divisi in più record
+            chunk = data[start:start + MAX_CHUNK]
+            self.file.write(RECORD.pack(delta, len(chunk)))
+            self.file.write(chunk)
+            delta = 0
+        self.records += 1
+        self.bytes += len(data)
+        if now - self._flushed >= self.flush_interval:  # Limita i byte persi in caso di interruzione
+            self.file.flush()
+            self._flushed = now
+
+    def close(self):
+        self.file.close()
+
+
+# Classe che legge un file di registrazione mappato in memoria
+class CaptureFile:
+    """Record (secondi dall'inizio, byte) di un file .scap"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # Il sistema carica solo le pagine lette
+        magic, version, self.start_time = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path}: non è un file di registrazione valido")
+
+    def records(self):
+        """Generatore di (secondi dall'inizio, memoryview dei byte)"""
+        view = memoryview(self._map)
+        pos, size, elapsed_us = HEADER.size, len(view), 0
+        try:
+            while pos + RECORD.size <= size:
+                delta, length = RECORD.unpack_from(view, pos)
+                pos += RECORD.size
+                if pos + length > size:  # Record troncato alla fine del file
+                    break
+                elapsed_us += delta
+                yield elapsed_us / 1e6, view[pos:pos + length]
+                pos += length
+        finally:
+            view.release()
+
+    def close(self):
+        self._map.close()
+
+
+# Porta seriale "finta" che riproduce un file di registrazione
+class ReplaySerial:
+    """Interfaccia di lettura di serial.Serial; speed=1 tempo reale, N volte più veloce, 0 = massima"""
+
+    def __init__(self, path, speed=1.0, timeout=READ_TIMEOUT):
+        self.name = self.port = path  # Nome mostrato nei messaggi e nelle statistiche
+        self.speed = speed
+        self.timeout = timeout
+        self.capture = CaptureFile(path)
+        self._records = self.capture.records()
+        self._time = 0.0  # Secondi dall'inizio della registrazione del record corrente
+        self._data = b""  # Byte del record corrente
+        self._pos = 0  # Byte del record corrente già restituiti
+        self._start = None  # Istante (monotono) corrispondente all'inizio della registrazione
+        self.finished = False  # True a file terminato: il lettore si ferma (serial_reader.py)
+        self.is_open = True
+
+    def _advance(self):
+        """Passa al prossimo record non vuoto; False a file terminato"""
+        for self._time, self._data in self._records:
+            if self._data:
+                self._pos = 0
+                return True
+        self.finished = True
+        return False
+
+    def _wait(self):
+        """Secondi mancanti all'istante del record corrente (alla velocità di riproduzione)"""
+        if not self.speed:
+            return 0.0
+        if self._start is None:  # Il primo record viene riprodotto subito
+            self._start = time.monotonic() - self._time / self.speed
+        return self._start + self._time / self.speed - time.monotonic()
+
+    def read(self, size=1):
+        """Byte del record corrente, attendendo il suo istante (al più 'timeout' secondi)"""
+        if self._pos >= len(self._data) and not self._advance():
+            time.sleep(min(self.timeout or 0, 0.01))  # Fine del file: nessuna attesa attiva
+            return b""
+        wait = self._wait()
+        if wait > 0:
+            time.sleep(min(wait, self.timeout))
+            if wait > self.timeout:  # Record non ancora dovuto: ritorna vuoto come allo scadere del timeout
+                return b""
+        chunk = bytes(self._data[self._pos:self._pos + size])
+        self._pos += len(chunk)
+        return chunk
+
+    @property
+    def in_waiting(self):
+        """Byte ancora da leggere del record corrente"""
+        return len(self._data) - self._pos
+
+    def clock(self):
+        """Istante di arrivo originale del record corrente, nella scala di time.monotonic()"""
+        return self.capture.start_time + self._time - (time.time() - time.monotonic())
+
+    def close(self):
+        self.is_open = False
+        self._data = b""
+        self._records.close()  # Rilascia la memoryview prima di chiudere la mappa
+        self.capture.close()
+
+
+# Registrazione da riga di comando, senza decodifica né pubblicazione
+def record(args):
+    from serial_reader import open_port  # Importato qui: info e replay non richiedono pyserial
+    port = open_port(args.port, args.baud)
+    writer = CaptureWriter(args.out)
+    start = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - start < args.duration:
+            data = port.read(1)  # Attende il primo byte (al più READ_TIMEOUT)
+            if data:
+                waiting = port.in_waiting
+                if waiting:
+                    data += port.read(waiting)
+                writer.write(data)
+    except KeyboardInterrupt:  # Gestisce l'interruzione manuale (Ctrl+C)
+        pass
+    finally:
+        writer.close()
+        port.close()
+    print(f"{writer.records} blocchi, {writer.bytes} byte registrati in {args.out}")
+
+
+def info(args):
+    capture = CaptureFile(args.file)
+    count = total = 0
+    elapsed = 0.0
+    for elapsed, data in capture.records():
+        count += 1
+        total += len(data)
+        data.release()  # Nessun riferimento alla mappa: può essere chiusa
+    print(f"Inizio: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture.start_time))}")
+    print(f"{count} record, {total} byte, {elapsed:.1f} s, {os.path.getsize(args.file)} byte su disco")
+    capture.close()
+
+
+def replay(args):
+    """Riproduce il file attraverso il lettore e il parser e stampa le letture al secondo"""
+    from serial_reader import open_reader  # Stesso lettore usato sulla porta vera
+    port = ReplaySerial(args.file, args.speed)
+    reader = open_reader(port, args.format)
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.timed_readings())  # Si ferma da solo a fine file
+    elapsed = time.perf_counter() - start
+    active = reader.active
+    print(f"{count} letture in {elapsed:.2f} s ({count / elapsed:,.0f} letture/s), "
+          f"{active.parse_errors} scartate {active.line_errors}")
+    port.close()
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Registrazione e riproduzione della seriale")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('record', help="registra i byte di una porta seriale")
+    command.add_argument('port', help="porta seriale (es. COM5 o /dev/ttyACM0)")
+    command.add_argument('--baud', type=int, default=9600, help="velocità della porta")
+    command.add_argument('--out', default="capture.scap", help="file di registrazione")
+    command.add_argument('--duration', type=float, default=None, help="secondi di registrazione (default: fino a Ctrl+C)")
+    command.set_defaults(run=record)
+    command = commands.add_parser('info', help="riepilogo di un file di registrazione")
+    command.add_argument('file')
+    command.set_defaults(run=info)
+    command = commands.add_parser('replay', help="decodifica un file di registrazione e misura la velocità")
+    command.add_argument('file')
+    command.add_argument('--speed', type=float, default=0, help="1 = tempo reale, N = N volte più veloce, 0 = massima")
+    command.add_argument('--format', default="auto", help="formato della seriale (text, binary o auto)")
+    command.set_defaults(run=replay)
+    args = arg_parser.parse_args()
+    args.run(args)
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale
@@ -0,0 +1,115 @@
+#########################################################################################
+# cli.py                                                                                #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Punto di avvio unico degli strumenti del corso:                                       #
+#   python cli.py read      stampa le linee della porta seriale (read.py)               #
+#   python cli.py forward   gateway dalle porte seriali al broker MQTT (gateway.py)     #
+#   python cli.py plot      grafici in tempo reale dalla porta seriale (graphs.py)      #
+#   python cli.py synth     grafici di dati sintetici, senza Arduino (graphs_synth.py)  #
+# 'parameters.json' (o --config) viene letto e controllato una sola volta (config.py):  #
+# un errore nei parametri ferma l'avvio con l'elenco completo dei problemi.             #
+# Ogni sottocomando importa le proprie dipendenze solo quando viene scelto: paho-mqtt   #
+# serve solo a forward, matplotlib solo a plot e synth; "--help" non importa nulla.     #
+# Con --check il sottocomando controlla i parametri, importa i moduli ed esce senza     #
+# aprire porte o connessioni (es. ExecStartPre di systemd, o benchmark_startup.py).     #
+#                                                                                       #
+# Esempio di servizio systemd (WorkingDirectory = cartella di parameters.json):         #
+#   ExecStartPre=/usr/bin/python3 cli.py forward --check                                #
+#   ExecStart=/usr/bin/python3 cli.py forward                                           #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per la cartella dei grafici
+import sys  # Importa la libreria sys per il percorso di ricerca dei moduli e il codice di uscita
+import argparse  # Importa la libreria argparse per i sottocomandi
+from config import load_config, ConfigError, PARAMETERS_FILE  # Importa la lettura controllata dei parametri
+
+
+# Cartella dei moduli dei grafici (graphs.py, graphs_synth.py, live_plot.py)
+GRAPHS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Graphs')
+
+
+# Funzioni che importano le dipendenze di un sottocomando e ritornano la funzione da eseguire
+def load_read():
+    import read  # Solo pyserial
+    return lambda args, config: read.main(args.port or config.get('SERIAL_COM_PORT', read.SERIAL_COM_PORT),
+                                          args.datarate or config.get('SERIAL_DATARATE', read.SERIAL_DATARATE))
+
+
+def load_forward():
+    import gateway  # pyserial e i moduli della pipeline
+    import paho.mqtt.client  # Importato da gateway.main(): qui perché --check misuri tutto l'avvio
+    return lambda args, config: gateway.main(config)
+
+
+def load_plot():
+    if GRAPHS_DIR not in sys.path:
+        sys.path.insert(0, GRAPHS_DIR)
+    import graphs  # pyserial e NumPy
+    import live_plot  # matplotlib: importato da graphs.main(), qui perché --check misuri tutto l'avvio
+    return lambda args, config: graphs.main(args.port or config.get('SERIAL_COM_PORT', graphs.SERIAL_COM_PORT),
+                                            args.datarate or config.get('SERIAL_DATARATE', graphs.SERIAL_DATARATE),
+                                            args.history)
+
+
+def load_synth():
+    if GRAPHS_DIR not in sys.path:
+        sys.path.insert(0, GRAPHS_DIR)
+    import graphs_synth  # NumPy
+    import live_plot  # matplotlib, come per plot
+    return lambda args, config: graphs_synth.main()
+
+
+# Sottocomandi: nome -> (funzione di caricamento, descrizione, True se servono i parametri)
+COMMANDS = {
+    'read': (load_read, "stampa le linee ricevute dalla porta seriale", True),
+    'forward': (load_forward, "inoltra le letture delle porte seriali al broker MQTT (gateway)", True),
+    'plot': (load_plot, "grafici in tempo reale delle letture della porta seriale", True),
+    'synth': (load_synth, "grafici in tempo reale di dati sintetici (senza Arduino)", False),
+}
+
+
+# Funzione che crea il parser della riga di comando
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)  # Opzioni comuni a tutti i sottocomandi
+    common.add_argument("--config", default=PARAMETERS_FILE, help="file dei parametri (default: %(default)s)")
+    common.add_argument("--check", action="store_true", help="controlla parametri e moduli ed esce")
+    serial = argparse.ArgumentParser(add_help=False)  # Opzioni della porta seriale (al posto dei parametri)
+    serial.add_argument("--port", help="porta seriale (default: SERIAL_COM_PORT)")
+    serial.add_argument("--datarate", type=int, help="velocità della porta (default: SERIAL_DATARATE)")
+
+    arg_parser = argparse.ArgumentParser(prog="cli.py", description="Strumenti del corso IoT: lettura, inoltro e grafici")
+    commands = arg_parser.add_subparsers(dest="command", required=True, metavar="{" + ",".join(COMMANDS) + "}")
+    commands.add_parser('read', parents=[common, serial], help=COMMANDS['read'][1])
+    commands.add_parser('forward', parents=[common], help=COMMANDS['forward'][1])
+    plot = commands.add_parser('plot', parents=[common, serial], help=COMMANDS['plot'][1])
+    plot.add_argument("--history", type=float, default=0, help="secondi di storico da mostrare (0 = ultimi punti)")
+    commands.add_parser('synth', parents=[common], help=COMMANDS['synth'][1])
+    return arg_parser
+
+
+# Funzione principale
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    load, _, needs_config = COMMANDS[args.command]
+    config = {}
+    if needs_config:
+        try:
+            config = load_config(args.config)  # Letto e controllato una sola volta per tutto il programma
+        except ConfigError as e:
+            print(f"Parametri non validi: {e}", file=sys.stderr)
+            return 2
+    run = load()  # Importa solo le dipendenze del sottocomando
+    if args.check:
+        print(f"{args.command}: parametri e moduli pronti")
+        return 0
+    return run(args, config)
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    sys.exit(main())  # Codice di uscita: 0 = tutto bene, 2 = parametri non validi
@@ -0,0 +1,225 @@
+#########################################################################################
+# config.py                                                                             #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Lettura e controllo di 'parameters.json' in un solo punto: load_config() legge il     #
+# file una volta, controlla tipo e valore di ogni parametro conosciuto e segnala tutti  #
+# gli errori insieme (ConfigError), prima di aprire porte o connessioni.                #
+# Il risultato (Config) si usa come il dizionario di json.load (params.get(...), con i  #
+# default di ogni script) oppure per attributo (config.broker); la lista DEVICES è      #
+# sempre presente, con i campi mancanti di ogni dispositivo già completati. Anche ogni  #
+# elemento di DEVICES e di AGGREGATE_WINDOWS è controllato con il proprio schema.       #
+# I parametri sconosciuti (es. un nome scritto male) vengono solo segnalati nel log.    #
+# Il modulo importa solo costanti da moduli leggeri: nessuna dipendenza esterna.        #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per leggere il file dei parametri
+import logging  # Importa la libreria logging per i parametri sconosciuti
+from binary_protocol import FORMAT_TEXT, FORMAT_BINARY, FORMAT_AUTO  # Importa i formati della seriale
+from mqtt_publisher import MODE_FIELDS, MODE_JSON, MODE_PACKED, TOPIC_PREFIX  # Importa le modalità di pubblicazione
+from pipeline import DROP_OLDEST, DROP_NEWEST  # Importa le politiche della coda
+from aggregation import MODE_TUMBLING, MODE_SLIDING  # Importa i tipi di finestra di aggregazione
+
+
+# Valori di default
+PARAMETERS_FILE = "parameters.json"  # File dei parametri (nella cartella di lavoro)
+DATARATE = 9600  # Velocità della porta se non indicata
+
+log = logging.getLogger(__name__)  # Logger della configurazione
+
+
+# Funzioni di controllo dei valori
+def _port(value):
+    return 0 < value < 65536
+
+def _optional_port(value):  # 0 = servizio disattivato
+    return 0 <= value < 65536
+
+def _positive(value):
+    return value > 0
+
+def _not_negative(value):
+    return value >= 0
+
+
+NUMBER = (int, float)  # Tipi numerici ammessi (bool escluso a parte)
+USB_ID = (str, int, type(None))  # VID e PID: "0x2341", 9025 oppure null
+
+# Parametri conosciuti: nome -> (tipi ammessi, controllo del valore, valori ammessi o descrizione)
+SCHEMA = {
+    'broker': (str, None, None),
+    'port': (int, _port, "porta TCP tra 1 e 65535"),
+    'username': (str, None, None),
+    'password': (str, None, None),
+    'SERIAL_COM_PORT': (str, None, None),
+    'SERIAL_DATARATE': (int, _positive, "baud maggiore di 0"),
+    'SERIAL_FORMAT': (str, None, (FORMAT_TEXT, FORMAT_BINARY, FORMAT_AUTO)),
+    'SERIAL_RECONNECT': (bool, None, None),
+    'SERIAL_VID': (USB_ID, None, None),
+    'SERIAL_PID': (USB_ID, None, None),
+    'DEVICES': (list, None, None),
+    'CAPTURE_FILE': (str, None, None),
+    'CAPTURE_DIR': (str, None, None),
+    'REPLAY_FILE': (str, None, None),
+    'REPLAY_SPEED': (NUMBER, _not_negative, "0 (massima) o maggiore"),
+    'QUEUE_SIZE': (int, _positive, "campioni maggiore di 0"),
+    'DROP_POLICY': (str, None, (DROP_OLDEST, DROP_NEWEST)),
+    'PUBLISH_RATE': (NUMBER, _not_negative, "0 (nessun limite) o maggiore"),
+    'PUBLISH_MODE': (str, None, (MODE_FIELDS, MODE_JSON, MODE_PACKED)),
+    'TOPIC_PREFIX': (str, None, None),
+    'BATCH_SIZE': (int, _positive, "campioni maggiore di 0"),
+    'BATCH_INTERVAL': (NUMBER, _not_negative, "secondi, 0 o maggiore"),
+    'PUBLISH_FIELD_TOPICS': (bool, None, None),
+    'PUBLISH_QOS': (int, None, (0, 1, 2)),
+    'INFLIGHT_WINDOW': (int, _positive, "messaggi maggiore di 0"),
+    'ACK_TIMEOUT': (NUMBER, _positive, "secondi maggiore di 0"),
+    'ACK_RETRIES': (int, _not_negative, "0 o maggiore"),
+    'SPOOL_DIR': (str, None, None),
+    'SPOOL_SEGMENT_SIZE': (int, _positive, "byte maggiore di 0"),
+    'SPOOL_FSYNC_INTERVAL': (NUMBER, _not_negative, "secondi, 0 o maggiore"),
+    'DASHBOARD_PORT': (int, _optional_port, "porta TCP, 0 = disattivato"),
+    'TSDB_DIR': (str, None, None),
+    'AGGREGATE_WINDOWS': (list, None, None),
+    'AGGREGATE_QUANTILES': (list, lambda value: all(isinstance(q, NUMBER) and 0 <= q <= 1 for q in value), "numeri tra 0 e 1"),
+    'PUBLISH_RAW': (bool, None, None),
+    'DEADBAND': (dict, None, None),
+    'DEADBAND_HEARTBEAT': (NUMBER, _not_negative, "secondi, 0 = nessun heartbeat"),
+    'LOG_LEVEL': (str, None, ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")),
+    'LOG_RATE': (NUMBER, _not_negative, "messaggi al secondo, 0 = nessun limite"),
+    'LOG_FILE': (str, None, None),
+    'METRICS_PORT': (int, _optional_port, "porta TCP, 0 = disattivato"),
+    'METRICS_TOPIC': (str, None, None),
+    'METRICS_TIMING': (bool, None, None),
+}
+REQUIRED = ('broker', 'port', 'username', 'password')  # Parametri senza default
+
+# Campi di un dispositivo di DEVICES
+DEVICE_SCHEMA = {
+    'port': (str, None, None),
+    'replay': (str, None, None),
+    'speed': (NUMBER, _not_negative, "0 (massima) o maggiore"),
+    'datarate': (int, _positive, "baud maggiore di 0"),
+    'format': (str, None, (FORMAT_TEXT, FORMAT_BINARY, FORMAT_AUTO)),
+    'topic_prefix': (str, None, None),
+    'series': (str, None, None),
+    'vid': (USB_ID, None, None),
+    'pid': (USB_ID, None, None),
+    'serial_number': ((str, type(None)), None, None),
+}
+
+
+# Campi di una finestra di AGGREGATE_WINDOWS
+WINDOW_SCHEMA = {
+    'name': (str, None, None),
+    'length': (NUMBER, _positive, "secondi maggiore di 0"),
+    'mode': (str, None, (MODE_TUMBLING, MODE_SLIDING)),
+    'step': (NUMBER, _positive, "secondi maggiore di 0"),
+}
+
+
+# Errore di configurazione
+class ConfigError(ValueError):
+    """File dei parametri assente, non valido o con valori non ammessi (tutti gli errori insieme)"""
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors  # Un messaggio per ogni parametro non valido
+        super().__init__(f"{path}: " + "; ".join(errors))
+
+
+# Parametri controllati
+class Config(dict):
+    """Dizionario dei parametri, leggibile anche per attributo (config.broker)"""
+
+    def __init__(self, params, path=None):
+        super().__init__(params)
+        self.path = path  # File da cui sono stati letti
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+# Funzione che controlla un gruppo di parametri con il suo schema
+def _check(params, schema, prefix=""):
+    """Ritorna la lista degli errori"""
+    errors = []
+    for key, value in params.items():
+        if key not in schema:
+            log.warning("Parametro sconosciuto ignorato: %s%s", prefix, key)
+            continue
+        types, check, allowed = schema[key]
+        if isinstance(value, bool) and types in (int, NUMBER):  # true/false non sono numeri
+            errors.append(f"{prefix}{key}: atteso un numero, trovato {json.dumps(value)}")
+        elif not isinstance(value, types):
+            errors.append(f"{prefix}{key}: tipo non valido ({type(value).__name__})")
+        elif isinstance(allowed, tuple) and value not in allowed:
+            errors.append(f"{prefix}{key}: {value!r} non è tra {', '.join(map(repr, allowed))}")
+        elif check and not check(value):
+            errors.append(f"{prefix}{key}: {value!r} non valido ({allowed})")
+    return errors
+
+
+# Funzione che controlla i parametri e completa la lista dei dispositivi
+def validate(params, path=PARAMETERS_FILE):
+    """Ritorna un Config; solleva ConfigError con tutti gli errori trovati"""
+    if not isinstance(params, dict):
+        raise ConfigError(path, ["il file deve contenere un oggetto JSON"])
+    errors = [f"{key}: parametro obbligatorio mancante" for key in REQUIRED if key not in params]
+    errors += _check(params, SCHEMA)
+    devices = params.get('DEVICES')
+    if devices is None:  # Senza la lista DEVICES si usa la porta singola dei parametri storici
+        if 'SERIAL_COM_PORT' not in params and not params.get('REPLAY_FILE'):
+            errors.append("SERIAL_COM_PORT: parametro obbligatorio mancante (oppure DEVICES)")
+        devices = [{'port': params.get('SERIAL_COM_PORT'), 'datarate': params.get('SERIAL_DATARATE', DATARATE),
+                    'vid': params.get('SERIAL_VID'), 'pid': params.get('SERIAL_PID')}]
+    elif isinstance(devices, list):
+        devices = [dict(device) if isinstance(device, dict) else device for device in devices]  # Il dizionario letto resta com'è
+        for index, device in enumerate(devices):
+            prefix = f"DEVICES[{index}]."
+            if not isinstance(device, dict):
+                errors.append(f"DEVICES[{index}]: atteso un oggetto")
+                continue
+            errors += _check(device, DEVICE_SCHEMA, prefix)
+            if not (device.get('port') or device.get('replay') or (device.get('vid') and device.get('pid'))):
+                errors.append(f"{prefix}port: serve 'port', 'replay' oppure 'vid' e 'pid'")
+    windows = params.get('AGGREGATE_WINDOWS')
+    if isinstance(windows, list):
+        for index, window in enumerate(windows):
+            prefix = f"AGGREGATE_WINDOWS[{index}]."
+            if not isinstance(window, dict):
+                errors.append(f"AGGREGATE_WINDOWS[{index}]: atteso un oggetto")
+                continue
+            errors += _check(window, WINDOW_SCHEMA, prefix)
+            if 'length' not in window:
+                errors.append(f"{prefix}length: parametro obbligatorio mancante")
+    if errors:
+        raise ConfigError(path, errors)
+
+    config = Config(params, path)
+    topic_prefix = params.get('TOPIC_PREFIX', TOPIC_PREFIX)
+    for index, device in enumerate(devices):  # Completa i campi mancanti di ogni dispositivo
+        device.setdefault('datarate', params.get('SERIAL_DATARATE', DATARATE))  # Velocità della porta
+        device.setdefault('format', params.get('SERIAL_FORMAT', FORMAT_TEXT))  # Formato dei dati sulla seriale
+        device.setdefault('topic_prefix', f"{topic_prefix}/dev{index + 1}")  # Prefisso dei topic
+    config['DEVICES'] = devices
+    return config
+
+
+# Funzione che legge e controlla il file dei parametri
+def load_config(path=PARAMETERS_FILE):
+    """Legge il file JSON una sola volta e ritorna un Config (ConfigError se manca o non è valido)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            params = json.load(file)
+    except FileNotFoundError:
+        raise ConfigError(path, ["il file non esiste"]) from None
+    except json.JSONDecodeError as e:
+        raise ConfigError(path, [f"errore nel parsing del file JSON: {e}"]) from None
+    return validate(params, path)
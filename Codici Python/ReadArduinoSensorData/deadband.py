@@ -0,0 +1,90 @@
+#########################################################################################
+# deadband.py                                                                           #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Filtro "report by exception": un valore viene pubblicato solo se si discosta          #
+# dall'ultimo valore pubblicato più della banda morta (deadband) del suo campo, oppure  #
+# se dall'ultima pubblicazione è passato più di DEADBAND_HEARTBEAT secondi (così chi    #
+# riceve sa che il sensore è ancora attivo anche con letture stabili).                  #
+# Configurazione in 'parameters.json', per esempio:                                     #
+#   "DEADBAND": {"humidity": {"absolute": 1.0},                                         #
+#                "temp_c": {"absolute": 0.2, "relative": 0.01}},                        #
+#   "DEADBAND_HEARTBEAT": 300                                                           #
+# La soglia di un campo è il maggiore tra 'absolute' e 'relative' * |ultimo valore|;    #
+# i campi non elencati vengono pubblicati solo quando cambiano. Il passaggio da o verso #
+# NaN (sensore guasto, campo mancante) conta sempre come cambiamento.                   #
+# Senza la chiave DEADBAND, o con "DEADBAND": {} come in 'parameters.json', il filtro è #
+# disattivato: per attivarlo basta elencare almeno un campo, come nell'esempio sopra.   #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per l'intervallo di heartbeat
+from sensor_parser import SensorReading  # Importa il record con i cinque valori
+
+
+# Valori di default
+HEARTBEAT = 300  # Secondi massimi senza pubblicare un valore (0 = nessun heartbeat)
+
+
+# Classe del filtro a banda morta
+class DeadbandFilter:
+    """Decide quali valori pubblicare e conta quelli soppressi"""
+
+    def __init__(self, bands=None, heartbeat=HEARTBEAT):
+        self.bands = bands or {}  # Soglie per campo: {"absolute": ..., "relative": ...}
+        self.heartbeat = heartbeat  # Secondi massimi di silenzio
+        self._last = {}  # Ultimo valore pubblicato e istante, per chiave
+        self.published = 0  # Messaggi lasciati passare
+        self.suppressed = 0  # Messaggi soppressi
+
+    def _changed(self, key, field, value, now):
+        """True se il valore va pubblicato (fuori banda, primo valore o heartbeat scaduto)"""
+        last = self._last.get(key)
+        if last is None:  # Primo valore della chiave
+            return True
+        last_value, last_time = last
+        if self.heartbeat and now - last_time >= self.heartbeat:  # Silenzio troppo lungo
+            return True
+        if value != value or last_value != last_value:  # NaN: pubblicato solo se lo stato del sensore cambia
+            return (value != value) != (last_value != last_value)
+        band = self.bands.get(field, {})
+        threshold = max(band.get('absolute', 0.0), band.get('relative', 0.0) * abs(last_value))
+        return abs(value - last_value) > threshold
+
+    def accept(self, key, field, value, now=None):
+        """Un solo valore (per esempio un topic per campo): True se va pubblicato"""
+        now = time.monotonic() if now is None else now
+        if self._changed(key, field, value, now):
+            self._last[key] = (value, now)
+            self.published += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def accept_sample(self, key, reading, now=None):
+        """Un campione intero (JSON o binario): True se almeno un campo è fuori banda"""
+        now = time.monotonic() if now is None else now
+        fields = SensorReading._fields
+        if any(self._changed((key, field), field, value, now) for field, value in zip(fields, reading)):
+            for field, value in zip(fields, reading):  # Il campione pubblicato è il nuovo riferimento
+                self._last[(key, field)] = (value, now)
+            self.published += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def stats(self):
+        """Riga di riepilogo dei messaggi pubblicati e soppressi"""
+        total = self.published + self.suppressed
+        ratio = self.suppressed / total * 100 if total else 0.0
+        return f"deadband: {self.published} pubblicati, {self.suppressed} soppressi ({ratio:.1f}%)"
+
+
+def build_deadband(params):
+    """Crea il filtro dai parametri (None se DEADBAND manca o è vuoto)"""
+    if not params.get('DEADBAND'):
+        return None
+    return DeadbandFilter(params['DEADBAND'], params.get('DEADBAND_HEARTBEAT', HEARTBEAT))
@@ -0,0 +1,272 @@
+#########################################################################################
+# delivery.py                                                                           #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Consegna "almeno una volta" dei messaggi MQTT con QoS 1 senza fermarsi ad attendere   #
+# ogni conferma: ReliablePublisher si usa al posto del client paho (stesso metodo       #
+# publish()) e tiene fino a WINDOW messaggi "in volo", cioè inviati e non ancora        #
+# confermati dal broker. Le conferme arrivano da paho con on_publish(client, userdata,  #
+# mid); a finestra piena publish() attende che si liberi un posto (al più ACK_TIMEOUT   #
+# secondi) e poi rifiuta il messaggio; con block=False lo rifiuta subito, senza         #
+# attendere (così lo usa spool.py, che salva su disco i messaggi rifiutati).            #
+# I messaggi non vengono ripubblicati a client connesso: paho tiene ogni messaggio con  #
+# il suo mid e alla riconnessione lo ritrasmette da solo (ogni riconnessione conta come #
+# una ritrasmissione, al più MAX_RETRIES); le scadenze ripartono. Un messaggio senza    #
+# conferma da ACK_TIMEOUT secondi a client connesso, o dopo MAX_RETRIES ritrasmissioni, #
+# è considerato perso e libera il suo posto; la finestra di paho è senza limite, così   #
+# i messaggi persi non la riempiono. Una ritrasmissione può produrre un duplicato sul   #
+# broker: è il prezzo della consegna "almeno una volta".                                #
+# stats() riassume conferme al secondo, messaggi in volo, ritrasmissioni e latenza      #
+# della conferma (istogramma di metrics.py, esportabile su /metrics).                   #
+# AckTracker abbina i mid di publish() alle conferme, anche quando la conferma arriva   #
+# prima che publish() sia tornato (broker locale velocissimo o memory_broker.py).       #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per le scadenze e le latenze
+import logging  # Importa la libreria logging per i messaggi
+import threading  # Importa la libreria threading per la finestra e il thread delle ritrasmissioni
+from metrics import MetricsRegistry  # Importa contatori e istogrammi
+
+
+# Valori di default
+QOS = 1  # QoS dei messaggi (1 = conferma del broker)
+WINDOW = 100  # Messaggi in volo al massimo (1 = attesa di ogni conferma)
+ACK_TIMEOUT = 10.0  # Secondi senza conferma (a client connesso) prima di considerare perso un messaggio
+MAX_RETRIES = 3  # Ritrasmissioni alla riconnessione prima di considerare perso un messaggio
+
+# Codici di ritorno di paho (evita di importare paho qui)
+MQTT_ERR_SUCCESS = 0  # Messaggio inviato o accodato
+MQTT_ERR_NO_CONN = 4  # Client non connesso (con QoS > 0 paho lo invia alla riconnessione)
+MQTT_ERR_QUEUE_SIZE = 15  # Coda piena
+
+log = logging.getLogger(__name__)  # Logger della consegna
+
+
+# Funzione che dice se il client si è preso carico del messaggio
+def accepted(info, qos):
+    """True se il messaggio è stato inviato o accodato: con QoS > 0 paho accoda anche senza connessione"""
+    return info.rc == MQTT_ERR_SUCCESS or (info.rc == MQTT_ERR_NO_CONN and qos > 0)
+
+
+# Messaggi in attesa di conferma, per mid
+class AckTracker:
+    """Abbina le conferme di on_publish ai messaggi pubblicati"""
+
+    def __init__(self):
+        self._pending = {}  # mid -> dati del messaggio, in attesa di on_publish
+        self._early = {}  # mid -> istante di conferma arrivata prima del ritorno di publish()
+        self._lock = threading.Lock()  # on_publish arriva dal thread di rete di paho
+
+    def add(self, mid, data):
+        """Registra un messaggio pubblicato; ritorna l'istante di conferma se è già arrivata, altrimenti None"""
+        with self._lock:
+            acked_at = self._early.pop(mid, None)
+            if acked_at is None:
+                self._pending[mid] = data
+            return acked_at
+
+    def ack(self, mid, now):
+        """Ritorna i dati del messaggio confermato, oppure None se publish() non è ancora tornato"""
+        with self._lock:
+            data = self._pending.pop(mid, None)
+            if data is None:  # Conferma più veloce del ritorno di publish()
+                self._early[mid] = now
+            return data
+
+    def pop_expired(self, expired, early_before):
+        """Rimuove e ritorna le coppie (mid, dati) per cui expired(dati) è vero"""
+        with self._lock:
+            mids = [mid for mid, data in self._pending.items() if expired(data)]
+            if self._early:  # Conferme tardive di messaggi già considerati persi: non arriverà nessun add()
+                self._early = {mid: acked_at for mid, acked_at in self._early.items() if acked_at >= early_before}
+            return [(mid, self._pending.pop(mid)) for mid in mids]
+
+    def values(self):
+        """Copia dei dati dei messaggi in attesa"""
+        with self._lock:
+            return list(self._pending.values())
+
+    def __len__(self):
+        return len(self._pending)
+
+
+# Messaggio inviato e non ancora confermato
+class PendingMessage:
+    """Quanto serve per seguire un messaggio fino alla conferma e misurarne la latenza"""
+
+    def __init__(self, topic, payload, retain, now):
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+        self.first_sent = now  # Primo invio (latenza della conferma)
+        self.sent = now  # Ultimo invio, o ultima riconnessione (scadenza della conferma)
+        self.attempts = 1  # Invii effettuati (0 = accodato da paho senza connessione)
+
+
+# Esito di publish() quando la finestra resta piena
+class RejectedInfo:
+    """Stessi campi di MQTTMessageInfo: il messaggio non è stato inviato"""
+
+    mid = None
+    rc = MQTT_ERR_QUEUE_SIZE
+
+    def is_published(self):
+        return False
+
+
+# Funzione che formatta un percentile di un istogramma in millisecondi
+def _ms(histogram, q):
+    value = histogram.quantile(q)
+    return "-" if value is None else f"{value * 1000:g}"
+
+
+# Client con finestra di messaggi in volo, conferme e ritrasmissioni
+class ReliablePublisher:
+    """Sostituto del client paho con consegna QoS 1 a finestra"""
+
+    def __init__(self, client, qos=QOS, window=WINDOW, ack_timeout=ACK_TIMEOUT, max_retries=MAX_RETRIES,
+                 metrics=None, labels=None, block=True):
+        self.client = client  # Client paho (o broker interno)
+        self.qos = qos  # QoS di tutti i messaggi pubblicati
+        self.window = max(1, window)  # Messaggi in volo al massimo
+        self.ack_timeout = ack_timeout  # Secondi di attesa della conferma (e di un posto libero)
+        self.max_retries = max_retries  # Ritrasmissioni alla riconnessione per messaggio
+        self.block = block  # False: a finestra piena publish() rifiuta subito il messaggio
+        self._acks = AckTracker()
+        self._slots = threading.Condition()  # Protegge finestra e contatori
+        self.inflight = 0  # Messaggi inviati e non ancora confermati (o in ritrasmissione)
+        self.peak_inflight = 0  # Massimo di messaggi in volo
+        self.sent = 0  # Messaggi inviati (senza le ritrasmissioni)
+        self.acked = 0  # Messaggi confermati
+        self.retried = 0  # Ritrasmissioni alla riconnessione
+        self.expired = 0  # Messaggi senza conferma dopo tutte le ritrasmissioni
+        self.rejected = 0  # Messaggi rifiutati a finestra piena
+        self.failed = 0  # Pubblicazioni rifiutate dal client
+        metrics = metrics or MetricsRegistry()  # Istogramma anche senza server delle metriche
+        self.ack_latency = metrics.histogram('mqtt_ack_latency_seconds', "Dal primo invio alla conferma del broker", labels)
+        metrics.gauge('mqtt_messages_inflight', "Messaggi in attesa di conferma", labels, lambda: self.inflight)
+        metrics.counter('mqtt_messages_acked_total', "Messaggi confermati dal broker", labels, lambda: self.acked)
+        metrics.counter('mqtt_messages_retried_total', "Ritrasmissioni alla riconnessione", labels, lambda: self.retried)
+        metrics.counter('mqtt_messages_expired_total', "Messaggi senza conferma dopo le ritrasmissioni", labels, lambda: self.expired)
+        metrics.counter('mqtt_messages_rejected_total', "Messaggi rifiutati a finestra piena", labels, lambda: self.rejected)
+        if hasattr(client, 'max_inflight_messages_set'):  # paho: nessun limite (il default è 20), la finestra è questa
+            try:
+                client.max_inflight_messages_set(0)  # Un messaggio perso non occupa per sempre un posto di paho
+            except RuntimeError:  # paho non lo permette a connessione aperta
+                log.warning("Connessione già aperta: resta la finestra di paho (%d)", client.max_inflight_messages)
+        client.on_publish = self.on_publish
+        self._last_acked = 0  # Conferme all'ultima statistica
+        self._last_time = time.monotonic()  # Istante dell'ultima statistica
+        self._interval = min(1.0, ack_timeout / 4)  # Controllo delle scadenze, più spesso del timeout
+        self._stop = threading.Event()
+        self._expirer = threading.Thread(target=self._expiry_loop, daemon=True)
+        self._expirer.start()
+
+    def publish(self, topic, payload=None, qos=None, retain=False):
+        """Stessa firma di client.publish() di paho; il QoS è sempre quello del publisher"""
+        with self._slots:
+            if not self._slots.wait_for(lambda: self.inflight < self.window,  # Broker fermo da troppo (o nessuna attesa)
+                                        self.ack_timeout + self._interval if self.block else 0):  # Fino alla scadenza del più vecchio
+                self.rejected += 1
+                return RejectedInfo()
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+            self.sent += 1
+        return self._send(PendingMessage(topic, payload, retain, time.monotonic()))
+
+    def _send(self, message):
+        """Invia un messaggio che occupa già un posto della finestra"""
+        info = self.client.publish(message.topic, message.payload, self.qos, message.retain)
+        if not accepted(info, self.qos):  # Non accodato da paho
+            self._release(failed=True)
+            return info
+        if info.rc == MQTT_ERR_NO_CONN:  # Accodato da paho: verrà inviato alla connessione
+            message.attempts = 0
+        acked_at = self._acks.add(info.mid, message)
+        if acked_at is not None:
+            self._acked(message, acked_at)
+        return info
+
+    def on_publish(self, client, userdata, mid):
+        """Callback di paho: il broker ha confermato il messaggio (QoS 1) o è stato scritto (QoS 0)"""
+        now = time.monotonic()
+        message = self._acks.ack(mid, now)
+        if message is not None:
+            self._acked(message, now)
+
+    def _acked(self, message, acked_at):
+        with self._slots:
+            self.acked += 1
+            self.ack_latency.observe(acked_at - message.first_sent)
+            self._release_locked()
+
+    def _release(self, failed=False, expired=False):
+        with self._slots:
+            self.failed += failed
+            self.expired += expired
+            self._release_locked()
+
+    def _release_locked(self):
+        self.inflight -= 1
+        self._slots.notify_all()  # Posto libero (o finestra vuota per flush())
+
+    def _expiry_loop(self):
+        while not self._stop.wait(self._interval):
+            self.expire_overdue(time.monotonic())
+
+    def expire_overdue(self, now):
+        """Libera il posto dei messaggi senza conferma da più di ack_timeout secondi a client connesso"""
+        if not self.client.is_connected():  # paho li ritrasmette da solo alla riconnessione
+            return
+        deadline = now - self.ack_timeout
+        for mid, message in self._acks.pop_expired(lambda message: message.sent <= deadline, deadline):
+            self._expire(message)  # Non si ripubblica: un nuovo mid lascerebbe il vecchio nella finestra di paho
+
+    def _expire(self, message):
+        self._release(expired=True)
+        log.warning("Messaggio su %s senza conferma dopo %d invii", message.topic, message.attempts)
+
+    def on_connect(self, *args):
+        """Da chiamare alla (ri)connessione: paho ritrasmette i messaggi in sospeso, le scadenze ripartono"""
+        now = time.monotonic()
+        for mid, message in self._acks.pop_expired(lambda message: message.attempts > self.max_retries,
+                                                   now - self.ack_timeout):
+            self._expire(message)  # Troppe ritrasmissioni (paho lo invia comunque, la conferma verrà ignorata)
+        for message in self._acks.values():
+            with self._slots:
+                self.retried += message.attempts > 0  # Un messaggio accodato senza connessione parte ora per la prima volta
+            message.attempts += 1  # Inviato da paho con lo stesso mid
+            message.sent = now
+
+    def is_connected(self):
+        return self.client.is_connected()
+
+    def wait_for_room(self, timeout):
+        """Attende un posto libero nella finestra; True se c'è"""
+        with self._slots:
+            return self._slots.wait_for(lambda: self.inflight < self.window, timeout)
+
+    def flush(self, timeout=ACK_TIMEOUT):
+        """Attende le conferme dei messaggi in volo; True se sono arrivate tutte"""
+        with self._slots:
+            return self._slots.wait_for(lambda: self.inflight == 0, timeout)
+
+    def close(self):
+        """Ferma il thread delle scadenze"""
+        self._stop.set()
+        self._expirer.join()
+
+    def stats(self):
+        """Riga di statistiche dall'ultima chiamata, con i percentili (limite superiore del bucket) in millisecondi"""
+        now = time.monotonic()
+        acked = self.acked
+        rate = (acked - self._last_acked) / (now - self._last_time)  # Conferme al secondo nell'intervallo
+        self._last_acked, self._last_time = acked, now
+        return (f"mqtt QoS {self.qos}: {rate:.1f} conferme/s, {self.sent} inviati, {acked} confermati, "
+                f"{self.inflight} in volo (max {self.peak_inflight}/{self.window}), {self.retried} ritrasmessi, "
+                f"{self.expired} persi, {self.rejected} rifiutati, {self.failed} falliti; "
+                f"conferma p50 {_ms(self.ack_latency, 0.5)} ms p99 {_ms(self.ack_latency, 0.99)} ms")
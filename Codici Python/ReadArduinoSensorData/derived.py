@@ -0,0 +1,150 @@
+#########################################################################################
+# derived.py                                                                            #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Campi calcolati sul PC per i dispositivi in modalità grezza (RAW_ONLY 1 nello sketch  #
+# DHT11_CORSO_IoT.ino), che inviano solo umidità e temperatura in °C:                   #
+#   Humidity: 45.00%,  Temperature: 23.00°C      (circa 40 byte invece di circa 90)     #
+# °F, IdC °C e IdC °F vengono calcolati qui con NumPy, su tutte le letture arrivate     #
+# insieme, con le stesse formule della libreria DHT (convertCtoF, convertFtoC e         #
+# computeHeatIndex) e in float32 come su Arduino Uno; i valori sono arrotondati a due   #
+# decimali come fa Serial.print(). Il risultato coincide con quanto stampa lo sketch    #
+# completo, e si può verificare su una registrazione (capture.py) o un log di linee:    #
+# python derived.py check campo.scap                                                    #
+#                                                                                       #
+# Per usare questo modulo, è necessario installare la libreria numpy.                   #
+# pip install numpy                                                                     #
+#########################################################################################
+
+# Importa le librerie necessarie
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import numpy as np  # Importa la libreria numpy per i calcoli su tutte le letture insieme
+from sensor_parser import SensorReading, parse_line, is_raw  # Importa il record e il parser delle linee
+
+
+# Costanti della libreria DHT (float su Arduino Uno)
+HEAT_INDEX_THRESHOLD = 79  # Sotto questo valore (°F) basta la formula semplice di Steadman
+DECIMALS = 2  # Decimali stampati da Serial.print()
+
+
+# Conversioni di temperatura, come DHT::convertCtoF e DHT::convertFtoC
+def c_to_f(celsius):
+    return celsius * np.float32(1.8) + np.float32(32)
+
+
+def f_to_c(fahrenheit):
+    return (fahrenheit - np.float32(32)) * np.float32(0.55555)  # 0.55555 e non 5/9, come nella libreria
+
+
+# Indice di calore in °F, come DHT::computeHeatIndex (formula di Rothfusz con le correzioni NWS)
+def heat_index(temp_f, humidity):
+    """Array float32 dell'indice di calore (°F) per gli array di temperature (°F) e umidità (%)"""
+    t, h = temp_f, humidity
+    f = np.float32
+    simple = f(0.5) * (t + f(61.0) + ((t - f(68.0)) * f(1.2)) + (h * f(0.094)))
+    full = (f(-42.379) + f(2.04901523) * t + f(10.14333127) * h
+            + f(-0.22475541) * t * h
+            + f(-0.00683783) * (t * t)
+            + f(-0.05481717) * (h * h)
+            + f(0.00122874) * (t * t) * h
+            + f(0.00085282) * t * (h * h)
+            + f(-0.00000199) * (t * t) * (h * h))
+    in_range = (t >= f(80.0)) & (t <= f(112.0))
+    dry = (h < f(13)) & in_range
+    root = np.sqrt(np.maximum((f(17.0) - np.abs(t - f(95.0))) * f(0.05882), f(0)))  # Negativa solo fuori da 'dry', dove non viene usata
+    full = np.where(dry, full - ((f(13.0) - h) * f(0.25)) * root, full)
+    humid = (h > f(85.0)) & (t >= f(80.0)) & (t <= f(87.0)) & ~dry
+    full = np.where(humid, full + ((h - f(85.0)) * f(0.1)) * ((f(87.0) - t) * f(0.2)), full)
+    return np.where(simple > HEAT_INDEX_THRESHOLD, full, simple)
+
+
+# Arrotondamento di Serial.print(valore): somma 0.005 e tronca alla seconda cifra
+def print_round(values, decimals=DECIMALS):
+    """Array float64 con i valori che lo sketch stamperebbe"""
+    f = np.float32
+    negative = values < 0
+    rounding = f(0.5)
+    for _ in range(decimals):  # 0.005 calcolato come in Print::printFloat
+        rounding = rounding / f(10.0)
+    number = np.abs(values) + rounding
+    integer = np.floor(number)
+    remainder = number - integer
+    result = integer.astype(np.float64)
+    scale = 1.0
+    for _ in range(decimals):  # Cifre decimali una alla volta, in float32 come su Arduino
+        remainder = remainder * f(10.0)
+        digit = np.floor(remainder)
+        remainder = remainder - digit
+        scale /= 10
+        result += digit * scale
+    return np.where(negative, -result, result).round(decimals)  # round() toglie solo l'errore di rappresentazione
+
+
+# Funzione che calcola i tre campi derivati da umidità e °C
+def derive(humidity, temp_c):
+    """Ritorna gli array (°F, IdC °C, IdC °F) arrotondati come dallo sketch"""
+    h = np.asarray(humidity, dtype=np.float32)
+    t = np.asarray(temp_c, dtype=np.float32)
+    temp_f = c_to_f(t)  # dht.readTemperature(true)
+    idc_f = heat_index(temp_f, h)  # dht.computeHeatIndex(f, h)
+    idc_c = f_to_c(idc_f)  # dht.computeHeatIndex(t, h, false) converte t in °F con lo stesso calcolo: basta riconvertire
+    return print_round(np.stack((temp_f, idc_c, idc_f)))  # Un solo arrotondamento per i tre campi
+
+
+# Funzione che completa le letture grezze arrivate insieme
+def complete_readings(readings):
+    """Ritorna le letture con °F e indice di calore calcolati per quelle grezze (un solo calcolo NumPy)"""
+    raw = [index for index, reading in enumerate(readings) if is_raw(reading)]
+    if not raw:
+        return readings
+    values = np.array([readings[index][:2] for index in raw], dtype=np.float64).reshape(-1, 2)  # Umidità e °C
+    temp_f, idc_c, idc_f = (column.tolist() for column in derive(values[:, 0], values[:, 1]))
+    completed = list(readings)
+    for position, index in enumerate(raw):
+        humidity, temp_c = values[position]
+        completed[index] = SensorReading(float(humidity), float(temp_c), temp_f[position], idc_c[position], idc_f[position])
+    return completed
+
+
+# Confronto con le linee complete stampate dallo sketch
+def check(path):
+    """Ricalcola °F e indice di calore delle linee complete di un file e conta le differenze"""
+    if path.endswith('.scap'):  # Registrazione della seriale (capture.py)
+        from capture import CaptureFile  # Importato qui: serve solo per le registrazioni
+        capture = CaptureFile(path)
+        data = b"".join(bytes(chunk) for _, chunk in capture.records())
+        capture.close()
+    else:  # Log di testo con le linee dello sketch
+        with open(path, 'rb') as file:
+            data = file.read()
+    readings = [reading for reading in map(parse_line, data.decode('utf-8', 'replace').splitlines())
+                if reading is not None and not is_raw(reading)]
+    if not readings:
+        print("Nessuna linea completa da confrontare")
+        return 0
+    sketch = np.array(readings, dtype=np.float64)
+    computed = np.column_stack(derive(sketch[:, 0], sketch[:, 1]))
+    difference = np.abs(computed - sketch[:, 2:])
+    mismatched = np.any(difference > 0.005, axis=1)  # Diversi nella seconda cifra decimale
+    print(f"{len(readings)} letture, {int(mismatched.sum())} diverse; differenza massima "
+          f"°F {difference[:, 0].max():.2f}, IdC °C {difference[:, 1].max():.2f}, IdC °F {difference[:, 2].max():.2f}")
+    for index in np.flatnonzero(mismatched)[:10]:  # Le prime differenze, per capirne la causa
+        print(f"  sketch {readings[index]}, calcolato {computed[index].tolist()}")
+    return int(mismatched.sum())
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Confronta i campi calcolati sul PC con quelli stampati dallo sketch")
+    arg_parser.add_argument('command', choices=('check',))
+    arg_parser.add_argument('file', help="registrazione .scap o file di testo con le linee dello sketch")
+    args = arg_parser.parse_args()
+    raise SystemExit(1 if check(args.file) else 0)
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale
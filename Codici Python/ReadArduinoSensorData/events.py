@@ -0,0 +1,180 @@
+#########################################################################################
+# events.py                                                                             #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Canale a bassa latenza per gli eventi (es. il pulsante di switch.py), separato dalla  #
+# telemetria: nessuna coda, nessun lotto e nessun limite di frequenza, ogni evento      #
+# viene pubblicato dal thread che legge la seriale appena arriva.                       #
+# - EdgeFilter elimina sul PC i rimbalzi e gli stati ripetuti: il primo cambiamento     #
+#   viene pubblicato subito, i cambiamenti entro DEBOUNCE secondi dal precedente sono   #
+#   rimbalzi e, se alla fine della finestra lo stato è diverso da quello pubblicato,    #
+#   viene pubblicato solo lo stato finale (più cambiamenti ravvicinati -> un evento).   #
+# - EventPublisher pubblica con QoS 0 o 1 e segue le conferme del broker (on_publish):  #
+#   misura la latenza dall'arrivo sulla seriale alla pubblicazione e alla conferma      #
+#   (istogrammi di metrics.py, esportabili su /metrics).                                #
+# - low_latency_client() crea un client MQTT dedicato con TCP_NODELAY, così gli eventi  #
+#   non attendono dietro ai messaggi della telemetria né all'algoritmo di Nagle.        #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per la finestra di debounce e le latenze
+import socket  # Importa la libreria socket per disattivare l'algoritmo di Nagle
+import logging  # Importa la libreria logging per i messaggi
+from metrics import MetricsRegistry  # Importa gli istogrammi delle latenze
+from delivery import AckTracker, accepted, MQTT_ERR_SUCCESS  # Importa l'abbinamento tra mid e conferme e la regola di accettazione
+
+
+# Valori di default
+DEBOUNCE = 0.05  # Secondi dopo un cambiamento in cui i cambiamenti successivi sono rimbalzi
+EVENT_QOS = 1  # QoS degli eventi (1 = conferma del broker)
+
+log = logging.getLogger(__name__)  # Logger del canale
+
+
+# Filtro dei rimbalzi e degli stati ripetuti
+class EdgeFilter:
+    """Trasforma le linee di stato ("0", "1", ...) in cambiamenti di stato senza rimbalzi"""
+
+    def __init__(self, debounce=DEBOUNCE):
+        self.debounce = debounce  # Secondi della finestra di debounce
+        self.state = None  # Ultimo stato pubblicato (None = nessuno)
+        self.changed_at = float('-inf')  # Istante (monotono) dell'ultimo cambiamento pubblicato
+        self.pending = None  # (stato, arrivo) da pubblicare alla fine della finestra
+        self.events = 0  # Cambiamenti pubblicati
+        self.bounced = 0  # Cambiamenti scartati perché troppo vicini al precedente
+        self.repeated = 0  # Linee con lo stato già pubblicato (es. sketch che invia lo stato di continuo)
+
+    def feed(self, value, arrival):
+        """Ritorna lo stato da pubblicare subito, oppure None"""
+        if value == self.state:  # Nessun cambiamento, o rimbalzo già rientrato
+            self.pending = None
+            self.repeated += 1
+            return None
+        if arrival - self.changed_at < self.debounce:  # Troppo vicino all'ultimo cambiamento
+            self.pending = (value, arrival)  # Deciderà la fine della finestra
+            self.bounced += 1
+            return None
+        self.state, self.changed_at, self.pending = value, arrival, None
+        self.events += 1
+        return value
+
+    def due(self, now):
+        """Ritorna (stato, arrivo) se alla fine della finestra lo stato è cambiato, altrimenti None"""
+        if self.pending is None or now - self.changed_at < self.debounce:
+            return None
+        value, arrival = self.pending
+        self.state, self.changed_at, self.pending = value, now, None
+        self.events += 1
+        return value, arrival
+
+
+# Pubblicazione immediata degli eventi con le latenze misurate
+class EventPublisher:
+    """Pubblica ogni evento subito e misura arrivo -> pubblicazione e arrivo -> conferma"""
+
+    def __init__(self, client, topic, qos=EVENT_QOS, metrics=None, labels=None):
+        self.client = client  # Client MQTT (meglio se dedicato: vedi low_latency_client)
+        self.topic = topic  # Topic degli eventi
+        self.qos = qos  # 0 = nessuna conferma, 1 = conferma del broker
+        metrics = metrics or MetricsRegistry()  # Istogrammi anche senza server delle metriche
+        self.publish_latency = metrics.histogram('event_publish_latency_seconds', "Dall'arrivo sulla seriale alla pubblicazione", labels)
+        self.ack_latency = metrics.histogram('event_ack_latency_seconds', "Dall'arrivo sulla seriale alla conferma del broker", labels)
+        metrics.gauge('event_acks_pending', "Eventi in attesa di conferma", labels, lambda: len(self._acks))
+        self.sent = 0  # Eventi pubblicati
+        self.acked = 0  # Eventi confermati (QoS 0: scritti sul socket)
+        self.failed = 0  # Pubblicazioni rifiutate dal client (es. coda piena, o non connesso con QoS 0)
+        self.queued = 0  # Eventi accodati da paho senza connessione (QoS > 0: inviati alla riconnessione)
+        self._acks = AckTracker()  # mid -> (arrivo, misura), in attesa di on_publish
+        client.on_publish = self.on_publish
+
+    def publish(self, value, arrival, measure=True):
+        """Pubblica subito un evento arrivato all'istante 'arrival' (monotono)"""
+        info = self.client.publish(self.topic, value, qos=self.qos)
+        published = time.monotonic()
+        if not accepted(info, self.qos):  # Coda piena nel client, o non connesso con QoS 0
+            self.failed += 1
+            log.warning("Evento %s non pubblicato (codice %s)", value, info.rc)
+            return
+        self.sent += 1
+        if info.rc != MQTT_ERR_SUCCESS:  # Accodato da paho: partirà alla riconnessione, la conferma dirà quando
+            self.queued += 1
+        elif measure:  # Gli stati finali di una finestra di debounce sono ritardati di proposito
+            self.publish_latency.observe(published - arrival)
+        acked_at = self._acks.add(info.mid, (arrival, measure))
+        if acked_at is not None:  # Conferma più veloce del ritorno di publish()
+            self._acked((arrival, measure), acked_at)
+
+    def on_publish(self, client, userdata, mid):
+        """Callback di paho: il broker ha confermato il messaggio (QoS 1) o è stato scritto (QoS 0)"""
+        now = time.monotonic()
+        event = self._acks.ack(mid, now)
+        if event is not None:
+            self._acked(event, now)
+
+    def _acked(self, event, acked_at):
+        arrival, measure = event
+        self.acked += 1
+        if measure:
+            self.ack_latency.observe(acked_at - arrival)
+
+    @property
+    def pending(self):
+        return len(self._acks)
+
+    def stats(self):
+        """Riga di riepilogo con i percentili (limite superiore del bucket) in millisecondi"""
+        def ms(histogram, q):
+            value = histogram.quantile(q)
+            return "-" if value is None else f"{value * 1000:g}"
+        return (f"{self.sent} eventi, {self.acked} confermati, {self.pending} in attesa, {self.queued} accodati offline, "
+                f"{self.failed} falliti; "
+                f"pubblicazione p50 {ms(self.publish_latency, 0.5)} ms p99 {ms(self.publish_latency, 0.99)} ms, "
+                f"conferma p50 {ms(self.ack_latency, 0.5)} ms p99 {ms(self.ack_latency, 0.99)} ms")
+
+
+# Ciclo del canale: dalla seriale al broker senza code
+class EventChannel:
+    """Legge le linee di stato, elimina i rimbalzi e pubblica subito i cambiamenti"""
+
+    def __init__(self, reader, publisher, debounce=DEBOUNCE):
+        self.reader = reader  # SerialLineReader (timeout della porta <= debounce per gli stati finali puntuali)
+        self.publisher = publisher  # EventPublisher
+        self.filter = EdgeFilter(debounce)
+
+    def run(self):
+        """Elabora le linee finché il lettore non viene fermato"""
+        for arrival, line in self.reader.timed_lines(yield_idle=True):
+            if line is not None:
+                value = self.filter.feed(line, arrival)
+                if value is not None:  # Primo cambiamento: pubblicato subito
+                    self.publisher.publish(value, arrival)
+            trailing = self.filter.due(time.monotonic())  # Stato finale dopo dei rimbalzi
+            if trailing is not None:
+                self.publisher.publish(trailing[0], trailing[1], measure=False)
+
+    def stop(self):
+        self.reader.stop()
+
+    def stats(self):
+        return (f"{self.publisher.stats()}; {self.filter.bounced} rimbalzi, "
+                f"{self.filter.repeated} stati ripetuti")
+
+
+# Funzione che crea un client MQTT dedicato agli eventi
+def low_latency_client(username="", password="", on_connect=None):
+    """Client paho con TCP_NODELAY impostato a ogni (ri)connessione"""
+    import paho.mqtt.client as mqtt  # Importato qui: gli altri componenti del modulo non richiedono paho
+    client = mqtt.Client()
+    client.username_pw_set(username, password)
+
+    def on_connect_events(client, userdata, flags, rc):
+        sock = client.socket()
+        if sock is not None:  # Invia subito anche i pacchetti piccoli (nessuna attesa di Nagle)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if on_connect:
+            on_connect(client, userdata, flags, rc)
+    client.on_connect = on_connect_events
+    return client
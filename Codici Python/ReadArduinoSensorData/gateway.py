@@ -0,0 +1,323 @@
+###########################################################################################
+# Multi-port gateway: read many serial devices and send data to one MQTT broker           #
+# author: Pietro Boccadoro                                                                #
+# email: pieroboccadoro13[at]gmail[dot]com                                                #
+# date: 2025-02-01                                                                        #
+# version: 0.1                                                                            #
+#                                                                                         #
+# Questo script legge contemporaneamente più dispositivi Arduino, ognuno collegato a      #
+# una porta seriale diversa, e pubblica le letture su un'unica connessione MQTT.          #
+# I dispositivi sono elencati in 'parameters.json' nella chiave DEVICES, per esempio:     #
+#   "DEVICES": [                                                                          #
+#       {"port": "COM5", "datarate": 9600, "topic_prefix": "aula1"},                      #
+#       {"port": "COM6", "datarate": 9600, "topic_prefix": "aula2", "format": "binary"}   #
+#       {"vid": "0x2341", "pid": "0x0043", "topic_prefix": "aula3"}                       #
+#   ]                                                                                     #
+# Se DEVICES manca, viene usata la sola porta SERIAL_COM_PORT.                            #
+# Se un cavo USB viene scollegato la porta viene riaperta appena ricompare, senza         #
+# riavviare il gateway né la connessione MQTT; con "vid" e "pid" (e "serial_number")      #
+# la scheda viene ritrovata anche con un nome diverso. "SERIAL_RECONNECT": false          #
+# ripristina il comportamento precedente (la lettura termina alla disconnessione).        #
+# Ogni dispositivo ha un thread lettore, una coda e un thread di pubblicazione propri;    #
+# periodicamente vengono stampate le statistiche di ogni porta (campioni/s, scarti).      #
+# Con "SPOOL_DIR": "spool" (da attivare: il default è "") se il broker non è              #
+# raggiungibile i messaggi vengono salvati su disco in quella cartella (spool.py) e       #
+# inviati, nell'ordine, appena la connessione ritorna.                                    #
+# Con DASHBOARD_PORT > 0 il gateway serve anche una pagina web con i grafici in tempo     #
+# reale (web_dashboard.py), visibile da più browser senza matplotlib sul gateway.         #
+# Con "TSDB_DIR": "tsdb" (da attivare: il default è "") ogni campione viene anche         #
+# archiviato localmente in forma compressa (tsdb.py, una serie per dispositivo).          #
+# Metriche (metrics.py): con METRICS_PORT > 0 in formato Prometheus su /metrics, con      #
+# METRICS_TOPIC anche in JSON sul broker a ogni statistica; "METRICS_TIMING": true        #
+# misura anche i tempi di decodifica, attesa in coda e pubblicazione.                     #
+# Con CAPTURE_DIR i byte ricevuti da ogni porta vengono registrati (capture.py) in un     #
+# file <dispositivo>-<data>.scap. Un dispositivo con "replay" al posto di "port"          #
+# riproduce una registrazione alla velocità "speed" (1 = tempo reale, 0 = massima), con   #
+# i timestamp originali: serve a ripopolare broker e archivio dopo un'interruzione.       #
+#   {"replay": "capture/aula1-20250201-101500.scap", "speed": 0, "topic_prefix": "aula1"} #
+# I campioni riprodotti entrano nella serie dell'archivio del dispositivo (anche già      #
+# scritta in tempo reale: l'archivio accetta blocchi fuori ordine); con "series" un       #
+# dispositivo scrive invece in una serie propria (es. "series": "aula1_replay").          #
+# Con "PUBLISH_QOS": 1 (da attivare: il default è 0) i messaggi vengono pubblicati con    #
+# QoS 1 e seguiti fino alla conferma del broker (delivery.py): al più INFLIGHT_WINDOW in  #
+# volo, ritrasmessi da paho alla riconnessione (al più ACK_RETRIES volte), persi dopo     #
+# ACK_TIMEOUT secondi senza conferma a client connesso; le statistiche riportano conferme #
+# al secondo, messaggi in volo e ritrasmissioni. Con lo spool attivo la finestra piena    #
+# non blocca: i messaggi in eccesso vanno su disco.                                       #
+# I parametri sono controllati all'avvio (config.py); i moduli dei componenti opzionali   #
+# (cruscotto, archivio, spool, registrazioni) vengono importati solo se configurati.      #
+# Di solito si avvia con: python cli.py forward                                           #
+#                                                                                         #
+# Per eseguire questo script, è necessario installare la libreria paho-mqtt e pyserial.   #
+# Puoi installare le libreria eseguendo il seguente comando:                              #
+# pip install paho-mqtt pyserial                                                          #
+# Oppure, nella cartella del progetto, esegui il comando:                                 #
+# pip install -r requirements.txt                                                         #
+###########################################################################################
+
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per la cartella delle registrazioni
+import time  # Importa la libreria time per le statistiche periodiche
+import logging  # Importa la libreria logging per i messaggi
+import threading  # Importa la libreria threading per i thread di pubblicazione
+from serial_reader import open_port, open_reader  # Importa il lettore condiviso (testo o binario) e la porta che si riapre da sola
+from sensor_parser import LINE_ERROR_KINDS  # Importa i tipi di linee scartate
+import mqtt_publisher  # Importa il modulo di pubblicazione (valori singoli, JSON, binario, lotti)
+import pipeline  # Importa la pipeline con thread lettore, coda limitata e limitatore di frequenza
+from deadband import build_deadband  # Importa il filtro a banda morta
+from metrics import MetricsRegistry  # Importa contatori e istogrammi
+from config import load_config, ConfigError, PARAMETERS_FILE  # Importa la lettura controllata dei parametri
+from logging_setup import setup_logging_from  # Importa la configurazione del logging (coda e limite di frequenza)
+
+
+# Variabili globali
+parameters_file = PARAMETERS_FILE # File JSON contenente i parametri
+STATS_INTERVAL = 10 # Secondi tra due stampe delle statistiche
+SPOOL_DIR = "" # Cartella dei messaggi in attesa del broker (da attivare, es. "spool")
+TSDB_DIR = "" # Cartella dell'archivio locale (da attivare, es. "tsdb")
+log = logging.getLogger(__name__) # Logger del gateway
+
+
+# Funzione che legge i parametri dal file JSON
+def read_parameters(file_path):
+    """Ritorna i parametri controllati (config.Config), con la lista DEVICES sempre presente"""
+    try:
+        return load_config(file_path) # Legge e controlla il file una sola volta
+    except ConfigError as e: # File assente, JSON non valido o parametri non ammessi
+        log.error("Parametri non validi: %s", e) # Tutti gli errori in un solo messaggio
+        raise
+
+
+# Funzione callback per la connessione
+def on_connect(client, userdata, flags, rc): # Funzione di callback per la connessione
+    log.info("Connesso con codice risultato: %s", rc) # Registra il codice di connessione
+
+
+# Classe che raccoglie lettore, coda e pubblicazione di un singolo dispositivo
+class Device:
+    """Un dispositivo Arduino collegato a una porta seriale"""
+
+    def __init__(self, config, client, params, dashboard=None, store=None, metrics=None):
+        self.port = config.get('replay') or config.get('port') or f"USB {config['vid']}:{config['pid']}" # Nome della porta seriale
+        self.name = config['topic_prefix'] # Nome del dispositivo nel cruscotto
+        self.series = config.get('series', self.name) # Serie dell'archivio locale
+        self.dashboard = dashboard # Cruscotto web (None = disattivato)
+        self.store = store # Archivio locale (None = disattivato)
+        self.replay = 'replay' in config # True se riproduce una registrazione
+        if self.replay:
+            from capture import ReplaySerial # Importato qui: solo per i dispositivi che riproducono una registrazione
+            self.serial = ReplaySerial(config['replay'], config.get('speed', 1)) # Registrazione al posto della porta
+        else:
+            self.serial = open_port(config.get('port'), config['datarate'], reconnect=params.get('SERIAL_RECONNECT', True),
+                                    vid=config.get('vid'), pid=config.get('pid'),
+                                    serial_number=config.get('serial_number')) # Apre la porta seriale (riaperta se scollegata)
+        self.queue = pipeline.SampleQueue(params.get('QUEUE_SIZE', pipeline.QUEUE_SIZE),
+                                          params.get('DROP_POLICY', pipeline.DROP_OLDEST)) # Coda del dispositivo
+        self.publisher = mqtt_publisher.SamplePublisher(
+            client, params.get('PUBLISH_MODE', mqtt_publisher.MODE_JSON), config['topic_prefix'],
+            params.get('BATCH_SIZE', mqtt_publisher.BATCH_SIZE), params.get('BATCH_INTERVAL', mqtt_publisher.BATCH_INTERVAL),
+            params.get('PUBLISH_FIELD_TOPICS', False), f"{config['topic_prefix']}/",
+            deadband=build_deadband(params)) # Pubblicazione sul prefisso del dispositivo (client condiviso), filtro proprio
+        self.rate_limiter = pipeline.RateLimiter(params.get('PUBLISH_RATE', pipeline.PUBLISH_RATE)) # Limite di frequenza
+        self.reader = open_reader(self.serial, config['format']) # Lettore adatto al formato della porta
+        capture_dir = params.get('CAPTURE_DIR', "") # Cartella delle registrazioni ("" = nessuna)
+        if capture_dir and not self.replay:
+            from capture import CaptureWriter # Importato qui: solo se le registrazioni sono attive
+            os.makedirs(capture_dir, exist_ok=True)
+            file_name = f"{self.name.replace('/', '_')}-{time.strftime('%Y%m%d-%H%M%S')}.scap"
+            self.reader.capture = CaptureWriter(os.path.join(capture_dir, file_name)) # Registra i byte ricevuti
+        self.reader_thread = pipeline.ReaderThread(self.reader, self.queue, readings=True) # Thread lettore
+        self.publisher_thread = threading.Thread(target=self._publish, daemon=True) # Thread di pubblicazione
+        self.latency = self.queue_wait = self.publish_timer = None # Istogrammi dei tempi (None = non misurati)
+        if metrics:
+            self._register(metrics)
+        self._last_samples = 0 # Campioni pubblicati all'ultima statistica
+        self._last_time = time.monotonic() # Istante dell'ultima statistica
+
+    def _register(self, metrics):
+        """Registra le metriche del dispositivo: i contatori esistenti sono letti solo quando servono"""
+        labels = {'device': self.name}
+        metrics.counter('gateway_lines_read_total', "Linee (o frame) lette dalla seriale", labels, lambda: self.reader.active.lines_read)
+        metrics.counter('gateway_parse_errors_total', "Linee non riconosciute o frame corrotti", labels, lambda: self.reader.active.parse_errors)
+        for kind in LINE_ERROR_KINDS: # Linee scartate per tipo
+            metrics.counter('gateway_line_errors_total', "Linee scartate per tipo", {**labels, 'kind': kind},
+                            lambda kind=kind: self.reader.active.line_errors[kind])
+        metrics.counter('gateway_samples_published_total', "Campioni pubblicati", labels, lambda: self.publisher.samples)
+        metrics.counter('gateway_messages_sent_total', "Messaggi MQTT inviati", labels, lambda: self.publisher.messages)
+        metrics.counter('gateway_samples_dropped_total', "Campioni scartati per coda piena", labels, lambda: self.queue.dropped)
+        metrics.gauge('gateway_queue_depth', "Campioni in coda", labels, lambda: len(self.queue))
+        metrics.gauge('gateway_serial_connected', "1 se la porta seriale è aperta", labels, lambda: int(getattr(self.serial, 'is_open', True)))
+        metrics.counter('gateway_serial_reconnects_total', "Riaperture della porta seriale", labels, lambda: getattr(self.serial, 'reconnects', 0))
+        if self.publisher.deadband:
+            metrics.counter('gateway_deadband_suppressed_total', "Messaggi soppressi dal filtro a banda morta", labels,
+                            lambda: self.publisher.deadband.suppressed)
+        self.reader.parse_timer = metrics.timer('gateway_parse_seconds', "Tempo di decodifica di una linea o di un frame", labels)
+        if not self.replay: # In riproduzione l'arrivo è quello originale: latenza e attesa sarebbero l'età della registrazione
+            self.latency = metrics.histogram('gateway_publish_latency_seconds', "Dall'arrivo sulla seriale alla pubblicazione", labels)
+            self.queue_wait = metrics.timer('gateway_queue_wait_seconds', "Tempo di attesa in coda", labels)
+        self.publish_timer = metrics.timer('gateway_publish_seconds', "Tempo di pubblicazione, cruscotto e archivio", labels)
+
+    def start(self):
+        """Avvia i thread di lettura e di pubblicazione"""
+        self.reader_thread.start()
+        self.publisher_thread.start()
+
+    def _publish(self):
+        pipeline.consume(self.queue, self._handle, self.rate_limiter, on_idle=self.publisher.flush) # Pubblica i campioni del dispositivo
+
+    def _handle(self, item):
+        arrival, reading = item
+        start = time.monotonic()
+        if self.queue_wait: # Tempi degli stadi (METRICS_TIMING)
+            self.queue_wait.observe(start - arrival)
+        self.publisher.publish(reading, arrival) # Pubblica sul broker
+        if self.dashboard:
+            self.dashboard.add_sample(self.name, reading, arrival) # Un solo evento, per tutti i browser
+        if self.store:
+            self.store.append(self.series, time.time() - (time.monotonic() - arrival), reading) # Archivia con l'istante di arrivo
+        done = time.monotonic()
+        if self.latency:
+            self.latency.observe(done - arrival) # Latenza dall'arrivo sulla seriale
+        if self.publish_timer:
+            self.publish_timer.observe(done - start)
+
+    def is_alive(self):
+        """True finché il dispositivo sta leggendo o pubblicando"""
+        return self.publisher_thread.is_alive()
+
+    def stats(self):
+        """Ritorna la riga di statistiche della porta dall'ultima chiamata"""
+        now = time.monotonic() # Istante attuale
+        samples = self.publisher.samples # Campioni pubblicati finora
+        rate = (samples - self._last_samples) / (now - self._last_time) # Campioni al secondo nell'intervallo
+        self._last_samples, self._last_time = samples, now
+        line = (f"{self.port}: {rate:.1f} campioni/s, {samples} campioni, {self.publisher.messages} messaggi, "
+                f"{self.queue.dropped} scartati, {len(self.queue)} in coda")
+        if self.publisher.deadband:
+            line += f", {self.publisher.deadband.suppressed} soppressi"
+        if self.reader.active.parse_errors:
+            line += f", {self.reader.active.parse_errors} linee scartate"
+        if not getattr(self.serial, 'is_open', True):
+            line += ", porta scollegata"
+        return line
+
+    def stop(self):
+        """Ferma la lettura, invia i lotti rimasti e chiude la porta"""
+        self.reader_thread.stop() # Ferma la lettura (entro il timeout) e chiude la coda
+        self.publisher_thread.join() # La coda chiusa termina anche la pubblicazione
+        self.publisher.flush(force=True) # Invia l'eventuale lotto incompleto
+        self.serial.close() # Chiude la porta seriale
+        if self.reader.capture:
+            self.reader.capture.close() # Scrive su disco gli ultimi byte registrati
+
+
+# Funzione principale
+def main(params=None):
+    if params is None: # Parametri già letti e controllati da cli.py, oppure letti qui
+        params = read_parameters(parameters_file) # Leggi i parametri dal file JSON
+    setup_logging_from(params) # Messaggi scritti da un thread separato (LOG_LEVEL, LOG_RATE, LOG_FILE)
+    import paho.mqtt.client as mqtt # Importato qui: il modulo (es. Device) resta importabile senza paho
+
+    # Un solo client MQTT condiviso da tutti i dispositivi
+    client = mqtt.Client() # Crea un'istanza del client MQTT
+    client.username_pw_set(params['username'], params['password']) # Imposta username e password
+
+    metrics = MetricsRegistry(params.get('METRICS_TIMING', False)) # Metriche del gateway
+    connects = metrics.counter('gateway_mqtt_connects_total', "Connessioni (e riconnessioni) al broker")
+    disconnects = metrics.counter('gateway_mqtt_disconnects_total', "Disconnessioni dal broker")
+
+    sender = client # Oggetto usato per pubblicare
+    acker = None # Consegna con conferma (None = QoS 0)
+    if params.get('PUBLISH_QOS', 0) > 0:
+        import delivery # Consegna QoS 1 con finestra di messaggi in volo
+        acker = delivery.ReliablePublisher(client, params['PUBLISH_QOS'], params.get('INFLIGHT_WINDOW', delivery.WINDOW),
+                                           params.get('ACK_TIMEOUT', delivery.ACK_TIMEOUT),
+                                           params.get('ACK_RETRIES', delivery.MAX_RETRIES), metrics,
+                                           block=not params.get('SPOOL_DIR', SPOOL_DIR)) # Con lo spool la finestra piena non blocca
+        sender = acker
+    forwarder = None # Memorizzazione su disco (None = disattivata)
+    spool_dir = params.get('SPOOL_DIR', SPOOL_DIR) # Cartella dei messaggi in attesa ("" = disattivata)
+    if spool_dir:
+        import spool # Memorizzazione su disco dei messaggi quando il broker non risponde
+        disk_spool = spool.DiskSpool(spool_dir, params.get('SPOOL_SEGMENT_SIZE', spool.SEGMENT_SIZE),
+                                     params.get('SPOOL_FSYNC_INTERVAL', spool.FSYNC_INTERVAL)) # Log su disco
+        if disk_spool.pending:
+            log.info("%d messaggi in attesa dalla sessione precedente", disk_spool.pending)
+        forwarder = sender = spool.StoreAndForward(sender, disk_spool) # Pubblica o salva su disco (anche a finestra piena)
+        metrics.gauge('gateway_spool_pending', "Messaggi salvati su disco in attesa del broker", fn=lambda: forwarder.spool.pending)
+
+    def on_connect_gateway(*args): # Conta le (ri)connessioni e avvia subito l'invio dei messaggi salvati
+        on_connect(*args)
+        connects.inc()
+        if acker:
+            acker.on_connect() # Le scadenze delle conferme ripartono
+        if forwarder:
+            forwarder.on_connect()
+    client.on_connect = on_connect_gateway # Imposta la funzione di callback per la connessione
+    client.on_disconnect = lambda *args: disconnects.inc() # Conta le disconnessioni
+
+    metrics_server = dashboard = store = None # Componenti opzionali (None = disattivati o non ancora creati)
+    devices = [] # Dispositivi avviati: la chiusura ferma solo ciò che è stato creato
+    try:
+        client.connect_async(params['broker'], params['port'], 60) # Connessione al broker MQTT (riprova finché non risponde)
+        client.loop_start() # Avvia il loop del client MQTT (si riconnette da solo se il broker cade)
+
+        if params.get('METRICS_PORT', 0): # Metriche in formato Prometheus
+            from metrics import MetricsServer # Server HTTP importato solo se richiesto
+            metrics_server = MetricsServer(metrics, params['METRICS_PORT'])
+            metrics_server.start()
+        metrics_topic = params.get('METRICS_TOPIC', "") # Topic delle metriche JSON ("" = non pubblicate)
+
+        if params.get('DASHBOARD_PORT', 0): # Cruscotto web
+            from web_dashboard import DashboardServer # Cruscotto web (server-sent events)
+            dashboard = DashboardServer(params['DASHBOARD_PORT'])
+            dashboard.start()
+
+        if params.get('TSDB_DIR', TSDB_DIR): # Archivio locale
+            from tsdb import TimeSeriesStore # Archivio locale delle serie temporali
+            store = TimeSeriesStore(params.get('TSDB_DIR', TSDB_DIR))
+
+        for config in params['DEVICES']: # Apre tutte le porte (se una non si apre, le precedenti vengono chiuse)
+            device = Device(config, sender, params, dashboard, store, metrics)
+            device.start() # Avvia lettura e pubblicazione del dispositivo
+            devices.append(device)
+        log.info("Gateway avviato su %d porte", len(devices))
+
+        while any(device.is_alive() for device in devices): # Finché almeno un dispositivo è attivo
+            time.sleep(STATS_INTERVAL) # Attende fino alle prossime statistiche
+            for device in devices:
+                log.info(device.stats(), extra={'rate_key': device.port}) # Statistiche di ogni porta (limite per porta)
+            if store:
+                store.flush_due() # Scrive su disco i blocchi fermi da più di FLUSH_INTERVAL
+            if acker:
+                log.info(acker.stats()) # Conferme, messaggi in volo e ritrasmissioni
+            if forwarder: # Stato della memorizzazione su disco
+                log.info("spool: %d in attesa, %d salvati, %d inviati", forwarder.spool.pending, forwarder.spooled, forwarder.spool.drained)
+            if metrics_topic:
+                metrics.publish(client, metrics_topic) # Metriche sul broker (non salvate su disco se è irraggiungibile)
+    except KeyboardInterrupt: # Gestisce l'interruzione manuale (Ctrl+C)
+        log.info("Interruzione manuale")  # Messaggio di interruzione
+    finally:
+        for device in devices:
+            device.stop() # Ferma ogni dispositivo
+        if dashboard:
+            dashboard.stop() # Chiude il cruscotto web
+        if metrics_server:
+            metrics_server.stop() # Chiude il server delle metriche
+        if store:
+            store.close() # Scrive su disco gli ultimi campioni
+        if forwarder:
+            forwarder.close() # Salva su disco i messaggi non ancora inviati
+        if acker:
+            if not acker.flush(): # Attende le ultime conferme
+                log.warning("%d messaggi senza conferma alla chiusura", acker.inflight)
+            acker.close()
+            log.info(acker.stats())
+        client.loop_stop()  # Ferma il loop del client MQTT
+        client.disconnect()  # Disconnetti il client MQTT
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
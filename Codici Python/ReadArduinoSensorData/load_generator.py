@@ -0,0 +1,158 @@
+#########################################################################################
+# load_generator.py                                                                     #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Generatore di carico: simula uno o più Arduino scrivendo letture sintetiche (linee    #
+# di testo dello sketch DHT11_CORSO_IoT.ino oppure frame binari) su pseudo-terminali    #
+# (pty) alla frequenza voluta. Gli script di lettura si collegano al nome stampato      #
+# (/dev/pts/N) come se fosse la porta seriale di una scheda vera.                       #
+# Con --sequence il campo IdC °F contiene il numero progressivo del campione, usato     #
+# da benchmark_pipeline.py per misurare la latenza di ogni campione.                    #
+# Con --raw simula la modalità grezza dello sketch (solo umidità e °C).                 #
+# Funziona solo su sistemi POSIX (Linux, macOS).                                        #
+#                                                                                       #
+# Esempio (3 dispositivi, 500 linee al secondo ciascuno):                               #
+# python load_generator.py --devices 3 --rate 500                                       #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per i pseudo-terminali e la scrittura
+import math  # Importa la libreria math per i dati sintetici
+import time  # Importa la libreria time per la frequenza di invio
+import random  # Importa la libreria random per il rumore dei dati sintetici
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import threading  # Importa la libreria threading per un generatore per dispositivo
+from sensor_parser import SensorReading, format_line, format_raw_line  # Importa il record e il formato testuale dello sketch
+from binary_protocol import FORMAT_TEXT, FORMAT_BINARY, encode_frame, encode_raw_frame  # Importa il formato binario
+
+
+# Valori di default
+RATE = 10  # Linee al secondo per dispositivo (0 = il più velocemente possibile)
+MAX_BURST = 1000  # Linee massime scritte con una sola write()
+
+
+# Funzione per generare dati sintetici (spostata qui da graphs_synth.py)
+def generate_synthetic_data(t):
+    """Genera dati sintetici basati sul tempo"""
+    humidity = 50 + 10 * math.sin(t / 10) + random.uniform(-2, 2)  # Umidità come sinusoide più rumore casuale
+    temp_c = 25 + 5 * math.sin(t / 15) + random.uniform(-0.5, 0.5)  # Temperatura Celsius con oscillazione e rumore
+    temp_f = temp_c * 9 / 5 + 32  # Converte la temperatura da Celsius a Fahrenheit
+    idc_c = 32 + 2 * math.sin(t / 20) + random.uniform(-0.3, 0.3)  # IdC in Celsius con piccole variazioni
+    idc_f = idc_c * 9 / 5 + 32  # Converte IdC da Celsius a Fahrenheit
+    return SensorReading(humidity, temp_c, temp_f, idc_c, idc_f)
+
+
+# Funzione che codifica una lettura come la invierebbe lo sketch
+def encode_sample(reading, serial_format=FORMAT_TEXT, raw=False):
+    """Linea di testo terminata da CR LF oppure frame binario (solo umidità e °C se raw)"""
+    if serial_format == FORMAT_BINARY:
+        return encode_raw_frame(reading) if raw else encode_frame(reading)
+    return ((format_raw_line(reading) if raw else format_line(reading)) + "\r\n").encode('utf-8')
+
+
+# Funzione che crea un pseudo-terminale in modalità raw
+def open_pty():
+    """Ritorna (descrittore del lato 'Arduino', descrittore e nome del lato 'porta seriale').
+    Il descrittore del lato 'porta seriale' va chiuso da chi chiama quando il lettore ha aperto la porta."""
+    import tty  # Solo POSIX: importato qui per lasciare importabile il modulo su Windows
+    master, slave = os.openpty()
+    tty.setraw(slave)  # Nessuna elaborazione dei caratteri (eco, CR/LF)
+    tty.setraw(master)
+    return master, slave, os.ttyname(slave)
+
+
+# Classe che scrive letture sintetiche su un descrittore alla frequenza voluta
+class LoadGenerator:
+    """Un Arduino simulato"""
+
+    def __init__(self, fd, rate=RATE, serial_format=FORMAT_TEXT, sequence=False, raw=False):
+        self.fd = fd  # Descrittore su cui scrivere
+        self.rate = rate  # Linee al secondo (0 = senza limite)
+        self.serial_format = serial_format  # "text" o "binary"
+        self.sequence = sequence  # Numero progressivo nel campo IdC °F
+        self.raw = raw  # Modalità grezza: solo umidità e °C
+        self.sent = 0  # Campioni scritti
+        self.send_times = []  # Istante (monotono) di scrittura di ogni campione, se sequence=True
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _burst(self, count):
+        """Codifica 'count' campioni consecutivi"""
+        chunks = []
+        for _ in range(count):
+            reading = generate_synthetic_data(self.sent)
+            if self.sequence:
+                reading = reading._replace(idc_f=float(self.sent))
+            chunks.append(encode_sample(reading, self.serial_format, self.raw))
+            self.sent += 1
+        return b"".join(chunks)
+
+    def run(self, duration=None, count=None):
+        """Scrive finché non viene fermato, per 'duration' secondi o per 'count' campioni"""
+        start = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if duration is not None and now - start >= duration:
+                break
+            if count is not None and self.sent >= count:
+                break
+            if self.rate > 0:  # Campioni dovuti fino ad ora
+                due = min(int((now - start) * self.rate) - self.sent, MAX_BURST)
+                if due <= 0:
+                    time.sleep(min(1.0 / self.rate, 0.01))
+                    continue
+            else:
+                due = MAX_BURST if count is None else min(MAX_BURST, count - self.sent)
+            data = self._burst(due)
+            if self.sequence:  # Istante di scrittura (il campione successivo attende questa write)
+                sent_at = time.monotonic()
+                self.send_times.extend([sent_at] * due)
+            view = memoryview(data)
+            while view:  # Scrive tutto (si blocca se il lettore non tiene il passo)
+                view = view[os.write(self.fd, view):]
+        return self.sent
+
+
+# Funzione principale
+def main():
+    arg_parser = argparse.ArgumentParser(description="Simula uno o più Arduino su pseudo-terminali")
+    arg_parser.add_argument("--devices", type=int, default=1, help="numero di dispositivi simulati")
+    arg_parser.add_argument("--rate", type=float, default=RATE, help="linee al secondo per dispositivo (0 = massimo)")
+    arg_parser.add_argument("--format", choices=(FORMAT_TEXT, FORMAT_BINARY), default=FORMAT_TEXT, help="formato dei dati")
+    arg_parser.add_argument("--duration", type=float, default=None, help="secondi di funzionamento (default: fino a Ctrl+C)")
+    arg_parser.add_argument("--sequence", action="store_true", help="numero progressivo nel campo IdC °F")
+    arg_parser.add_argument("--raw", action="store_true", help="modalità grezza dello sketch (solo umidità e °C)")
+    args = arg_parser.parse_args()
+    if args.raw and args.sequence:
+        arg_parser.error("--sequence usa il campo IdC °F, che in modalità grezza non viene inviato")
+
+    generators, threads, fds = [], [], []
+    for _ in range(args.devices):
+        master, slave, name = open_pty()
+        fds.append(slave)  # Tiene aperta la porta finché il lettore non si collega
+        print(f"Dispositivo simulato su {name}")  # Porta da indicare in SERIAL_COM_PORT o DEVICES
+        generator = LoadGenerator(master, args.rate, args.format, args.sequence, args.raw)
+        generators.append(generator)
+        threads.append(threading.Thread(target=generator.run, args=(args.duration,), daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+            print(", ".join(f"{generator.sent}" for generator in generators), "campioni inviati")
+    except KeyboardInterrupt:  # Gestisce l'interruzione manuale (Ctrl+C)
+        print("Interruzione manuale")
+    for generator in generators:
+        generator.stop()
+    for fd in fds:
+        os.close(fd)
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
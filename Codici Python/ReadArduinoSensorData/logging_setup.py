@@ -0,0 +1,116 @@
+#########################################################################################
+# logging_setup.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Configurazione condivisa del logging al posto delle print() sulla console.            #
+# - I thread di lettura e pubblicazione mettono i messaggi in una coda (QueueHandler);  #
+#   la scrittura su console o su file avviene in un thread separato (QueueListener),    #
+#   quindi un terminale lento o journald non rallentano la pipeline.                    #
+# - I messaggi ripetitivi (stessa riga di codice, es. "Ricevuto: %s" per ogni           #
+#   campione o le statistiche già formattate) sono limitati a LOG_RATE al secondo;      #
+#   quando un messaggio torna a passare riporta quanti messaggi simili sono stati       #
+#   soppressi. Il filtro è applicato prima della coda, quindi i messaggi soppressi non  #
+#   vengono nemmeno formattati; i contatori delle righe inattive vengono rimossi.       #
+#   Una riga che scrive per più dispositivi (es. le statistiche di ogni porta) passa    #
+#   extra={'rate_key': nome} e ha un limite per dispositivo. WARNING ed ERROR non       #
+#   vengono mai soppressi.                                                              #
+# Parametri in 'parameters.json':                                                       #
+#   "LOG_LEVEL": "INFO"   (DEBUG mostra anche ogni campione)                            #
+#   "LOG_RATE": 10        (messaggi uguali al secondo, 0 = nessun limite)               #
+#   "LOG_FILE": ""        (file con rotazione, "" = solo console)                       #
+#########################################################################################
+
+# Importa le librerie necessarie
+import sys  # Importa la libreria sys per scrivere sulla console
+import time  # Importa la libreria time per il limite di frequenza
+import queue  # Importa la libreria queue per la coda dei messaggi
+import atexit  # Importa la libreria atexit per scrivere gli ultimi messaggi all'uscita
+import logging  # Importa la libreria logging della libreria standard
+import threading  # Importa la libreria threading per proteggere i contatori del filtro
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler  # Gestori della libreria standard
+
+
+# Valori di default
+LOG_LEVEL = "INFO"  # Livello minimo dei messaggi
+LOG_RATE = 10  # Messaggi con lo stesso formato al secondo (0 = nessun limite)
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"  # Formato delle righe
+LOG_FILE_SIZE = 10 * 1024 * 1024  # Byte massimi di un file di log prima della rotazione
+LOG_FILE_COUNT = 3  # File di log precedenti conservati
+IDLE_BUCKET = 60.0  # Secondi di inattività dopo cui il contatore di una riga di codice viene rimosso
+
+_listener = None  # QueueListener attivo (uno per processo)
+
+
+# Filtro che limita i messaggi ripetitivi
+class RateLimitFilter(logging.Filter):
+    """Lascia passare al più 'rate' messaggi INFO o DEBUG al secondo per ogni riga di codice (token bucket)"""
+
+    def __init__(self, rate=LOG_RATE, burst=None):
+        super().__init__()
+        self.rate = rate  # Messaggi al secondo per formato
+        self.burst = burst or max(1, rate)  # Messaggi consecutivi ammessi dopo un periodo di silenzio
+        self._buckets = {}  # (logger, livello, file, riga, rate_key) -> [gettoni, ultimo istante, soppressi]
+        self._lock = threading.Lock()  # Più thread possono scrivere nello stesso logger
+        self._swept = time.monotonic()  # Ultima rimozione dei contatori inattivi
+        self.suppressed = 0  # Messaggi soppressi in totale
+
+    def filter(self, record):
+        if not self.rate or record.levelno >= logging.WARNING:  # Avvisi ed errori passano sempre
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno,  # La riga di codice, non il testo (anche se già formattato)
+               getattr(record, 'rate_key', None))  # Più il dispositivo, se la riga scrive per più dispositivi
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept >= IDLE_BUCKET:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)  # Ricarica i gettoni
+            bucket[1] = now
+            if bucket[0] < 1:  # Troppi messaggi uguali
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            skipped, bucket[2] = bucket[2], 0
+        if skipped:  # Il messaggio riporta quanti simili sono stati soppressi
+            record.msg = f"{record.msg} [+{skipped} messaggi simili soppressi]"
+        return True
+
+    def _sweep(self, now):
+        """Rimuove i contatori inattivi da più di IDLE_BUCKET secondi (con il lock già preso)"""
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < IDLE_BUCKET}
+        self._swept = now
+
+
+# Funzione che configura il logging del processo
+def setup_logging(level=LOG_LEVEL, rate=LOG_RATE, log_file=""):
+    """Collega il logger principale a una coda svuotata da un thread separato; ritorna il QueueListener"""
+    global _listener
+    if _listener is not None:  # Già configurato (es. gateway importato da async_gateway)
+        return _listener
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]  # Console, come le print() precedenti
+    if log_file:
+        handlers.append(RotatingFileHandler(log_file, maxBytes=LOG_FILE_SIZE, backupCount=LOG_FILE_COUNT, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()  # Coda senza limite: il filtro limita già i messaggi ripetitivi
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate))  # Filtro prima della coda: i messaggi soppressi non costano nulla
+    root = logging.getLogger()
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Scrive i messaggi rimasti in coda all'uscita
+    return _listener
+
+
+def setup_logging_from(params):
+    """Configura il logging con le chiavi LOG_LEVEL, LOG_RATE e LOG_FILE dei parametri"""
+    return setup_logging(params.get('LOG_LEVEL', LOG_LEVEL), params.get('LOG_RATE', LOG_RATE), params.get('LOG_FILE', ""))
@@ -0,0 +1,133 @@
+#########################################################################################
+# memory_broker.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Broker MQTT "finto", interno al processo, da usare al posto del client paho per       #
+# provare la pipeline senza un broker reale (prove con una pseudo-seriale, benchmark).  #
+# Offre lo stesso metodo publish() del client paho e consegna i messaggi in modo        #
+# sincrono ai sottoscrittori, con il supporto dei caratteri jolly MQTT '+' e '#'.       #
+# La conferma (on_publish) è immediata, oppure arriva dopo 'ack_delay' secondi da un    #
+# thread a sé, come da un broker remoto; 'ack_loss' ne perde una frazione a caso        #
+# (prove della finestra e della scadenza delle conferme di delivery.py).                #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per registrare l'istante di ricezione
+import random  # Importa la libreria random per le conferme perse
+import threading  # Importa la libreria threading per l'accesso concorrente
+from collections import deque  # Importa deque per conservare gli ultimi messaggi
+
+
+# Funzione che verifica se un topic corrisponde a un filtro MQTT
+def topic_matches(topic_filter, topic):
+    """True se 'topic' corrisponde a 'topic_filter' (con '+' e '#')"""
+    filter_parts = topic_filter.split('/')  # Livelli del filtro
+    topic_parts = topic.split('/')  # Livelli del topic
+    for index, part in enumerate(filter_parts):
+        if part == '#':  # '#' corrisponde a tutti i livelli rimanenti
+            return True
+        if index >= len(topic_parts):  # Il topic ha meno livelli del filtro
+            return False
+        if part != '+' and part != topic_parts[index]:  # Livello diverso
+            return False
+    return len(filter_parts) == len(topic_parts)  # Stesso numero di livelli
+
+
+# Risultato di una pubblicazione, con gli stessi campi principali di paho MQTTMessageInfo
+class MessageInfo:
+    """Esito di publish(): il messaggio è sempre consegnato subito"""
+
+    def __init__(self, mid):
+        self.mid = mid  # Identificativo del messaggio
+        self.rc = 0  # Codice di ritorno (0 = MQTT_ERR_SUCCESS)
+
+    def is_published(self):
+        return True  # La consegna è sincrona
+
+    def wait_for_publish(self, timeout=None):
+        return None  # Niente da attendere
+
+
+# Broker interno al processo con l'interfaccia minima del client paho
+class InMemoryBroker:
+    """Riceve i messaggi pubblicati, li conta e li consegna ai sottoscrittori"""
+
+    def __init__(self, keep_last=1000, ack_delay=0, ack_loss=0):
+        self._lock = threading.Lock()  # Protegge contatori e sottoscrizioni
+        self._subscriptions = []  # Coppie (filtro, funzione di callback)
+        self.messages = deque(maxlen=keep_last)  # Ultimi messaggi (istante, topic, payload)
+        self.published = 0  # Numero totale di messaggi ricevuti
+        self.payload_bytes = 0  # Byte totali ricevuti
+        self._mid = 0  # Ultimo identificativo assegnato
+        self.on_publish = None  # Callback come in paho: on_publish(client, userdata, mid)
+        self.ack_delay = ack_delay  # Secondi tra la ricezione e la conferma (0 = subito, nel thread di publish)
+        self.ack_loss = ack_loss  # Frazione di conferme perse
+        self._acks = deque()  # Conferme ritardate (istante, mid), in ordine di scadenza
+        self._ack_ready = threading.Condition()
+        self._acker = None  # Thread delle conferme ritardate (avviato al primo messaggio)
+
+    def subscribe(self, topic_filter, callback):
+        """Registra 'callback(topic, payload, received)' per i topic che corrispondono al filtro"""
+        with self._lock:
+            self._subscriptions.append((topic_filter, callback))
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        """Riceve un messaggio, come client.publish() di paho"""
+        received = time.monotonic()  # Istante di ricezione
+        if isinstance(payload, str):  # paho codifica le stringhe in UTF-8
+            payload = payload.encode('utf-8')
+        elif isinstance(payload, (int, float)):  # ... e i numeri come testo
+            payload = str(payload).encode('ascii')
+        elif payload is None:
+            payload = b""
+        with self._lock:
+            self._mid += 1
+            mid = self._mid
+            self.published += 1
+            self.payload_bytes += len(payload)
+            self.messages.append((received, topic, payload))
+            callbacks = [callback for topic_filter, callback in self._subscriptions if topic_matches(topic_filter, topic)]
+        for callback in callbacks:  # Consegna fuori dal lock
+            callback(topic, payload, received)
+        if self.on_publish and not (self.ack_loss and random.random() < self.ack_loss):
+            if self.ack_delay:  # Conferma dopo il tempo di andata e ritorno
+                self._delay_ack(received + self.ack_delay, mid)
+            else:  # Conferma immediata, come un broker QoS 1 velocissimo
+                self.on_publish(self, None, mid)
+        return MessageInfo(mid)
+
+    def _delay_ack(self, due, mid):
+        with self._ack_ready:
+            if self._acker is None:
+                self._acker = threading.Thread(target=self._ack_loop, daemon=True)
+                self._acker.start()
+            self._acks.append((due, mid))
+            self._ack_ready.notify()
+
+    def _ack_loop(self):
+        while True:
+            with self._ack_ready:
+                self._ack_ready.wait_for(lambda: self._acks)
+                due, mid = self._acks[0]
+                delay = due - time.monotonic()
+                if delay > 0:  # Non ancora scaduta: riprova allo scadere (o al prossimo messaggio)
+                    self._ack_ready.wait(delay)
+                    continue
+                self._acks.popleft()
+            self.on_publish(self, None, mid)  # Come il thread di rete di paho
+
+    def is_connected(self):
+        return True  # Sempre raggiungibile
+
+    # Metodi del client paho che il gateway chiama all'avvio e alla chiusura
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
@@ -0,0 +1,216 @@
+#########################################################################################
+# metrics.py                                                                            #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Metriche del gateway (contatori, valori istantanei e istogrammi) al posto delle       #
+# print() su ogni linea. Le metriche sono esposte:                                      #
+# - in formato testo Prometheus su http://<gateway>:<METRICS_PORT>/metrics;             #
+# - come messaggio JSON periodico sul topic METRICS_TOPIC.                              #
+# Sul percorso caldo costano poco: i contatori già presenti nei lettori, nelle code e   #
+# nei publisher vengono letti solo quando le metriche sono richieste (funzione 'fn');   #
+# un istogramma costa una ricerca binaria e tre somme per campione.                     #
+# I tempi dei singoli stadi (decodifica, attesa in coda, pubblicazione) si attivano     #
+# con "METRICS_TIMING": true in 'parameters.json', senza modificare il codice:          #
+# quando sono disattivati timer() ritorna None e lo stadio non misura nulla.            #
+# Ogni metrica con etichette diverse (es. una per dispositivo) ha un solo thread che    #
+# la aggiorna, per questo non servono lock.                                             #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per il messaggio MQTT delle metriche
+import bisect  # Importa la libreria bisect per trovare il bucket degli istogrammi
+import logging  # Importa la libreria logging per i messaggi
+import threading  # Importa la libreria threading per il server HTTP
+
+
+# Valori di default
+METRICS_PORT = 9100  # Porta HTTP delle metriche
+TIME_BUCKETS = tuple(base * 10.0 ** exponent for exponent in range(-6, 1) for base in (1, 2.5, 5)) + (10.0,)  # Da 1 µs a 10 s
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  # Formato testo di Prometheus
+
+
+# Funzione che scrive le etichette nel formato di Prometheus
+def format_labels(labels):
+    """{'device': 'aula1'} -> '{device="aula1"}'"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in labels.items()) + "}"
+
+
+# Contatore che cresce sempre
+class Counter:
+    """Contatore incrementato con inc() oppure letto da una funzione"""
+
+    kind = "counter"
+
+    def __init__(self, labels=None, fn=None):
+        self.labels = format_labels(labels)  # Etichette già formattate
+        self.fn = fn  # Funzione che ritorna il valore (None = contatore proprio)
+        self.count = 0
+
+    def inc(self, amount=1):
+        self.count += amount
+
+    def value(self):
+        return self.fn() if self.fn else self.count
+
+
+# Valore istantaneo (es. campioni in coda)
+class Gauge(Counter):
+    """Valore che può salire e scendere, letto da una funzione o impostato con set()"""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.count = value
+
+
+# Istogramma a bucket fissi
+class Histogram:
+    """Conta le osservazioni per bucket, con somma e numero totale"""
+
+    kind = "histogram"
+
+    def __init__(self, labels=None, buckets=TIME_BUCKETS):
+        self.labels = labels or {}  # Etichette (servono anche per l'etichetta 'le' dei bucket)
+        self.bounds = tuple(buckets)  # Limiti superiori dei bucket
+        self.counts = [0] * (len(self.bounds) + 1)  # Ultimo bucket: oltre l'ultimo limite (+Inf)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Stima del percentile 'q' (limite superiore del bucket che lo contiene)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def samples(self, name):
+        """Righe Prometheus: bucket cumulativi, somma e numero"""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            labels = format_labels({**self.labels, 'le': "+Inf" if bound == float('inf') else f"{bound:g}"})
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labels)
+        lines.append(f"{name}_sum{labels} {self.sum:.9g}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+# Insieme delle metriche del processo
+class MetricsRegistry:
+    """Crea le metriche e le esporta in formato Prometheus o come dizionario"""
+
+    def __init__(self, timing=False):
+        self.timing = timing  # True per misurare i tempi dei singoli stadi
+        self._families = {}  # Nome -> (tipo, descrizione, metriche con etichette diverse)
+        self._lock = threading.Lock()  # Protegge la creazione delle metriche
+
+    def _register(self, name, help_text, metric):
+        with self._lock:
+            family = self._families.setdefault(name, (metric.kind, help_text, []))
+            family[2].append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        return self._register(name, help_text, Counter(labels, fn))
+
+    def gauge(self, name, help_text, labels=None, fn=None):
+        return self._register(name, help_text, Gauge(labels, fn))
+
+    def histogram(self, name, help_text, labels=None, buckets=TIME_BUCKETS):
+        return self._register(name, help_text, Histogram(labels, buckets))
+
+    def timer(self, name, help_text, labels=None):
+        """Istogramma dei tempi di uno stadio, solo se METRICS_TIMING è attivo (altrimenti None)"""
+        return self.histogram(name, help_text, labels) if self.timing else None
+
+    def render(self):
+        """Testo nel formato di esposizione di Prometheus"""
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+        for name, (kind, help_text, metrics) in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                if kind == "histogram":
+                    lines.extend(metric.samples(name))
+                else:
+                    lines.append(f"{name}{metric.labels} {metric.value()}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Dizionario compatto (per il topic MQTT): valori e, per gli istogrammi, numero, media e percentili"""
+        result = {}
+        with self._lock:
+            families = list(self._families.items())
+        for name, (kind, _, metrics) in families:
+            for metric in metrics:
+                if kind == "histogram":
+                    key = name + format_labels(metric.labels)
+                    mean = metric.sum / metric.count if metric.count else None
+                    result[key] = {'count': metric.count, 'mean': mean, 'p50': metric.quantile(0.5), 'p99': metric.quantile(0.99)}
+                else:
+                    result[name + metric.labels] = metric.value()
+        return result
+
+    def publish(self, client, topic):
+        """Pubblica le metriche come messaggio JSON"""
+        client.publish(topic, json.dumps(self.snapshot()))
+
+
+# Gestore delle richieste HTTP delle metriche (unito a BaseHTTPRequestHandler da MetricsServer)
+class MetricsHandler:
+    """Serve /metrics in formato Prometheus"""
+
+    registry = None  # Impostato da MetricsServer
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            body, code, content_type = b"not found", 404, 'text/plain'
+        else:
+            body, code, content_type = self.registry.render().encode('utf-8'), 200, CONTENT_TYPE
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Nessuna riga di log per ogni richiesta
+
+
+# Server HTTP delle metriche in un thread separato
+class MetricsServer:
+    """Espone il registro delle metriche su /metrics"""
+
+    def __init__(self, registry, port=METRICS_PORT, host=''):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # Importato qui: solo se le metriche sono servite
+        handler = type('Handler', (MetricsHandler, BaseHTTPRequestHandler), {'registry': registry})  # Gestore legato a questo registro
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logging.getLogger(__name__).info("Metriche su http://localhost:%d/metrics", self.server.server_address[1])
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
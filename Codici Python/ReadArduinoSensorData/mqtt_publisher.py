@@ -0,0 +1,148 @@
+#########################################################################################
+# mqtt_publisher.py                                                                     #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Modulo condiviso per pubblicare le letture del sensore sul broker MQTT.               #
+# Modalità disponibili (PUBLISH_MODE in parameters.json):                               #
+# - "fields": un messaggio per ogni valore, sui topic storici (Humidity, ...);          #
+# - "json":   un solo messaggio JSON per campione sul topic <prefisso>/sample;          #
+# - "packed": un solo messaggio binario per campione (float64 + 5 float32).             #
+# Con BATCH_SIZE > 1 o BATCH_INTERVAL > 0 più campioni vengono raggruppati in un        #
+# unico messaggio sul topic <prefisso>/batch (lista JSON o record binari concatenati).  #
+# PUBLISH_FIELD_TOPICS mantiene anche i topic storici per compatibilità.                #
+# I riepiloghi delle finestre (aggregation.py) vanno su <prefisso>/summary/<finestra>.  #
+# Con un filtro a banda morta (deadband.py) i valori stabili non vengono ripubblicati.  #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per creare i messaggi JSON
+import time  # Importa la libreria time per i timestamp e gli intervalli dei lotti
+import struct  # Importa la libreria struct per i messaggi binari
+from sensor_parser import SensorReading  # Importa il record con i cinque valori
+
+
+# Modalità di pubblicazione
+MODE_FIELDS = "fields"  # Un messaggio per ogni valore (comportamento storico)
+MODE_JSON = "json"  # Un messaggio JSON per campione
+MODE_PACKED = "packed"  # Un messaggio binario per campione
+
+# Valori di default
+TOPIC_PREFIX = "dht11"  # Prefisso dei topic strutturati
+BATCH_SIZE = 1  # Campioni per messaggio (1 = nessun raggruppamento)
+BATCH_INTERVAL = 0  # Secondi massimi di attesa prima di inviare un lotto (0 = nessun limite)
+
+# Topic storici usati da read_send_v02.py per i singoli valori
+FIELD_TOPICS = {'humidity': 'Humidity', 'temp_c': 'Temperature', 'idc_c': 'IdC'}
+
+# Schema binario di un campione: timestamp (float64) + 5 valori (float32), little-endian
+PACKED_SAMPLE = struct.Struct('<d5f')
+
+
+# Funzione che converte un campione in un dizionario pronto per il JSON
+def sample_to_dict(timestamp, reading):
+    """Ritorna {'ts': ..., 'humidity': ..., ...} per un SensorReading"""
+    sample = {'ts': round(timestamp, 3)}  # Timestamp in secondi (epoch) al millisecondo
+    sample.update(zip(SensorReading._fields, reading))  # Un campo per ogni valore
+    return sample
+
+
+# Classe che raggruppa i campioni in lotti per numero o per tempo
+class SampleBatcher:
+    """Accumula campioni e restituisce il lotto quando è pieno o troppo vecchio"""
+
+    def __init__(self, max_samples=BATCH_SIZE, max_interval=BATCH_INTERVAL):
+        self.max_samples = max(1, max_samples)  # Campioni massimi per lotto
+        self.max_interval = max_interval  # Età massima (s) del primo campione del lotto
+        self._samples = []  # Campioni del lotto corrente
+        self._started = 0.0  # Istante (monotono) del primo campione del lotto
+
+    def add(self, sample):
+        """Aggiunge un campione; ritorna il lotto completo oppure None"""
+        if not self._samples:  # Primo campione del lotto
+            self._started = time.monotonic()
+        self._samples.append(sample)  # Accoda il campione
+        if len(self._samples) >= self.max_samples or self.due():  # Lotto pieno o scaduto
+            return self.take()
+        return None
+
+    def due(self):
+        """True se il lotto corrente ha superato l'età massima"""
+        return bool(self._samples) and self.max_interval > 0 and time.monotonic() - self._started >= self.max_interval
+
+    def take(self):
+        """Ritorna e svuota il lotto corrente"""
+        samples, self._samples = self._samples, []  # Scambia la lista senza copiarla
+        return samples
+
+
+# Classe che pubblica le letture secondo la modalità configurata
+class SamplePublisher:
+    """Pubblica le letture come valori singoli, JSON o binario, eventualmente a lotti"""
+
+    def __init__(self, client, mode=MODE_FIELDS, topic_prefix=TOPIC_PREFIX,
+                 batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL, field_topics=False, field_prefix="", deadband=None):
+        if mode not in (MODE_FIELDS, MODE_JSON, MODE_PACKED):  # Controlla che la modalità sia valida
+            raise ValueError(f"Modalità di pubblicazione non valida: {mode}")
+        self.client = client  # Client MQTT (paho) già connesso
+        self.mode = mode  # Modalità di pubblicazione
+        self.sample_topic = f"{topic_prefix}/sample"  # Topic dei singoli campioni
+        self.batch_topic = f"{topic_prefix}/batch"  # Topic dei lotti
+        self.summary_topic = f"{topic_prefix}/summary"  # Prefisso dei topic dei riepiloghi
+        self.field_topics = field_topics or mode == MODE_FIELDS  # Pubblica anche sui topic storici
+        self.topics = {field: field_prefix + topic for field, topic in FIELD_TOPICS.items()}  # Topic storici (con prefisso opzionale)
+        self.batcher = None  # Raggruppamento disattivato per default
+        self.deadband = deadband  # Filtro a banda morta (None = pubblica tutto)
+        if mode != MODE_FIELDS and (batch_size > 1 or batch_interval > 0):
+            self.batcher = SampleBatcher(batch_size, batch_interval)
+        self.messages = 0  # Messaggi MQTT inviati
+        self.samples = 0  # Campioni pubblicati
+
+    def publish(self, reading, arrival=None):
+        """Pubblica una lettura; 'arrival' è l'istante monotono di arrivo dalla seriale"""
+        timestamp = time.time()  # Orario attuale (epoch)
+        if arrival is not None:  # Riporta il timestamp all'istante di arrivo
+            timestamp -= time.monotonic() - arrival
+        self.samples += 1
+        if self.field_topics:  # Topic storici: un messaggio per valore
+            for field, topic in self.topics.items():
+                value = getattr(reading, field)
+                if self.deadband is None or self.deadband.accept(topic, field, value, arrival):
+                    self._send(topic, value)
+        if self.mode == MODE_FIELDS:
+            return
+        if self.deadband and not self.deadband.accept_sample(self.sample_topic, reading, arrival):  # Campione stabile (istante di arrivo: vale anche per una registrazione riprodotta)
+            return
+        if self.batcher is None:  # Un messaggio per campione
+            self._send(self.sample_topic, self._encode([(timestamp, reading)]))
+            return
+        batch = self.batcher.add((timestamp, reading))  # Accoda il campione al lotto
+        if batch:  # Lotto completo
+            self._send(self.batch_topic, self._encode(batch, as_list=True))
+
+    def flush(self, force=False):
+        """Invia il lotto corrente se è scaduto (o sempre, con force=True)"""
+        if self.batcher and (force or self.batcher.due()):
+            batch = self.batcher.take()
+            if batch:
+                self._send(self.batch_topic, self._encode(batch, as_list=True))
+
+    def publish_summary(self, window, summary):
+        """Pubblica il riepilogo JSON di una finestra sul topic <prefisso>/summary/<finestra>"""
+        self._send(f"{self.summary_topic}/{window}", json.dumps(summary))
+
+    def _encode(self, samples, as_list=False):
+        """Codifica uno o più campioni secondo la modalità"""
+        if self.mode == MODE_PACKED:  # Record binari concatenati
+            return b"".join(PACKED_SAMPLE.pack(timestamp, *reading) for timestamp, reading in samples)
+        if as_list:  # Lotto JSON: lista di campioni
+            return json.dumps([sample_to_dict(timestamp, reading) for timestamp, reading in samples])
+        timestamp, reading = samples[0]
+        return json.dumps(sample_to_dict(timestamp, reading))  # Singolo campione JSON
+
+    def _send(self, topic, payload):
+        """Pubblica un messaggio e aggiorna il contatore"""
+        self.client.publish(topic, payload)
+        self.messages += 1
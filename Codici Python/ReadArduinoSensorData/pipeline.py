@@ -0,0 +1,157 @@
+#########################################################################################
+# pipeline.py                                                                           #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Modulo condiviso che separa la lettura dalla seriale dalla pubblicazione dei dati.    #
+# Un thread lettore svuota continuamente la porta seriale e mette le linee in una       #
+# coda di dimensione limitata; lo stadio di pubblicazione consuma la coda con la        #
+# velocità desiderata. Se la coda è piena si scarta il campione più vecchio             #
+# (drop-oldest) o quello più nuovo (drop-newest) e si contano i campioni persi,         #
+# invece di lasciare traboccare il buffer del sistema operativo.                        #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per la limitazione della frequenza
+import threading  # Importa la libreria threading per il thread lettore e la sincronizzazione
+from collections import deque  # Importa deque per la coda a dimensione limitata
+
+
+# Politiche di scarto quando la coda è piena
+DROP_OLDEST = "drop-oldest"  # Scarta il campione più vecchio e accoda il nuovo
+DROP_NEWEST = "drop-newest"  # Scarta il campione appena arrivato
+
+# Valori di default della pipeline
+QUEUE_SIZE = 1000  # Numero massimo di campioni in attesa di pubblicazione
+PUBLISH_RATE = 0  # Campioni pubblicati al secondo (0 = nessun limite)
+
+
+# Coda limitata e thread-safe con politica di scarto configurabile
+class SampleQueue:
+    """Coda limitata con contatori dei campioni accodati e scartati"""
+
+    def __init__(self, maxsize=QUEUE_SIZE, drop_policy=DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):  # Controlla che la politica sia valida
+            raise ValueError(f"Politica di scarto non valida: {drop_policy}")
+        self.maxsize = maxsize  # Dimensione massima della coda
+        self.drop_policy = drop_policy  # Politica di scarto quando la coda è piena
+        self._items = deque()  # Elementi in attesa
+        self._cond = threading.Condition()  # Condizione per svegliare il consumatore
+        self._closed = False  # Diventa True quando il produttore ha terminato
+        self.enqueued = 0  # Numero di campioni accodati
+        self.dropped = 0  # Numero di campioni scartati per coda piena
+
+    def put(self, item):
+        """Accoda un elemento; ritorna False se è stato scartato un campione"""
+        with self._cond:  # Accesso esclusivo alla coda
+            accepted = True  # Diventa False se un campione viene scartato
+            if len(self._items) >= self.maxsize:  # Coda piena
+                self.dropped += 1  # Conta il campione perso
+                accepted = False
+                if self.drop_policy == DROP_NEWEST:  # Scarta il campione appena arrivato
+                    return accepted
+                self._items.popleft()  # Scarta il campione più vecchio
+            self._items.append(item)  # Accoda il nuovo elemento
+            self.enqueued += 1  # Aggiorna il contatore
+            self._cond.notify()  # Sveglia il consumatore in attesa
+            return accepted
+
+    def get(self, timeout=None):
+        """Estrae il prossimo elemento; ritorna None allo scadere del timeout o a coda chiusa"""
+        with self._cond:  # Accesso esclusivo alla coda
+            if not self._items and not self._closed:  # Nessun elemento disponibile
+                self._cond.wait(timeout)  # Attende un nuovo elemento senza consumare CPU
+            if self._items:  # Se è arrivato qualcosa
+                return self._items.popleft()  # Ritorna l'elemento più vecchio
+            return None  # Timeout scaduto o coda chiusa
+
+    def get_all(self):
+        """Estrae in un colpo solo tutti gli elementi in coda"""
+        with self._cond:  # Accesso esclusivo alla coda
+            items = list(self._items)  # Copia gli elementi in attesa
+            self._items.clear()  # Svuota la coda
+            return items
+
+    def close(self):
+        """Segnala che non arriveranno altri elementi"""
+        with self._cond:  # Accesso esclusivo alla coda
+            self._closed = True  # Segna la coda come chiusa
+            self._cond.notify_all()  # Sveglia tutti i consumatori
+
+    @property
+    def closed(self):
+        """True se la coda è chiusa ed è stata svuotata"""
+        with self._cond:  # Accesso esclusivo alla coda
+            return self._closed and not self._items
+
+    def __len__(self):
+        return len(self._items)  # Numero di elementi attualmente in coda
+
+
+# Limitatore della frequenza di pubblicazione
+class RateLimiter:
+    """Distanzia le operazioni in modo da non superare 'rate' operazioni al secondo"""
+
+    def __init__(self, rate=PUBLISH_RATE):
+        self.interval = 1.0 / rate if rate else 0.0  # Intervallo minimo tra due operazioni
+        self._next = 0.0  # Istante (monotono) della prossima operazione consentita
+
+    def reserve(self):
+        """Prenota la prossima operazione e ritorna i secondi da attendere prima di eseguirla"""
+        if not self.interval:  # Nessun limite configurato
+            return 0.0
+        now = time.monotonic()  # Istante attuale
+        start = max(now, self._next)  # Istante in cui l'operazione è consentita
+        self._next = start + self.interval  # Calcola il prossimo istante consentito
+        return start - now  # Tempo rimanente (0 se l'operazione è già consentita)
+
+    def wait(self):
+        """Attende, se necessario, fino alla prossima operazione consentita"""
+        delay = self.reserve()  # Tempo da attendere
+        if delay > 0:  # Troppo presto rispetto all'ultima operazione
+            time.sleep(delay)
+
+
+# Thread che svuota continuamente la porta seriale nella coda
+class ReaderThread(threading.Thread):
+    """Thread lettore: accoda (istante di arrivo, linea) per ogni linea letta,
+    oppure (istante di arrivo, SensorReading) se readings=True"""
+
+    def __init__(self, reader, sample_queue, readings=False):
+        super().__init__(daemon=True)  # Thread demone: non blocca l'uscita del programma
+        self.reader = reader  # Lettore di linee (SerialLineReader) o di frame (SerialFrameReader)
+        self.queue = sample_queue  # Coda in cui accodare le linee
+        self.readings = readings  # True per accodare le letture già decodificate
+        self.error = None  # Eventuale eccezione che ha terminato il thread
+
+    def run(self):
+        try:
+            source = self.reader.timed_readings() if self.readings else self.reader.timed_lines()  # Letture o linee
+            for item in source:  # Legge i dati appena arrivano
+                self.queue.put(item)  # Le accoda senza attendere il consumatore
+        except Exception as e:  # Errore di lettura (es. porta chiusa)
+            self.error = e  # Lo memorizza per il thread principale
+        finally:
+            self.queue.close()  # Segnala al consumatore che non arriveranno altri dati
+
+    def stop(self):
+        """Ferma il lettore e attende la fine del thread"""
+        self.reader.stop()  # Il lettore termina entro il timeout di lettura
+        self.join()  # Attende la fine del thread
+
+
+# Funzione che consuma la coda applicando il limite di frequenza
+def consume(sample_queue, handler, rate_limiter=None, poll_timeout=0.5, on_idle=None):
+    """Passa ogni elemento della coda a 'handler' finché la coda non viene chiusa;
+    'on_idle' (se indicata) viene chiamata quando non arrivano dati per poll_timeout secondi"""
+    while not sample_queue.closed:  # Continua finché il produttore è attivo o ci sono dati
+        item = sample_queue.get(poll_timeout)  # Attende il prossimo elemento
+        if item is None:  # Timeout: nessun dato
+            if on_idle:  # Lavoro periodico (es. invio dei lotti scaduti)
+                on_idle()
+            continue
+        if rate_limiter:  # Se è configurato un limite di frequenza
+            rate_limiter.wait()  # Attende lo slot di pubblicazione
+        handler(item)  # Passa l'elemento allo stadio di pubblicazione
@@ -17,22 +17,28 @@
 #########################################################################################
 
 # Importa le librerie necessarie
-import serial # Importa la libreria serial per la comunicazione seriale
-import time # Importa la libreria time per gestire la temporizzazione delle operazioni e introdurre ritardi
+from serial_reader import open_serial, SerialLineReader # Importa il lettore di linee condiviso (letture bloccanti con timeout)
 
 # Configurazione della porta seriale
-ser = serial.Serial('COM5', 9600)  # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_COM_PORT = 'COM5' # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_DATARATE = 9600 # Velocità della porta
 
-# Leggi i dati dalla seriale
-try:
-    while True:
-        if ser.in_waiting > 0:
-            # Leggi la linea dalla seriale
-            line = ser.readline().decode('utf-8').rstrip() # Rimuovi i caratteri di newline e carriage return
+
+# Funzione principale
+def main(serial_port=SERIAL_COM_PORT, datarate=SERIAL_DATARATE):
+    ser = open_serial(serial_port, datarate)  # Apre la porta seriale
+    reader = SerialLineReader(ser) # Crea il lettore che restituisce le linee complete
+
+    # Leggi i dati dalla seriale
+    try:
+        for line in reader.lines(): # Attende (senza consumare CPU) ogni nuova linea dalla seriale
             print(f"Temperatura: {line} C") # Stampa la temperatura
-            
-            time.sleep(1) # Ritardo di 1 secondo
-except KeyboardInterrupt:
-    print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
-finally:
-    ser.close() # Chiudi la porta seriale
\ No newline at end of file
+    except KeyboardInterrupt:
+        print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
+    finally:
+        ser.close() # Chiudi la porta seriale
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
@@ -17,12 +17,13 @@
 #########################################################################################
 
 # Importa le librerie necessarie
-import serial # Importa la libreria serial per la comunicazione seriale
+from serial_reader import open_serial, SerialLineReader # Importa il lettore di linee condiviso (letture bloccanti con timeout)
 import time # Importa la libreria time per gestire la temporizzazione delle operazioni e introdurre ritardi
 import paho.mqtt.client as mqtt # Importa la libreria paho-mqtt per la comunicazione MQTT
 
 # Configurazione della porta seriale
-ser = serial.Serial('COM7', 9600)  # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_COM_PORT = 'COM7' # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_DATARATE = 9600 # Velocità della porta
 
 # Configurazione MQTT
 broker = "localhost" # Indirizzo del broker MQTT
@@ -35,32 +36,39 @@ topic = "letture" # Topic MQTT in cui inviare i dati
 def on_connect(client, userdata, flags, rc):
     print("Connesso con codice risultato: " + str(rc)) # Stampa il codice di connessione
 
-# Inizializza il client MQTT
-client = mqtt.Client() # Crea un'istanza del client MQTT
-client.username_pw_set(username, password) # Imposta username e password
-client.on_connect = on_connect # Imposta la funzione di callback per la connessione
+# Funzione principale
+def main(serial_port=SERIAL_COM_PORT, datarate=SERIAL_DATARATE):
+    ser = open_serial(serial_port, datarate)  # Apre la porta seriale
+    reader = SerialLineReader(ser) # Crea il lettore che restituisce le linee complete
 
-# Connessione al broker MQTT
-client.connect(broker, port, 60) # Connessione al broker MQTT
-client.loop_start() # Avvia il loop del client MQTT
+    # Inizializza il client MQTT
+    client = mqtt.Client() # Crea un'istanza del client MQTT
+    client.username_pw_set(username, password) # Imposta username e password
+    client.on_connect = on_connect # Imposta la funzione di callback per la connessione
 
-# Leggi i dati dalla seriale e inviali al broker MQTT
-try:
-    while True:
-        if ser.in_waiting > 0:
-            # Leggi la linea dalla seriale
-            line = ser.readline().decode('utf-8').rstrip() # Rimuovi i caratteri di newline e carriage return
+    # Connessione al broker MQTT
+    client.connect(broker, port, 60) # Connessione al broker MQTT
+    client.loop_start() # Avvia il loop del client MQTT
+
+    # Leggi i dati dalla seriale e inviali al broker MQTT
+    try:
+        for line in reader.lines(): # Attende (senza consumare CPU) ogni nuova linea già decodificata dalla seriale
             print(line) # Stampa la linea letta
-            
+
             # Pubblica il messaggio MQTT
             client.publish(topic, line) # Invia la temperatura al topic 'temperature'
-            
+
             #TODO: Creare un altro topic dove pubblicare dati, per esempio il valore di umidità relativa
-            
+
             #time.sleep(1) # Ritardo di 1 secondo
-except KeyboardInterrupt:
-    print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
-finally:
-    ser.close() # Chiudi la porta seriale
-    client.loop_stop() # Ferma il loop del client MQTT
-    client.disconnect() # Disconnetti il client MQTT
\ No newline at end of file
+    except KeyboardInterrupt:
+        print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
+    finally:
+        ser.close() # Chiudi la porta seriale
+        client.loop_stop() # Ferma il loop del client MQTT
+        client.disconnect() # Disconnetti il client MQTT
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
@@ -8,6 +8,12 @@
 # Questo script legge i dati dalla porta seriale e li invia al broker MQTT              #
 # tramite il protocollo MQTT. I messaggi MQTT contengono le singole letture             #
 # dal sensore di temperatura collegato alla porta seriale.                              #
+# Se la chiave DEADBAND di 'parameters.json' elenca dei campi (il default è {}), ogni   #
+# valore viene ripubblicato solo quando cambia più della sua banda morta o allo         #
+# scadere di DEADBAND_HEARTBEAT (deadband.py); alla chiusura viene stampato il numero   #
+# di messaggi soppressi.                                                                #
+# I messaggi passano da logging (logging_setup.py): le linee lette sono a livello DEBUG #
+# (LOG_LEVEL) e limitate a LOG_RATE al secondo, scritte da un thread separato.          #
 #                                                                                       #
 # Per eseguire questo script, è necessario installare la libreria paho-mqtt e pyserial. #
 # Puoi installare le libreria eseguendo il seguente comando:                            #
@@ -17,12 +23,23 @@
 #########################################################################################
 
 # Importa le librerie necessarie
-import serial # Importa la libreria serial per la comunicazione seriale
-import time # Importa la libreria time per gestire la temporizzazione delle operazioni e introdurre ritardi
+import logging # Importa la libreria logging per i messaggi
+from serial_reader import open_port, SerialLineReader # Importa il lettore di linee condiviso e la porta che si riapre da sola
+from sensor_parser import parse_line, complete_raw # Importa il parser a passaggio singolo delle linee del sensore
+import pipeline # Importa la pipeline con thread lettore, coda limitata e limitatore di frequenza
+from deadband import build_deadband # Importa il filtro a banda morta
+from logging_setup import setup_logging_from # Importa la configurazione del logging (coda e limite di frequenza)
+from config import load_config, ConfigError, PARAMETERS_FILE # Importa la lettura controllata dei parametri
 import paho.mqtt.client as mqtt # Importa la libreria paho-mqtt per la comunicazione MQTT
 
 # Configurazione della porta seriale
-ser = serial.Serial('COM11', 9600)  # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_COM_PORT = 'COM11' # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_DATARATE = 9600 # Velocità della porta
+
+# Configurazione della pipeline lettura -> pubblicazione
+QUEUE_SIZE = 1000 # Numero massimo di campioni in attesa di pubblicazione
+DROP_POLICY = pipeline.DROP_OLDEST # A coda piena scarta il campione più vecchio (oppure pipeline.DROP_NEWEST)
+PUBLISH_RATE = 0 # Campioni pubblicati al secondo (0 = nessun limite)
 
 # Configurazione MQTT
 broker = "localhost" # Indirizzo del broker MQTT
@@ -35,58 +52,89 @@ topic_humidity = "Humidity" # Topic MQTT in cui inviare i dati
 topic_idc_C = "IdC_C" # Topic MQTT in cui inviare i dati
 topic_idc_F = "IdC_F" # Topic MQTT in cui inviare i dati
 
+log = logging.getLogger(__name__) # Logger dello script
+
+
+# Funzione che legge filtro a banda morta e logging da 'parameters.json'
+def read_parameters(file_path=PARAMETERS_FILE):
+    """Ritorna i parametri, oppure un dizionario vuoto se il file manca o non è valido (si pubblica tutto)"""
+    try:
+        return load_config(file_path) # Legge e controlla il file una sola volta
+    except ConfigError as e: # File assente o non valido
+        log.warning("Parametri ignorati: %s", e)
+        return {}
+
 # Funzione callback per la connessione
 def on_connect(client, userdata, flags, rc):
-    print("Connesso con codice risultato: " + str(rc)) # Stampa il codice di connessione
-
-# Inizializza il client MQTT
-client = mqtt.Client() # Crea un'istanza del client MQTT
-client.username_pw_set(username, password) # Imposta username e password
-client.on_connect = on_connect # Imposta la funzione di callback per la connessione
-
-# Connessione al broker MQTT
-client.connect(broker, port, 60) # Connessione al broker MQTT
-client.loop_start() # Avvia il loop del client MQTT
-
-# Leggi i dati dalla seriale e inviali al broker MQTT
-try:
-    while True:
-        if ser.in_waiting > 0:
-            # Leggi la linea dalla seriale
-            line = ser.readline().decode('utf-8').rstrip() # Rimuovi i caratteri di newline e carriage return
-            print(line) # Stampa la linea letta
-            
-            line_humidity = line.split(", ")[0].split(" ")[1].split("%")[0]
-            print(f"Umidità: {line_humidity} %") # Stampa l'umidità
-
-            # Controllo della stringa per mandare solo il dato di temperatura in gradi celsius
-            # Dalla stringa ricevuta, estrai la parte della temperatura (primo slit)
-            # da cui estraggo solo la parte in gradi celsius eliminando (secondo split)
-            # il simbolo °C (terzo split)
-            line_temperature_celsius = line.split(", ")[1].split(" ")[2].split("°")[0]
-            print(f"Temperatura: {line_temperature_celsius} C") # Stampa la temperatura
-            
-            # Creazione di altri messaggi per pubblicare i dati sugli altri topic
-            line_temperature_fahrenheit = line.split(", ")[1].split(" ")[3].split("°")[0]
-            print(f"Temperatura: {line_temperature_fahrenheit} F") # Stampa la temperatura
-
-            line_idc_celsius = line.split(", ")[2].split(" ")[2].split("°")[0]
-            print(f"IdC: {line_idc_celsius} C")
-
-            line_idc_fahrenheit = line.split(", ")[2].split(" ")[3].split("°")[0]
-            print(f"IdC: {line_idc_fahrenheit} F")
-            
-            # Pubblica il messaggio MQTT
-            client.publish(topic_temp_C, line_temperature_celsius) # Invia la temperatura al topic 'temperature_C'
-            client.publish(topic_temp_F, line_temperature_fahrenheit) # Invia la temperatura al topic 'temperature_F'
-            client.publish(topic_humidity, line_humidity) # Invia l'umidità al topic 'humidity'
-            client.publish(topic_idc_C, line_idc_celsius) # Invia l'umidità al topic 'idc_C'
-            client.publish(topic_idc_F, line_idc_fahrenheit) # Invia l'umidità al topic 'idc_F'
-                        
-            time.sleep(1) # Ritardo di 1 secondo
-except KeyboardInterrupt:
-    print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
-finally:
-    ser.close() # Chiudi la porta seriale
-    client.loop_stop() # Ferma il loop del client MQTT
-    client.disconnect() # Disconnetti il client MQTT
\ No newline at end of file
+    log.info("Connesso con codice risultato: %s", rc) # Registra il codice di connessione
+
+# Funzione che estrae i valori da una linea della coda e li pubblica sui topic MQTT
+def publish_line(item, reader, client, deadband):
+    arrival, line = item # Istante di arrivo e linea letta dalla seriale
+    log.debug("Linea: %s", line) # Linea letta (formattata solo se il livello è DEBUG)
+    
+    reading = parse_line(line) # Estrae tutti i valori con un solo passaggio sulla linea
+    if reading is None: # La linea non contiene una lettura completa
+        reader.reject(line) # La conta per tipo (errore del sensore, linea corrotta, ...)
+        return
+    reading, = complete_raw([reading]) # °F e indice di calore calcolati sul PC se il dispositivo invia solo umidità e °C
+    log.debug("Umidità: %s %%, Temperatura: %s C %s F, IdC: %s C %s F", *reading) # Un solo messaggio per campione
+    
+    # Pubblica il messaggio MQTT (solo i valori cambiati, se il filtro è attivo)
+    publish_value(client, deadband, topic_temp_C, 'temp_c', reading.temp_c) # Invia la temperatura al topic 'temperature_C'
+    publish_value(client, deadband, topic_temp_F, 'temp_f', reading.temp_f) # Invia la temperatura al topic 'temperature_F'
+    publish_value(client, deadband, topic_humidity, 'humidity', reading.humidity) # Invia l'umidità al topic 'humidity'
+    publish_value(client, deadband, topic_idc_C, 'idc_c', reading.idc_c) # Invia l'umidità al topic 'idc_C'
+    publish_value(client, deadband, topic_idc_F, 'idc_f', reading.idc_f) # Invia l'umidità al topic 'idc_F'
+
+
+# Funzione che pubblica un valore se il filtro a banda morta lo lascia passare
+def publish_value(client, deadband, topic, field, value):
+    if deadband is None or deadband.accept(topic, field, value):
+        client.publish(topic, value)
+
+
+# Funzione principale
+def main(serial_port=SERIAL_COM_PORT, datarate=SERIAL_DATARATE):
+    # Filtro a banda morta e logging da 'parameters.json' (se il file manca o DEADBAND è vuoto, si pubblica tutto)
+    params = read_parameters()
+    deadband = build_deadband(params) # Crea il filtro dalle chiavi DEADBAND e DEADBAND_HEARTBEAT
+    setup_logging_from(params) # Messaggi scritti da un thread separato; le letture sono a livello DEBUG (LOG_LEVEL)
+
+    ser = open_port(serial_port, datarate)  # Porta seriale riaperta se il cavo viene scollegato
+    reader = SerialLineReader(ser) # Crea il lettore che restituisce le linee complete
+
+    # Inizializza il client MQTT
+    client = mqtt.Client() # Crea un'istanza del client MQTT
+    client.username_pw_set(username, password) # Imposta username e password
+    client.on_connect = on_connect # Imposta la funzione di callback per la connessione
+
+    # Connessione al broker MQTT
+    client.connect(broker, port, 60) # Connessione al broker MQTT
+    client.loop_start() # Avvia il loop del client MQTT
+
+    # Leggi i dati dalla seriale e inviali al broker MQTT
+    sample_queue = pipeline.SampleQueue(QUEUE_SIZE, DROP_POLICY) # Coda limitata tra lettura e pubblicazione
+    reader_thread = pipeline.ReaderThread(reader, sample_queue) # Thread che svuota continuamente la seriale nella coda
+    reader_thread.start() # Avvia la lettura
+    try:
+        pipeline.consume(sample_queue, lambda item: publish_line(item, reader, client, deadband),
+                         pipeline.RateLimiter(PUBLISH_RATE)) # Pubblica i campioni alla frequenza configurata
+        if reader_thread.error: # Il lettore si è fermato per un errore
+            raise reader_thread.error # Propaga l'errore
+    except KeyboardInterrupt:
+        log.info("Interruzione manuale") # Messaggio di interruzione manuale
+    finally:
+        reader_thread.stop() # Ferma il thread lettore
+        log.info("Campioni scartati per coda piena: %d", sample_queue.dropped) # Riepilogo dei campioni persi
+        log.info("Linee scartate: %s", reader.line_errors) # Riepilogo delle linee senza lettura
+        if deadband:
+            log.info(deadband.stats()) # Riepilogo dei messaggi soppressi dal filtro
+        ser.close() # Chiudi la porta seriale
+        client.loop_stop() # Ferma il loop del client MQTT
+        client.disconnect() # Disconnetti il client MQTT
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
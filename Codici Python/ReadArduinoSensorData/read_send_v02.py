@@ -10,8 +10,17 @@
 # Questo script legge i dati dalla porta seriale e li invia al broker MQTT                #
 # tramite il protocollo MQTT. I messaggi MQTT contengono le singole letture               #
 # dal sensore di temperatura collegato alla porta seriale.                                #
-# Per leggere i singoli valori delle variabili, il programma utilizza le                  #
-# espressioni regolari.                                                                   #
+# Per leggere i singoli valori delle variabili, il programma utilizza il parser          #
+# condiviso di sensor_parser.py (un solo passaggio sulla linea).                          #
+# Con AGGREGATE_WINDOWS le letture passano anche da uno stadio di aggregazione            #
+# (aggregation.py) che pubblica media, minimo, massimo e percentili di ogni finestra      #
+# su <TOPIC_PREFIX>/summary/<nome>; con PUBLISH_RAW false si pubblicano solo i riepiloghi.#
+# I messaggi passano da logging (logging_setup.py): ogni lettura è registrata a livello  #
+# DEBUG e limitata a LOG_RATE messaggi al secondo, la scrittura avviene in un thread a sé.#
+# Con PUBLISH_QOS 1 i messaggi sono seguiti fino alla conferma del broker (delivery.py): #
+# al più INFLIGHT_WINDOW in volo, ritrasmessi da paho alla riconnessione (ACK_RETRIES    #
+# volte) e persi dopo ACK_TIMEOUT secondi senza conferma a client connesso; alla         #
+# chiusura viene stampato il riepilogo di conferme e ritrasmissioni.                     #
 #                                                                                         #
 # Per eseguire questo script, è necessario installare la libreria paho-mqtt e pyserial.   #
 # Puoi installare le libreria eseguendo il seguente comando:                              #
@@ -22,77 +31,116 @@
 
 
 # Importa le librerie necessarie
-import re  # Importa la libreria re per utilizzare le espressioni regolari
-import json # Importa la libreria per leggere i file json
-import time  # Importa la libreria time per gestire i ritardi
-import serial  # Importa la libreria serial per la comunicazione seriale
+import time # Importa la libreria time per i timestamp delle finestre
+import logging # Importa la libreria logging per i messaggi
+from serial_reader import open_port, open_reader  # Importa il lettore di linee condiviso e la porta che si riapre da sola
+from capture import CaptureWriter, ReplaySerial  # Importa la registrazione e la riproduzione dei byte della seriale
+from sensor_parser import parse_line  # Importa il parser a passaggio singolo delle linee del sensore
+from binary_protocol import FORMAT_TEXT  # Importa il formato di default della seriale
+import mqtt_publisher  # Importa il modulo di pubblicazione (valori singoli, JSON, binario, lotti)
+import delivery  # Importa la consegna QoS 1 con finestra di messaggi in volo
+import pipeline  # Importa la pipeline con thread lettore, coda limitata e limitatore di frequenza
+import aggregation  # Importa le statistiche su finestre (tumbling e sliding)
+from deadband import build_deadband  # Importa il filtro a banda morta
+from logging_setup import setup_logging_from  # Importa la configurazione del logging (coda e limite di frequenza)
+from config import load_config, ConfigError, PARAMETERS_FILE  # Importa la lettura controllata dei parametri
 import paho.mqtt.client as mqtt  # Importa la libreria paho-mqtt per la comunicazione MQTT
 
 
 # Variabili globali
-parameters_file = "parameters.json" # File JSON contenente i parametri
+parameters_file = PARAMETERS_FILE # File JSON contenente i parametri
+log = logging.getLogger(__name__) # Logger dello script
 
 
 # Funzione che legge i parametri dal file JSON
 def read_parameters(file_path):
     # Variabili globali in cui verranno salvati i valori letti dalla porta seriale
     global broker, port, username, password, SERIAL_COM_PORT, SERIAL_DATARATE
+    global QUEUE_SIZE, DROP_POLICY, PUBLISH_RATE, SERIAL_FORMAT, SERIAL_RECONNECT, SERIAL_VID, SERIAL_PID
+    global CAPTURE_FILE, REPLAY_FILE, REPLAY_SPEED
+    global PUBLISH_MODE, TOPIC_PREFIX, BATCH_SIZE, BATCH_INTERVAL, PUBLISH_FIELD_TOPICS
+    global AGGREGATE_WINDOWS, AGGREGATE_QUANTILES, PUBLISH_RAW, DEADBAND
+    global PUBLISH_QOS, INFLIGHT_WINDOW, ACK_TIMEOUT, ACK_RETRIES
     try:
-        # Carica i dati dal file JSON
-        with open(file_path, 'r') as file: # Apre il file in modalità lettura
-            params = json.load(file) # Carica i dati dal file JSON
-        
-        # Assegna i valori alle variabili globali
-        broker = params['broker'] # Indirizzo del broker MQTT
-        port = params['port'] # Porta del broker MQTT
-        username = params['username'] # Inserisci il tuo username di shiftr.io
-        password = params['password'] # Inserisci la tua password di shiftr.io
-        SERIAL_COM_PORT = params['SERIAL_COM_PORT'] # Porta seriale da cui leggere i dati (sostituisci 'COM3' con la porta corretta)
-        SERIAL_DATARATE = params['SERIAL_DATARATE'] # Valore del datarate da usare per leggere dalla seriale.
-    except FileNotFoundError: # Gestisce l'eccezione se il file non esiste
-        print("Il file JSON non esiste.") # Stampa un messaggio di errore se il file non esiste
-    except json.JSONDecodeError as e: # Gestisce l'eccezione se c'è un errore nel parsing del file JSON
-        print(f"Errore nel parsing del file JSON: {e}") # Stampa un messaggio di errore se c'è un errore nel parsing del file JSON
+        params = load_config(file_path) # Legge il file JSON e controlla tutti i parametri una sola volta
+    except ConfigError as e: # File assente, JSON non valido o parametri non ammessi
+        log.error("Parametri non validi: %s", e) # Tutti gli errori in un solo messaggio
+        raise
+
+    # Assegna i valori alle variabili globali
+    broker = params['broker'] # Indirizzo del broker MQTT
+    port = params['port'] # Porta del broker MQTT
+    username = params['username'] # Inserisci il tuo username di shiftr.io
+    password = params['password'] # Inserisci la tua password di shiftr.io
+    SERIAL_COM_PORT = params['SERIAL_COM_PORT'] # Porta seriale da cui leggere i dati (sostituisci 'COM3' con la porta corretta)
+    SERIAL_DATARATE = params['SERIAL_DATARATE'] # Valore del datarate da usare per leggere dalla seriale.
+    SERIAL_FORMAT = params.get('SERIAL_FORMAT', FORMAT_TEXT) # Formato dei dati sulla seriale ("text", "binary" o "auto")
+    SERIAL_RECONNECT = params.get('SERIAL_RECONNECT', True) # Riapre la porta se il cavo USB viene scollegato
+    SERIAL_VID = params.get('SERIAL_VID') # VID USB della scheda (es. "0x2341") per ritrovarla se cambia nome
+    SERIAL_PID = params.get('SERIAL_PID') # PID USB della scheda (es. "0x0043")
+    CAPTURE_FILE = params.get('CAPTURE_FILE', "") # File in cui registrare i byte ricevuti ("" = nessuna registrazione)
+    REPLAY_FILE = params.get('REPLAY_FILE', "") # Registrazione da riprodurre al posto della porta ("" = porta seriale)
+    REPLAY_SPEED = params.get('REPLAY_SPEED', 1) # Velocità di riproduzione (1 = tempo reale, N = N volte, 0 = massima)
+    QUEUE_SIZE = params.get('QUEUE_SIZE', pipeline.QUEUE_SIZE) # Numero massimo di campioni in attesa di pubblicazione
+    DROP_POLICY = params.get('DROP_POLICY', pipeline.DROP_OLDEST) # Campione da scartare a coda piena ("drop-oldest" o "drop-newest")
+    PUBLISH_RATE = params.get('PUBLISH_RATE', pipeline.PUBLISH_RATE) # Campioni pubblicati al secondo (0 = nessun limite)
+    PUBLISH_MODE = params.get('PUBLISH_MODE', mqtt_publisher.MODE_FIELDS) # "fields" (un topic per valore), "json" o "packed" (un messaggio per campione)
+    TOPIC_PREFIX = params.get('TOPIC_PREFIX', mqtt_publisher.TOPIC_PREFIX) # Prefisso dei topic <prefisso>/sample e <prefisso>/batch
+    BATCH_SIZE = params.get('BATCH_SIZE', mqtt_publisher.BATCH_SIZE) # Campioni raggruppati in un unico messaggio
+    BATCH_INTERVAL = params.get('BATCH_INTERVAL', mqtt_publisher.BATCH_INTERVAL) # Secondi massimi prima di inviare un lotto incompleto
+    PUBLISH_FIELD_TOPICS = params.get('PUBLISH_FIELD_TOPICS', False) # Pubblica anche sui topic storici Humidity, Temperature, IdC
+    AGGREGATE_WINDOWS = params.get('AGGREGATE_WINDOWS', []) # Finestre di aggregazione (vuoto = nessun riepilogo)
+    AGGREGATE_QUANTILES = params.get('AGGREGATE_QUANTILES', list(aggregation.QUANTILES)) # Percentili dei riepiloghi
+    PUBLISH_RAW = params.get('PUBLISH_RAW', True) # Pubblica anche ogni singola lettura
+    DEADBAND = build_deadband(params) # Filtro a banda morta (None se DEADBAND manca o è vuoto)
+    PUBLISH_QOS = params.get('PUBLISH_QOS', 0) # 0 = nessuna conferma, 1 = conferma del broker per ogni messaggio
+    INFLIGHT_WINDOW = params.get('INFLIGHT_WINDOW', delivery.WINDOW) # Messaggi in attesa di conferma al massimo
+    ACK_TIMEOUT = params.get('ACK_TIMEOUT', delivery.ACK_TIMEOUT) # Secondi senza conferma (a client connesso) prima di considerare perso un messaggio
+    ACK_RETRIES = params.get('ACK_RETRIES', delivery.MAX_RETRIES) # Ritrasmissioni alla riconnessione prima di considerare perso un messaggio
+    setup_logging_from(params) # Livello, limite di frequenza ed eventuale file dei messaggi
 
 
 # Funzione callback per la connessione
 def on_connect(client, userdata, flags, rc): # Funzione di callback per la connessione
-    print("Connesso con codice risultato: " + str(rc)) # Stampa il codice di connessione
+    log.info("Connesso con codice risultato: %s", rc) # Registra il codice di connessione
 
 
 # Funzione per estrarre i valori dalla stringa
 def parse_sensor_data(data_string):
+    return reading_to_dict(parse_line(data_string))  # Estrae tutti i valori con un solo passaggio sulla linea
+
+
+# Funzione che converte una lettura (da testo o da frame binario) nel dizionario da pubblicare
+def reading_to_dict(reading):
     # Dizionario per i dati estratti
     data_dict = {} # Dizionario vuoto per i dati estratti
 
-    # Pattern regex per individuare i valori
-    humidity_pattern = r"Humidity:\s*([\d.]+)%"  # Pattern per l'umidità
-    temperature_pattern = r"Temperature:\s*([\d.]+)°C"  # Pattern per la temperatura
-    heat_index_pattern = r"IdC:\s*([\d.]+)°C"  # Pattern per l'indice di calore
+    if reading: # Se è presente una lettura completa
+        data_dict["Humidity"] = reading.humidity  # Aggiungi l'umidità al dizionario
+        data_dict["Temperature"] = reading.temp_c  # Aggiungi la temperatura al dizionario
+        data_dict["IdC"] = reading.idc_c  # Aggiungi l'indice di calore al dizionario
 
-    # Cerca i valori con regex
-    humidity_match = re.search(humidity_pattern, data_string)  # Trova il valore dell'umidità
-    temperature_match = re.search(temperature_pattern, data_string)  # Trova il valore della temperatura
-    heat_index_match = re.search(heat_index_pattern, data_string)  # Trova il valore dell'indice di calore
+    return data_dict  # Ritorna il dizionario con i dati estratti
 
-    # Aggiungi i valori al dizionario
-    if humidity_match: # Se è stato trovato un valore di umidità
-        data_dict["Humidity"] = float(humidity_match.group(1))  # Aggiungi l'umidità al dizionario
-    if temperature_match: # Se è stato trovato un valore di temperatura
-        data_dict["Temperature"] = float(temperature_match.group(1))  # Aggiungi la temperatura al dizionario
-    if heat_index_match: # Se è stato trovato un valore di indice di calore
-        data_dict["IdC"] = float(heat_index_match.group(1))  # Aggiungi l'indice di calore al dizionario
 
-    return data_dict  # Ritorna il dizionario con i dati estratti
+# Funzione che elabora e pubblica una lettura estratta dalla coda
+def process_reading(publisher, item, aggregator=None):
+    arrival, reading = item  # Istante di arrivo e lettura decodificata (da testo o da frame binario)
+    log.debug("Ricevuto: %s", reading)  # Lettura per debug (formattata solo se il livello è DEBUG)
+    if PUBLISH_RAW:
+        publisher.publish(reading, arrival)  # Pubblica la lettura secondo la modalità configurata
+    if aggregator:  # Stadio di aggregazione: riepiloghi delle finestre chiuse
+        timestamp = time.time() - (time.monotonic() - arrival)  # Orario di arrivo della lettura
+        for window, summary in aggregator.add(timestamp, reading):
+            publisher.publish_summary(window, summary)
 
 
-# Funzione per leggere dalla porta seriale
-def read_from_serial(serial_port):
-    if serial_port.in_waiting > 0:  # Controlla se ci sono dati in attesa di essere letti
-        line = serial_port.readline().decode('utf-8').rstrip()  # Leggi una linea dalla seriale, decodifica e rimuovi gli spazi vuoti
-        print(f"Ricevuto: {line}")  # Stampa la linea letta per debug
-        return line  # Ritorna la linea letta
-    return None  # Se non ci sono dati, ritorna None
+# Funzione chiamata quando non arrivano dati: invia lotti e riepiloghi scaduti
+def publish_idle(publisher, aggregator=None):
+    publisher.flush()  # Lotti scaduti
+    if aggregator:
+        for window, summary in aggregator.poll(time.time()):  # Finestre chiuse senza nuovi campioni
+            publisher.publish_summary(window, summary)
 
 
 # Funzione principale
@@ -104,30 +152,56 @@ def main():
     client = mqtt.Client() # Crea un'istanza del client MQTT
     client.username_pw_set(username, password) # Imposta username e password
     client.on_connect = on_connect # Imposta la funzione di callback per la connessione
+    sender = client # Oggetto usato per pubblicare
+    if PUBLISH_QOS > 0: # Finestra di messaggi in volo con conferma e ritrasmissione
+        sender = delivery.ReliablePublisher(client, PUBLISH_QOS, INFLIGHT_WINDOW, ACK_TIMEOUT, ACK_RETRIES)
+
+        def on_connect_reliable(*args): # Alla (ri)connessione le scadenze delle conferme ripartono
+            on_connect(*args)
+            sender.on_connect()
+        client.on_connect = on_connect_reliable
 
     # Connessione al broker MQTT
     client.connect(broker, port, 60) # Connessione al broker MQTT
     client.loop_start() # Avvia il loop del client MQTT
 
-    ser = serial.Serial(SERIAL_COM_PORT, SERIAL_DATARATE)  # Inizializza la comunicazione seriale sulla porta COM3 a 9600 baud (sostituisci 'COM3' con la porta corretta)
+    if REPLAY_FILE:  # Riproduce una registrazione con i suoi timestamp (es. per ripopolare il broker)
+        ser = ReplaySerial(REPLAY_FILE, REPLAY_SPEED)  # La lettura termina a fine file
+    else:
+        ser = open_port(SERIAL_COM_PORT, SERIAL_DATARATE, reconnect=SERIAL_RECONNECT, vid=SERIAL_VID, pid=SERIAL_PID)  # Inizializza la comunicazione seriale (riaperta se il cavo viene scollegato)
+    reader = open_reader(ser, SERIAL_FORMAT)  # Crea il lettore adatto al formato (testo, binario o automatico)
+    if CAPTURE_FILE:
+        reader.capture = CaptureWriter(CAPTURE_FILE)  # Registra i byte ricevuti per riprodurli in seguito
+    publisher = mqtt_publisher.SamplePublisher(sender, PUBLISH_MODE, TOPIC_PREFIX, BATCH_SIZE, BATCH_INTERVAL, PUBLISH_FIELD_TOPICS,
+                                               deadband=DEADBAND)  # Stadio di pubblicazione
+    aggregator = aggregation.build_aggregator(AGGREGATE_WINDOWS, AGGREGATE_QUANTILES)  # Stadio di aggregazione (None se non configurato)
+
+    # Il thread lettore svuota la seriale nella coda, il ciclo principale pubblica
+    sample_queue = pipeline.SampleQueue(QUEUE_SIZE, DROP_POLICY)  # Coda limitata tra lettura e pubblicazione
+    reader_thread = pipeline.ReaderThread(reader, sample_queue, readings=True)  # Thread che legge e decodifica continuamente dalla seriale
+    reader_thread.start()  # Avvia la lettura
     try:
-        while True:  # Inizia un loop infinito
-            input_string = read_from_serial(ser)  # Leggi i dati dalla porta seriale
-            if input_string:  # Se è stata letta una stringa valida
-                sensor_data = parse_sensor_data(input_string)  # Estrarre i dati sensoriali dalla stringa
-                print(sensor_data)  # Stampa i dati sensoriali estratti
-
-                # Pubblica un messaggio MQTT per ogni chiave del dizionario
-                for key, value in sensor_data.items():  # Cicla sulle chiavi del dizionario
-                    client.publish(key, value)  # Pubblica il valore sul topic corrispondente alla chiave
-                    print(f"Pubblicato sul topic {key}: {value}")  # Stampa il messaggio pubblicato per debug
-
-                time.sleep(1) # Aspetta un secondo prima di leggere nuovamente
+        pipeline.consume(sample_queue, lambda item: process_reading(publisher, item, aggregator), pipeline.RateLimiter(PUBLISH_RATE),
+                         on_idle=lambda: publish_idle(publisher, aggregator))  # Pubblica i campioni alla frequenza configurata (e lotti e riepiloghi scaduti quando non arrivano dati)
+        if reader_thread.error:  # Il lettore si è fermato per un errore
+            raise reader_thread.error  # Propaga l'errore
     
     except KeyboardInterrupt: # Gestisce l'interruzione manuale (Ctrl+C)
-        print("Interruzione manuale")  # Stampa un messaggio di interruzione
+        log.info("Interruzione manuale")  # Messaggio di interruzione
     finally:
+        reader_thread.stop()  # Ferma il thread lettore
+        publisher.flush(force=True)  # Invia l'eventuale lotto incompleto
+        log.info("Campioni scartati per coda piena: %d", sample_queue.dropped)  # Riepilogo dei campioni persi
+        log.info("Campioni pubblicati: %d in %d messaggi MQTT", publisher.samples, publisher.messages)  # Riepilogo della pubblicazione
+        if DEADBAND:
+            log.info(DEADBAND.stats())  # Riepilogo dei messaggi soppressi dal filtro
         ser.close()  # Chiude la porta seriale
+        if reader.capture:
+            reader.capture.close()  # Scrive su disco gli ultimi byte registrati
+        if sender is not client:
+            sender.flush()  # Attende le ultime conferme
+            sender.close()
+            log.info(sender.stats())  # Riepilogo di conferme e ritrasmissioni
         client.loop_stop()  # Ferma il loop del client MQTT
         client.disconnect()  # Disconnetti il client MQTT
 
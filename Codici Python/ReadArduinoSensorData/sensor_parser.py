@@ -0,0 +1,132 @@
+#########################################################################################
+# sensor_parser.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Modulo condiviso per estrarre i valori dalle linee stampate dallo sketch              #
+# DHT11_CORSO_IoT.ino, nel formato:                                                     #
+# Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F                #
+#                                                                                       #
+# Le linee vengono lette con un solo passaggio: un percorso veloce divide la linea      #
+# negli spazi e converte i cinque valori; se la linea non ha la forma attesa si usa     #
+# un'unica espressione regolare precompilata. Il risultato è una tupla compatta.        #
+# Il percorso veloce controlla anche le unità ('%,', '°C', '°F,') e scarta i valori     #
+# non finiti: una linea con byte alterati finisce nel percorso di riserva o in None.    #
+# La ricerca con l'espressione regolare ritrova la lettura anche se la linea inizia     #
+# con byte spuri (es. dopo il reset di Arduino). Le linee non riconosciute possono      #
+# essere classificate con classify_line() (errori dello sketch, byte corrotti, altro):  #
+# la classificazione costa solo per le linee scartate, non per quelle valide.           #
+# Nella modalità grezza dello sketch (RAW_ONLY 1) la linea contiene solo umidità e °C:  #
+# Humidity: 45.00%,  Temperature: 23.00°C                                               #
+# i campi mancanti valgono NaN finché complete_raw() non li calcola (derived.py).       #
+#########################################################################################
+
+# Importa le librerie necessarie
+import re  # Importa la libreria re per l'espressione regolare di riserva
+from collections import namedtuple  # Importa namedtuple per il record compatto
+
+
+# Record con i cinque valori di una lettura del sensore
+SensorReading = namedtuple('SensorReading', ['humidity', 'temp_c', 'temp_f', 'idc_c', 'idc_f'])
+MISSING = float('nan')  # Valore dei campi non inviati da un dispositivo in modalità grezza
+
+# Tipi di linee scartate (vedi classify_line)
+LINE_SENSOR_ERROR = "sensor_error"  # Messaggio di errore dello sketch
+LINE_CORRUPTED = "corrupted"  # Byte non validi (rumore sulla linea, velocità sbagliata)
+LINE_UNKNOWN = "unknown"  # Testo non riconosciuto (es. linea troncata dal reset)
+LINE_OVERFLOW = "overflow"  # Byte senza fine linea oltre la lunghezza massima (vedi serial_reader.py)
+LINE_ERROR_KINDS = (LINE_SENSOR_ERROR, LINE_CORRUPTED, LINE_UNKNOWN, LINE_OVERFLOW)
+
+# Messaggi di errore stampati dallo sketch DHT11_CORSO_IoT.ino
+SENSOR_ERROR_MESSAGES = ("Lettura dal sensore DHT fallita!",)
+
+# Espressione regolare (compilata una sola volta) che estrae i cinque valori in un passaggio
+LINE_PATTERN = re.compile(
+    r"Humidity:\s*(-?[\d.]+)%,\s*"  # Umidità
+    r"Temperature:\s*(-?[\d.]+)°C\s*(-?[\d.]+)°F,\s*"  # Temperatura in °C e °F
+    r"IdC:\s*(-?[\d.]+)°C\s*(-?[\d.]+)°F"  # Indice di calore in °C e °F
+)
+RAW_PATTERN = re.compile(r"Humidity:\s*(-?[\d.]+)%,\s*Temperature:\s*(-?[\d.]+)°C\s*$")  # Linea della modalità grezza
+
+
+# Funzione che estrae i valori da una linea del sensore
+def parse_line(line):
+    """Ritorna un SensorReading, oppure None se la linea non contiene una lettura"""
+    # Percorso veloce: la linea stampata dallo sketch ha esattamente 8 parole
+    # ['Humidity:', '45.00%,', 'Temperature:', '23.00°C', '73.40°F,', 'IdC:', '22.80°C', '73.05°F']
+    tokens = line.split()  # Divide la linea negli spazi (una sola scansione)
+    if (len(tokens) == 8 and tokens[0] == 'Humidity:' and tokens[2] == 'Temperature:' and tokens[5] == 'IdC:'
+            and tokens[1].endswith('%,') and tokens[3].endswith('°C') and tokens[4].endswith('°F,')
+            and tokens[6].endswith('°C') and tokens[7].endswith('°F')):  # Forma attesa, unità comprese
+        try:
+            humidity = float(tokens[1][:-2])  # Umidità senza '%,'
+            temp_c = float(tokens[3][:-2])  # Temperatura senza '°C'
+            temp_f = float(tokens[4][:-3])  # Temperatura senza '°F,'
+            idc_c = float(tokens[6][:-2])  # Indice di calore senza '°C'
+            idc_f = float(tokens[7][:-2])  # Indice di calore senza '°F'
+            total = humidity + temp_c + temp_f + idc_c + idc_f  # NaN e infinito si propagano nella somma
+            if total - total == 0.0:  # float() accetta anche 'nan' e 'inf', che lo sketch non stampa
+                return SensorReading(humidity, temp_c, temp_f, idc_c, idc_f)
+        except ValueError:  # Un valore non è numerico: prova con l'espressione regolare
+            pass
+    elif (len(tokens) == 4 and tokens[0] == 'Humidity:' and tokens[2] == 'Temperature:'
+            and tokens[1].endswith('%,') and tokens[3].endswith('°C')):  # Linea grezza
+        try:
+            humidity, temp_c = float(tokens[1][:-2]), float(tokens[3][:-2])
+            total = humidity + temp_c
+            if total - total == 0.0:  # Entrambi i valori finiti
+                return SensorReading(humidity, temp_c, MISSING, MISSING, MISSING)
+        except ValueError:
+            pass
+    match = LINE_PATTERN.search(line)  # Percorso di riserva con l'espressione regolare
+    try:  # I gruppi contengono solo cifre e punti, ma possono non essere numeri (es. '1.2.3')
+        if match is None:  # La linea non contiene una lettura completa
+            match = RAW_PATTERN.search(line)
+            if match is None:
+                return None
+            return SensorReading(*map(float, match.groups()), MISSING, MISSING, MISSING)
+        return SensorReading(*map(float, match.groups()))  # Converte i cinque gruppi in numeri
+    except ValueError:
+        return None
+
+
+# Funzione che riconosce una lettura grezza (solo umidità e °C)
+def is_raw(reading):
+    return reading.idc_f != reading.idc_f  # NaN è l'unico valore diverso da sé stesso
+
+
+# Funzione che calcola i campi mancanti delle letture grezze
+def complete_raw(readings):
+    """Ritorna le letture con °F e indice di calore calcolati sul PC per quelle grezze"""
+    for reading in readings:
+        if is_raw(reading):
+            from derived import complete_readings  # NumPy viene importato solo se arrivano letture grezze
+            return complete_readings(readings)  # Un solo calcolo per tutte le letture
+    return readings
+
+
+# Funzione che classifica una linea scartata da parse_line()
+def classify_line(line):
+    """Ritorna LINE_SENSOR_ERROR, LINE_CORRUPTED oppure LINE_UNKNOWN"""
+    for message in SENSOR_ERROR_MESSAGES:
+        if message in line:  # Anche se preceduto da byte spuri
+            return LINE_SENSOR_ERROR
+    if '\ufffd' in line or not line.isprintable():  # Byte non UTF-8 (sostituiti in decodifica) o di controllo
+        return LINE_CORRUPTED
+    return LINE_UNKNOWN
+
+
+# Funzione che formatta una lettura come la stampa lo sketch Arduino
+def format_line(reading):
+    """Ritorna la linea testuale corrispondente a un SensorReading"""
+    return (f"Humidity: {reading.humidity:.2f}%,  "
+            f"Temperature: {reading.temp_c:.2f}°C {reading.temp_f:.2f}°F,  "
+            f"IdC: {reading.idc_c:.2f}°C {reading.idc_f:.2f}°F")
+
+
+# Funzione che formatta una lettura come la stampa lo sketch in modalità grezza
+def format_raw_line(reading):
+    """Ritorna la linea testuale con solo umidità e °C"""
+    return f"Humidity: {reading.humidity:.2f}%,  Temperature: {reading.temp_c:.2f}°C"
@@ -0,0 +1,447 @@
+#########################################################################################
+# serial_reader.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Modulo condiviso per leggere le linee inviate da Arduino sulla porta seriale.         #
+# Al posto del ciclo "if ser.in_waiting > 0" (che tiene occupato un core della CPU      #
+# anche quando Arduino non invia nulla) usa letture bloccanti con timeout:              #
+# il processo resta in attesa nel sistema operativo finché non arrivano dati.           #
+# Le linee complete vengono restituite da un generatore, insieme all'istante di         #
+# arrivo, così da poter misurare la latenza tra ricezione e consegna della linea.       #
+# Con SerialFrameReader lo stesso schema vale per i frame binari (binary_protocol.py);  #
+# open_reader() sceglie il lettore in base al formato (testo, binario o automatico).    #
+# Il lettore di linee tollera i disturbi: i byte non UTF-8 vengono sostituiti invece    #
+# di interrompere la lettura, i byte senza fine linea oltre MAX_LINE vengono scartati   #
+# (si riparte dalla linea successiva) e le linee senza lettura vengono classificate e   #
+# contate in 'line_errors' (errori dello sketch, linee corrotte, linee sconosciute).    #
+# Con ReconnectingSerial (open_port) lo scollegamento del cavo USB non termina più lo   #
+# script: la lettura ritorna vuota, la porta viene riaperta con attese crescenti        #
+# (da RECONNECT_MIN a RECONNECT_MAX secondi) e, se sono indicati VID e PID USB, viene   #
+# ritrovata anche se il sistema le assegna un nome diverso (es. COM5 -> COM7).          #
+# I lettori accettano anche una capture.ReplaySerial al posto della porta: in quel caso #
+# gli istanti di arrivo sono quelli della registrazione (clock()) e il lettore si       #
+# ferma a fine file. Con 'capture' (un capture.CaptureWriter) i byte letti vengono      #
+# registrati così come arrivano dalla porta.                                            #
+# Le letture dei dispositivi in modalità grezza (solo umidità e °C) vengono completate  #
+# con °F e indice di calore (sensor_parser.complete_raw) per ogni blocco letto: le      #
+# letture arrivate insieme sono calcolate con una sola operazione NumPy (derived.py).   #
+#                                                                                       #
+# Per usare questo modulo, è necessario installare la libreria pyserial.                #
+# pip install pyserial                                                                  #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per misurare gli istanti di arrivo dei dati
+import logging  # Importa la libreria logging per segnalare le linee scartate
+import serial  # Importa la libreria serial per la comunicazione seriale
+from sensor_parser import parse_line, classify_line, complete_raw, LINE_ERROR_KINDS, LINE_SENSOR_ERROR, LINE_OVERFLOW  # Parser delle linee di testo
+from binary_protocol import FrameDecoder, detect_format, FORMAT_TEXT, FORMAT_BINARY, FORMAT_AUTO  # Protocollo binario
+
+
+# Costanti del modulo
+READ_TIMEOUT = 0.5  # Tempo massimo (in secondi) di attesa bloccante per ogni lettura
+CHUNK_SIZE = 256  # Numero massimo di byte letti in una singola operazione
+MAX_LINE = 512  # Byte massimi di una linea: oltre, senza '\n', sono considerati spazzatura
+RECONNECT_MIN = 0.05  # Attesa (s) prima del primo tentativo di riapertura
+RECONNECT_MAX = 0.5  # Attesa massima (s) tra due tentativi (la riapertura segue di poco la ricomparsa della porta)
+
+log = logging.getLogger(__name__)  # Logger del lettore
+
+
+# Funzione che apre la porta seriale in modalità bloccante con timeout
+def open_serial(port, baudrate, timeout=READ_TIMEOUT):
+    """Apre la porta seriale con un timeout di lettura"""
+    return serial.Serial(port, baudrate, timeout=timeout)  # Con il timeout read() attende i dati senza consumare CPU
+
+
+# Funzione che converte un identificativo USB ("0x2341", "2341" o 9025) in numero
+def usb_id(value):
+    if value is None or isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+# Funzione che cerca una porta seriale per VID e PID USB
+def find_port(vid, pid, serial_number=None):
+    """Ritorna il nome della prima porta con VID/PID (e numero di serie) indicati, oppure None"""
+    from serial.tools import list_ports  # Importata solo se serve la ricerca
+    for info in list_ports.comports():
+        if info.vid == vid and info.pid == pid and (serial_number is None or info.serial_number == serial_number):
+            return info.device
+    return None
+
+
+# Porta seriale che si riapre da sola dopo una disconnessione
+class ReconnectingSerial:
+    """Stessa interfaccia di lettura di serial.Serial; senza porta read() ritorna un blocco vuoto e riprova ad aprirla"""
+
+    def __init__(self, port, baudrate, timeout=READ_TIMEOUT, vid=None, pid=None, serial_number=None):
+        self.port = port  # Nome della porta (aggiornato se ritrovata con VID/PID)
+        self.baudrate = baudrate  # Velocità della porta
+        self.timeout = timeout  # Timeout di lettura
+        self.vid, self.pid = usb_id(vid), usb_id(pid)  # Identificativi USB per ritrovare la porta (None = solo per nome)
+        self.serial_number = serial_number  # Numero di serie USB (per distinguere schede uguali)
+        self._serial = None  # Porta aperta (None = scollegata)
+        self._closed = False  # True dopo close()
+        self._delay = RECONNECT_MIN  # Attesa prima del prossimo tentativo
+        self._next_attempt = 0.0  # Istante (monotono) del prossimo tentativo
+        self._lost_at = None  # Istante in cui la porta è stata persa
+        self.disconnects = 0  # Disconnessioni rilevate
+        self.reconnects = 0  # Riaperture riuscite dopo una disconnessione (o dopo un avvio senza porta)
+        self.downtime = 0.0  # Secondi totali senza porta
+        if not self._open():
+            self._lost_at = time.monotonic()
+            log.warning("%s: porta non disponibile, nuovi tentativi in corso", self.name)
+
+    @property
+    def name(self):
+        return self.port or f"USB {self.vid:04x}:{self.pid:04x}"
+
+    @property
+    def is_open(self):
+        return self._serial is not None
+
+    def _open(self):
+        """Un tentativo di apertura; True se riuscito"""
+        port = self.port
+        if self.vid is not None and self.pid is not None:  # La scheda potrebbe avere cambiato nome
+            port = find_port(self.vid, self.pid, self.serial_number) or port
+        try:
+            if port is None:
+                raise serial.SerialException("porta USB non trovata")
+            self._serial = serial.Serial(port, self.baudrate, timeout=self.timeout)
+        except (serial.SerialException, OSError):
+            self._next_attempt = time.monotonic() + self._delay
+            self._delay = min(self._delay * 2, RECONNECT_MAX)  # Attese crescenti
+            return False
+        if port != self.port:
+            log.info("%s: porta ritrovata come %s", self.name, port)
+            self.port = port
+        if self._lost_at is not None:
+            down = time.monotonic() - self._lost_at
+            self.downtime += down
+            self.reconnects += 1
+            self._lost_at = None
+            log.info("%s: porta riaperta dopo %.2f s", self.name, down)
+        self._delay = RECONNECT_MIN
+        return True
+
+    def _lost(self, error):
+        """Chiude la porta persa e programma il primo tentativo di riapertura"""
+        log.warning("%s: porta scollegata (%s)", self.name, error)
+        try:
+            self._serial.close()
+        except (serial.SerialException, OSError):
+            pass
+        self._serial = None
+        self.disconnects += 1
+        self._lost_at = time.monotonic()
+        self._delay = RECONNECT_MIN
+        self._next_attempt = self._lost_at + self._delay
+
+    def read(self, size=1):
+        """Legge fino a 'size' byte; senza porta attende al più il timeout e ritorna un blocco vuoto"""
+        if self._serial is None:
+            if self._closed:
+                return b""
+            wait = self._next_attempt - time.monotonic()
+            if wait > 0:  # Attende il prossimo tentativo (al più un timeout, per restare interrompibile)
+                time.sleep(min(wait, self.timeout or READ_TIMEOUT))
+            else:
+                self._open()
+            return b""
+        try:
+            return self._serial.read(size)
+        except (serial.SerialException, OSError) as e:  # Cavo scollegato
+            self._lost(e)
+            return b""
+
+    @property
+    def in_waiting(self):
+        if self._serial is None:
+            return 0
+        try:
+            return self._serial.in_waiting
+        except (serial.SerialException, OSError) as e:
+            self._lost(e)
+            return 0
+
+    def write(self, data):
+        """Scrive sulla porta; senza porta solleva serial.SerialException"""
+        if self._serial is None:
+            raise serial.SerialException(f"{self.name}: porta scollegata")
+        try:
+            return self._serial.write(data)
+        except (serial.SerialException, OSError) as e:
+            self._lost(e)
+            raise
+
+    def fileno(self):
+        return self._serial.fileno()
+
+    def close(self):
+        self._closed = True
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+
+# Funzione che apre la porta, con riapertura automatica se richiesta
+def open_port(port, baudrate, timeout=READ_TIMEOUT, reconnect=True, vid=None, pid=None, serial_number=None):
+    """Ritorna un ReconnectingSerial (reconnect=True) oppure una serial.Serial semplice"""
+    if reconnect:
+        return ReconnectingSerial(port, baudrate, timeout, vid, pid, serial_number)
+    return open_serial(port, baudrate, timeout)
+
+
+# Classe che trasforma i byte ricevuti dalla seriale in linee complete
+class SerialLineReader:
+    """Generatore di linee complete lette dalla porta seriale"""
+
+    def __init__(self, serial_port, chunk_size=CHUNK_SIZE):
+        self.serial_port = serial_port  # Porta seriale già aperta (con timeout impostato)
+        self.chunk_size = chunk_size  # Numero massimo di byte da leggere per volta
+        self._buffer = bytearray()  # Buffer con i byte ricevuti ma non ancora terminati da '\n'
+        self._pending = b""  # Byte già letti (es. durante il riconoscimento del formato) da elaborare per primi
+        self._discarding = False  # True dopo un overflow: scarta i byte fino al prossimo '\n'
+        self._running = True  # Flag per interrompere il generatore dall'esterno
+        self.lines_read = 0  # Numero di linee complete consegnate
+        self.last_latency = 0.0  # Latenza (s) tra l'arrivo dell'ultima linea e la sua consegna
+        self.max_latency = 0.0  # Latenza massima osservata
+        self.parse_errors = 0  # Linee senza una lettura valida (o frame binari corrotti)
+        self.line_errors = dict.fromkeys(LINE_ERROR_KINDS, 0)  # Linee scartate per tipo
+        self.parse_timer = None  # Istogramma dei tempi di decodifica (metrics.py), None = non misurati
+        self.capture = None  # Registrazione dei byte letti (capture.CaptureWriter), None = nessuna
+        self.clock = getattr(serial_port, 'clock', time.monotonic)  # Istante di arrivo (originale per una registrazione)
+
+    def stop(self):
+        """Chiede al generatore di terminare alla prossima lettura"""
+        self._running = False  # Il ciclo di lettura termina entro READ_TIMEOUT secondi
+
+    @property
+    def active(self):
+        """Lettore che aggiorna i contatori (questo, o quello scelto da AutoFormatReader)"""
+        return self
+
+    def read_chunk(self):
+        """Legge un blocco di byte, attendendo al massimo il timeout della porta"""
+        if self._pending:  # Byte già letti in precedenza
+            data, self._pending = self._pending, b""  # Li restituisce una sola volta
+            return data
+        data = self.serial_port.read(1)  # Lettura bloccante: ritorna appena arriva un byte o allo scadere del timeout
+        if data:  # Se è arrivato almeno un byte
+            waiting = self.serial_port.in_waiting  # Byte già presenti nel buffer del sistema operativo
+            if waiting:  # Se ce ne sono altri, li legge subito senza attendere
+                data += self.serial_port.read(min(waiting, self.chunk_size))  # Legge il resto del blocco disponibile
+            if self.capture:  # Registra i byte così come sono arrivati
+                self.capture.write(data)
+        elif getattr(self.serial_port, 'finished', False):  # Registrazione riprodotta fino alla fine
+            self._running = False
+        return data  # Ritorna i byte letti (vuoto se è scaduto il timeout)
+
+    def split_lines(self, data):
+        """Aggiunge i byte ricevuti al buffer e ritorna la lista delle linee complete"""
+        if self._discarding:  # Resto di una linea troppo lunga: riparte dal prossimo fine linea
+            newline = data.find(b"\n")
+            if newline < 0:
+                return []
+            data = data[newline + 1:]
+            self._discarding = False
+        self._buffer += data  # Accoda i byte ricevuti al buffer
+        lines = []  # Linee complete contenute nel buffer
+        while True:  # Estrae tutte le linee complete presenti nel buffer
+            newline = self._buffer.find(b"\n")  # Cerca la fine della linea
+            if newline < 0:  # Nessuna linea completa
+                break  # Attende altri dati
+            raw = bytes(self._buffer[:newline])  # Byte della linea senza '\n'
+            del self._buffer[:newline + 1]  # Rimuove la linea dal buffer
+            line = raw.decode('utf-8', 'replace').rstrip()  # Decodifica (i byte non validi diventano U+FFFD) e rimuove '\r'
+            if line:  # Ignora le linee vuote
+                lines.append(line)
+        if len(self._buffer) > MAX_LINE:  # Nessun fine linea da troppo tempo: scarta e riparte dalla prossima linea
+            del self._buffer[:]
+            self._discarding = True
+            self.line_errors[LINE_OVERFLOW] += 1
+            self.parse_errors += 1
+            log.warning("%s: oltre %d byte senza fine linea, dati scartati", self.serial_port.name, MAX_LINE)
+        return lines
+
+    def reject(self, line):
+        """Conta (e registra) una linea senza lettura valida"""
+        kind = classify_line(line)
+        self.line_errors[kind] += 1
+        self.parse_errors += 1
+        if kind == LINE_SENSOR_ERROR:
+            log.warning("%s: errore dal sensore: %s", self.serial_port.name, line)
+        else:
+            log.debug("%s: linea scartata (%s): %r", self.serial_port.name, kind, line)
+
+    def decode(self, data):
+        """Ritorna le letture complete contenute nei byte ricevuti (per chi legge i byte da sé, es. asyncio)"""
+        readings = []
+        for line in self.split_lines(data):
+            reading = parse_line(line)
+            if reading is not None:
+                readings.append(reading)
+            else:
+                self.reject(line)  # Linea non riconosciuta
+        self.lines_read += len(readings)  # Aggiorna il contatore delle letture
+        return complete_raw(readings)  # Campi calcolati sul PC per le letture grezze
+
+    def timed_blocks(self, yield_idle=False):
+        """Restituisce coppie (istante di arrivo, linee complete) per ogni blocco letto"""
+        while self._running:  # Continua finché non viene chiamato stop()
+            data = self.read_chunk()  # Attende nuovi dati dalla seriale
+            if not data:  # Timeout scaduto senza dati
+                if yield_idle:  # Se richiesto, segnala l'inattività al chiamante
+                    yield None, None  # Permette al chiamante di svolgere lavoro periodico
+                continue  # Torna ad attendere
+            arrival = self.clock()  # Istante di arrivo del blocco
+            lines = self.split_lines(data)  # Linee complete contenute nel blocco
+            if lines:
+                yield arrival, lines
+
+    def timed_lines(self, yield_idle=False):
+        """Restituisce coppie (istante di arrivo, linea) per ogni linea completa"""
+        for arrival, lines in self.timed_blocks(yield_idle):
+            if lines is None:  # Inattività (solo con yield_idle)
+                yield None, None
+                continue
+            for line in lines:
+                self.lines_read += 1  # Aggiorna il contatore delle linee
+                self.last_latency = self.clock() - arrival  # Latenza tra arrivo e consegna
+                if self.last_latency > self.max_latency:  # Aggiorna la latenza massima
+                    self.max_latency = self.last_latency
+                yield arrival, line  # Consegna la linea al chiamante
+
+    def lines(self, yield_idle=False):
+        """Restituisce solo le linee complete (None durante l'inattività se yield_idle)"""
+        for _, line in self.timed_lines(yield_idle):  # Scarta l'istante di arrivo
+            yield line  # Consegna la linea al chiamante
+
+    def timed_readings(self):
+        """Restituisce coppie (istante di arrivo, SensorReading), ignorando le linee senza lettura"""
+        for arrival, lines in self.timed_blocks():  # Linee complete di ogni blocco dalla seriale
+            readings = []  # Letture del blocco, completate insieme se grezze
+            for line in lines:
+                if self.parse_timer:  # Tempo di decodifica misurato solo se richiesto
+                    start = time.perf_counter()
+                    reading = parse_line(line)
+                    self.parse_timer.observe(time.perf_counter() - start)
+                else:
+                    reading = parse_line(line)  # Estrae i valori in un solo passaggio
+                if reading is not None:  # Solo le linee con una lettura completa
+                    readings.append(reading)
+                else:
+                    self.reject(line)  # Linea non riconosciuta (es. messaggio di errore dello sketch)
+            self.lines_read += len(lines)  # Aggiorna il contatore delle linee
+            for reading in complete_raw(readings):  # Campi calcolati sul PC per le letture grezze
+                yield arrival, reading
+            self.last_latency = self.clock() - arrival  # Latenza tra arrivo e consegna dell'ultima lettura del blocco
+            if self.last_latency > self.max_latency:  # Aggiorna la latenza massima
+                self.max_latency = self.last_latency
+
+
+# Classe che decodifica i frame binari ricevuti dalla seriale
+class SerialFrameReader(SerialLineReader):
+    """Generatore di letture decodificate dai frame binari (vedi binary_protocol.py)"""
+
+    def __init__(self, serial_port, chunk_size=CHUNK_SIZE):
+        super().__init__(serial_port, chunk_size)  # Stessa gestione della porta del lettore di linee
+        self.decoder = FrameDecoder()  # Decodificatore incrementale dei frame
+
+    def decode(self, data):
+        """Ritorna le letture contenute nei byte ricevuti (per chi legge i byte da sé, es. asyncio)"""
+        readings = self.decoder.feed(data)  # Frame completi contenuti nei byte
+        self.lines_read += len(readings)  # Aggiorna il contatore delle letture
+        self.parse_errors = self.decoder.crc_errors  # Frame corrotti
+        return complete_raw(readings)  # Campi calcolati sul PC per i frame grezzi
+
+    def timed_readings(self):
+        """Restituisce coppie (istante di arrivo, SensorReading) per ogni frame valido"""
+        while self._running:  # Continua finché non viene chiamato stop()
+            data = self.read_chunk()  # Attende nuovi dati dalla seriale
+            if not data:  # Timeout scaduto senza dati
+                continue
+            arrival = self.clock()  # Istante di arrivo del blocco
+            start = time.perf_counter()
+            readings = self.decoder.feed(data)  # Frame completi contenuti nel blocco
+            if self.parse_timer and readings:  # Tempo medio di decodifica per frame, se richiesto
+                self.parse_timer.observe((time.perf_counter() - start) / len(readings))
+            self.parse_errors = self.decoder.crc_errors  # Frame corrotti
+            for reading in complete_raw(readings):  # Campi calcolati sul PC per i frame grezzi
+                self.lines_read += 1  # Aggiorna il contatore delle letture
+                yield arrival, reading
+
+
+# Classe che riconosce il formato dai primi byte ricevuti e poi delega al lettore adatto
+class AutoFormatReader(SerialLineReader):
+    """Lettore che sceglie tra testo e frame binari al primo utilizzo"""
+
+    def __init__(self, serial_port, chunk_size=CHUNK_SIZE):
+        super().__init__(serial_port, chunk_size)  # Usato per leggere i primi blocchi di byte
+        self.delegate = None  # Lettore effettivo, creato dopo il riconoscimento
+
+    def stop(self):
+        """Ferma il riconoscimento o il lettore effettivo"""
+        super().stop()  # Interrompe il riconoscimento in corso
+        if self.delegate:  # Ferma anche il lettore effettivo
+            self.delegate.stop()
+
+    def detect(self):
+        """Legge i primi byte finché il formato non è riconosciuto; ritorna il lettore effettivo"""
+        pending = b""  # Byte letti durante il riconoscimento
+        serial_format = None  # Formato non ancora noto
+        while serial_format is None and self._running:  # Finché i byte non bastano per decidere
+            pending += self.read_chunk()  # Attende altri byte
+            serial_format = detect_format(pending)
+        self.delegate = open_reader(self.serial_port, serial_format or FORMAT_TEXT)  # Lettore del formato riconosciuto
+        self.delegate._pending = pending  # I byte già letti vengono elaborati per primi
+        self.delegate.parse_timer = self.parse_timer  # Stessa misura dei tempi di decodifica
+        self.delegate.capture = self.capture  # Stessa registrazione (i byte già letti sono già registrati)
+        if not self._running:  # stop() chiamato durante il riconoscimento
+            self.delegate.stop()
+        return self.delegate
+
+    def decode(self, data):
+        """Accumula i primi byte fino al riconoscimento del formato, poi delega la decodifica"""
+        if self.delegate is None:  # Formato non ancora riconosciuto
+            self._pending += data  # Conserva i byte ricevuti
+            serial_format = detect_format(self._pending)
+            if serial_format is None:  # Servono altri byte
+                return []
+            self.delegate = open_reader(self.serial_port, serial_format)  # Lettore del formato riconosciuto
+            data, self._pending = self._pending, b""  # Decodifica tutti i byte accumulati
+        readings = self.delegate.decode(data)  # Letture decodificate dal lettore effettivo
+        self.lines_read += len(readings)  # Aggiorna il contatore delle letture
+        return readings
+
+    @property
+    def active(self):
+        """Lettore effettivo se il formato è già stato riconosciuto, altrimenti questo lettore"""
+        return self.delegate or self
+
+    def timed_blocks(self, yield_idle=False):
+        return self.detect().timed_blocks(yield_idle)  # Blocchi di linee dal lettore effettivo
+
+    def timed_lines(self, yield_idle=False):
+        return self.detect().timed_lines(yield_idle)  # Linee dal lettore effettivo
+
+    def timed_readings(self):
+        return self.detect().timed_readings()  # Letture dal lettore effettivo
+
+
+# Funzione che crea il lettore adatto al formato della seriale
+def open_reader(serial_port, serial_format=FORMAT_TEXT):
+    """Ritorna un SerialLineReader (testo), un SerialFrameReader (binario)
+    o un AutoFormatReader (riconoscimento automatico al primo utilizzo)"""
+    if serial_format == FORMAT_BINARY:
+        return SerialFrameReader(serial_port)
+    if serial_format == FORMAT_TEXT:
+        return SerialLineReader(serial_port)
+    if serial_format == FORMAT_AUTO:
+        return AutoFormatReader(serial_port)
+    raise ValueError(f"Formato della seriale non valido: {serial_format}")
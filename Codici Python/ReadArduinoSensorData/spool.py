@@ -0,0 +1,271 @@
+#########################################################################################
+# spool.py                                                                              #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Memorizzazione su disco dei messaggi MQTT quando il broker non è raggiungibile        #
+# ("store and forward"), per non perdere dati durante le interruzioni.                  #
+#                                                                                       #
+# DiskSpool è un log su disco in sola aggiunta, diviso in segmenti:                     #
+#   spool-0000000001.log, spool-0000000002.log, ...                                     #
+# ogni record è: CRC32 (4 byte) | lunghezza topic (2) | lunghezza payload (4) | dati.   #
+# Le scritture sono raggruppate e rese persistenti (fsync) al più una volta ogni        #
+# FSYNC_INTERVAL secondi; anche se non arrivano altri messaggi, flush_due() (chiamata   #
+# dal thread di svuotamento) rende persistenti i record scritti entro FSYNC_INTERVAL    #
+# secondi. Un nuovo segmento viene aperto oltre SEGMENT_SIZE byte.                      #
+# La posizione di lettura è salvata in 'spool.pos', i segmenti letti vengono cancellati.#
+#                                                                                       #
+# StoreAndForward si usa al posto del client paho: finché il broker risponde pubblica   #
+# direttamente, altrimenti scrive nel log; alla riconnessione un thread svuota il log   #
+# a lotti, nell'ordine originale, mentre i nuovi messaggi continuano ad accodarsi.      #
+# Un messaggio accettato dal client (inviato, oppure accodato da paho con QoS > 0 anche #
+# senza connessione) non viene mai scritto anche nel log: niente doppi invii. Con       #
+# delivery.ReliablePublisher(block=False) la finestra piena non blocca: il messaggio    #
+# va nel log e il thread di svuotamento attende un posto libero fuori dal lock.         #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per file, cartelle e fsync
+import time  # Importa la libreria time per l'intervallo di fsync
+import zlib  # Importa la libreria zlib per il CRC32 dei record
+import struct  # Importa la libreria struct per l'intestazione dei record
+import threading  # Importa la libreria threading per il thread di svuotamento
+from delivery import accepted, MQTT_ERR_SUCCESS, MQTT_ERR_QUEUE_SIZE  # Importa i codici di paho e la regola di accettazione
+
+
+# Valori di default
+SEGMENT_SIZE = 4 * 1024 * 1024  # Dimensione massima (byte) di un segmento
+FSYNC_INTERVAL = 1.0  # Secondi massimi tra due fsync
+DRAIN_BATCH = 500  # Messaggi ripubblicati per ogni lotto di svuotamento
+
+RECORD_HEADER = struct.Struct('<IHI')  # CRC32, lunghezza topic, lunghezza payload
+POSITION = struct.Struct('<QQ')  # Segmento e offset della posizione di lettura
+
+
+# Log su disco in sola aggiunta, diviso in segmenti
+class DiskSpool:
+    """Coda FIFO persistente di messaggi (topic, payload)"""
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory  # Cartella dei segmenti
+        self.segment_size = segment_size  # Dimensione massima di un segmento
+        self.fsync_interval = fsync_interval  # Intervallo tra due fsync
+        self._lock = threading.Lock()  # Protegge file e contatori
+        os.makedirs(directory, exist_ok=True)  # Crea la cartella se non esiste
+        self._pos_path = os.path.join(directory, 'spool.pos')  # File con la posizione di lettura
+        segments = self._segments()  # Segmenti già presenti (da un'esecuzione precedente)
+        self._write_segment = segments[-1] if segments else 1  # Segmento in scrittura
+        if segments:  # Elimina un eventuale record incompleto (interruzione durante la scrittura)
+            self._truncate_tail(self._segment_path(self._write_segment))
+        self._writer = open(self._segment_path(self._write_segment), 'ab')  # Apre in aggiunta
+        self._last_fsync = time.monotonic()  # Istante dell'ultimo fsync
+        self._unsynced = False  # True se ci sono record scritti dopo l'ultimo fsync
+        self._read_segment, self._read_offset = self._load_position(segments)  # Posizione di lettura
+        self._reader = None  # File del segmento in lettura (aperto al bisogno)
+        self._sizes = []  # Dimensioni dei record dell'ultimo read_batch()
+        self.pending = self._count_pending()  # Messaggi ancora da inviare
+        self.appended = 0  # Messaggi scritti in questa esecuzione
+        self.drained = 0  # Messaggi ripubblicati in questa esecuzione
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"spool-{number:010d}.log")
+
+    def _segments(self):
+        """Numeri dei segmenti presenti, in ordine"""
+        names = (name for name in os.listdir(self.directory) if name.startswith('spool-') and name.endswith('.log'))
+        return sorted(int(name[6:-4]) for name in names)
+
+    def _load_position(self, segments):
+        """Legge la posizione salvata (o parte dal segmento più vecchio)"""
+        try:
+            with open(self._pos_path, 'rb') as file:
+                segment, offset = POSITION.unpack(file.read(POSITION.size))
+            if segment in segments:  # Il segmento esiste ancora
+                return segment, offset
+        except (FileNotFoundError, struct.error):  # Nessuna posizione valida
+            pass
+        return (segments[0] if segments else self._write_segment), 0
+
+    def _truncate_tail(self, path):
+        """Tronca il file dopo l'ultimo record valido"""
+        with open(path, 'r+b') as file:
+            valid = sum(size for _, _, size in self._iter_records(file))
+            file.truncate(valid)
+
+    def _count_pending(self):
+        """Conta i messaggi non ancora inviati (solo all'avvio)"""
+        count = 0
+        for segment in self._segments():
+            if segment < self._read_segment:
+                continue
+            with open(self._segment_path(segment), 'rb') as file:
+                if segment == self._read_segment:
+                    file.seek(self._read_offset)
+                count += sum(1 for _ in self._iter_records(file))
+        return count
+
+    @staticmethod
+    def _iter_records(file, limit=None):
+        """Legge i record validi da un file; si ferma su record incompleti o corrotti"""
+        count = 0
+        while limit is None or count < limit:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:  # Fine del file (o record incompleto)
+                break
+            crc, topic_len, payload_len = RECORD_HEADER.unpack(header)
+            body = file.read(topic_len + payload_len)
+            if len(body) < topic_len + payload_len or zlib.crc32(body) != crc:  # Scrittura interrotta
+                break
+            count += 1
+            yield body[:topic_len].decode('utf-8'), body[topic_len:], RECORD_HEADER.size + len(body)
+
+    def append(self, topic, payload):
+        """Aggiunge un messaggio in fondo al log"""
+        if isinstance(payload, str):  # Come paho: le stringhe sono codificate in UTF-8
+            payload = payload.encode('utf-8')
+        elif not isinstance(payload, (bytes, bytearray)):  # Numeri e altri valori come testo
+            payload = str(payload).encode('utf-8')
+        topic_bytes = topic.encode('utf-8')
+        body = topic_bytes + payload
+        with self._lock:
+            self._writer.write(RECORD_HEADER.pack(zlib.crc32(body), len(topic_bytes), len(payload)) + body)
+            self.pending += 1
+            self.appended += 1
+            self._unsynced = True
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:  # fsync a lotti, non a ogni messaggio
+                self._sync(now)
+            if self._writer.tell() >= self.segment_size:  # Segmento pieno: ne apre uno nuovo
+                self._sync(now)
+                self._writer.close()
+                self._write_segment += 1
+                self._writer = open(self._segment_path(self._write_segment), 'ab')
+
+    def _sync(self, now):
+        self._writer.flush()  # Dal buffer di Python al sistema operativo
+        os.fsync(self._writer.fileno())  # Dal sistema operativo al disco
+        self._last_fsync = now
+        self._unsynced = False
+
+    def flush_due(self, now=None):
+        """Rende persistenti i record in attesa se è passato fsync_interval dall'ultimo fsync (anche senza nuovi messaggi)"""
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            if self._unsynced and now - self._last_fsync >= self.fsync_interval:
+                self._sync(now)
+
+    def read_batch(self, max_records=DRAIN_BATCH):
+        """Ritorna fino a 'max_records' messaggi (topic, payload) dalla testa, senza rimuoverli"""
+        with self._lock:
+            self._writer.flush()  # Rende leggibili i record ancora nel buffer
+            while self.pending:
+                if self._reader is None:  # Apre il segmento in lettura
+                    self._reader = open(self._segment_path(self._read_segment), 'rb')
+                self._reader.seek(self._read_offset)
+                records = list(self._iter_records(self._reader, max_records))
+                if records:
+                    self._sizes = [size for _, _, size in records]  # Dimensioni per commit()
+                    return [(topic, payload) for topic, payload, _ in records]
+                if self._read_segment >= self._write_segment:  # Nulla di leggibile: contatore disallineato
+                    self.pending = 0
+                    break
+                self._next_segment()  # Segmento esaurito: passa al successivo
+            return []
+
+    def commit(self, count):
+        """Rimuove dalla testa i primi 'count' messaggi restituiti da read_batch()"""
+        with self._lock:
+            self._read_offset += sum(self._sizes[:count])  # Avanza oltre i record inviati
+            self._sizes = []
+            self.pending -= count
+            self.drained += count
+            if (self._read_segment < self._write_segment and
+                    self._read_offset >= os.path.getsize(self._segment_path(self._read_segment))):
+                self._next_segment()  # Segmento letto completamente
+            with open(self._pos_path, 'wb') as file:  # Salva la posizione di lettura
+                file.write(POSITION.pack(self._read_segment, self._read_offset))
+
+    def _next_segment(self):
+        """Cancella il segmento in lettura e passa al successivo"""
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+        os.remove(self._segment_path(self._read_segment))
+        self._read_segment += 1
+        self._read_offset = 0
+
+    def close(self):
+        """Rende persistenti i dati e chiude i file"""
+        with self._lock:
+            self._sync(time.monotonic())
+            self._writer.close()
+            if self._reader:
+                self._reader.close()
+
+
+# Client che pubblica direttamente o, se il broker non risponde, scrive nel log su disco
+class StoreAndForward:
+    """Sostituto del client paho con memorizzazione su disco durante le interruzioni"""
+
+    def __init__(self, client, spool, drain_batch=DRAIN_BATCH):
+        self.client = client  # Client paho, broker interno o delivery.ReliablePublisher
+        self.qos = getattr(client, 'qos', None)  # QoS imposto dal client (ReliablePublisher), altrimenti quello di publish()
+        self.spool = spool  # Log su disco
+        self.drain_batch = drain_batch  # Messaggi per lotto di svuotamento
+        self._lock = threading.Lock()  # Mantiene l'ordine tra messaggi nuovi e ripubblicati
+        self._wake = threading.Event()  # Sveglia il thread di svuotamento
+        self._running = True
+        self.spooled = 0  # Messaggi finiti nel log in questa esecuzione
+        self._drainer = threading.Thread(target=self._drain_loop, daemon=True)
+        self._drainer.start()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        """Stessa firma di client.publish() di paho"""
+        with self._lock:
+            if not self.spool.pending and self.client.is_connected():  # Nessun arretrato: invio diretto
+                info = self.client.publish(topic, payload, qos, retain)  # Non blocca (ReliablePublisher con block=False)
+                if accepted(info, qos if self.qos is None else self.qos):  # Inviato o accodato da paho: non va anche nel log
+                    return info
+            self.spool.append(topic, payload)  # Broker assente o arretrato da smaltire: va in coda su disco
+            self.spooled += 1
+        self._wake.set()  # Il thread di svuotamento riproverà
+        return None
+
+    def on_connect(self, *args):
+        """Da chiamare alla (ri)connessione: avvia subito lo svuotamento"""
+        self._wake.set()
+
+    def _drain_loop(self):
+        while self._running:
+            self._wake.wait(min(1.0, self.spool.fsync_interval) or 1.0)  # Riprova comunque ogni secondo (o più spesso per l'fsync)
+            self._wake.clear()
+            self.spool.flush_due()  # Ultimi messaggi salvati su disco anche se non ne arrivano altri
+            while self._running and self.spool.pending and self.client.is_connected():
+                qos = self.qos or 0  # Il log non conserva il QoS: quello del client, altrimenti 0
+                with self._lock:  # I messaggi nuovi attendono al più un lotto (nessuna chiamata bloccante qui)
+                    batch = self.spool.read_batch(self.drain_batch)
+                    sent, rc = 0, MQTT_ERR_SUCCESS
+                    for topic, payload in batch:
+                        info = self.client.publish(topic, payload, qos)
+                        if not accepted(info, qos):
+                            rc = info.rc
+                            break  # Finestra piena o connessione persa
+                        sent += 1
+                    self.spool.commit(sent)
+                if rc == MQTT_ERR_QUEUE_SIZE and hasattr(self.client, 'wait_for_room'):
+                    self.client.wait_for_room(1.0)  # Finestra piena: attende un posto libero senza tenere il lock
+                elif sent < len(batch):
+                    break  # Connessione persa: riprova più tardi
+                time.sleep(0)  # Cede il processore agli altri thread tra un lotto e l'altro
+
+    def is_connected(self):
+        return self.client.is_connected()
+
+    def close(self):
+        """Ferma il thread di svuotamento e chiude il log"""
+        self._running = False
+        self._wake.set()
+        self._drainer.join()
+        self.spool.close()
@@ -1,13 +1,19 @@
 #########################################################################################
 # Read data from serial port and send it to MQTT broker                                 #
 # author: Pietro Boccadoro                                                              #
-# email: pieroboccadoro13[at]gmail[dot]com                                              #   
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
 # date: 2025-02-01                                                                      #
 # version: 0.1                                                                          #
 #                                                                                       #
 # Questo script legge i dati dalla porta seriale e li invia al broker MQTT              #
 # tramite il protocollo MQTT. Il messaggio MQTT contiene i valori letti                 #
 # dal sensore collegato alla porta seriale.                                             #
+# Gli stati del pulsante (sketch Touch_switch o Touch_Switch_Continous) viaggiano sul   #
+# canale a bassa latenza di events.py: rimbalzi e stati ripetuti vengono eliminati sul  #
+# PC, ogni cambiamento è pubblicato subito (QoS EVENT_QOS) da un client MQTT dedicato   #
+# e le latenze dall'arrivo sulla seriale alla pubblicazione e alla conferma del broker  #
+# vengono riassunte ogni STATS_INTERVAL secondi (e su /metrics se METRICS_PORT > 0).    #
+# Con il debounce sul PC il ritardo dello sketch (delay(100)) può essere ridotto.       #
 #                                                                                       #
 # Per eseguire questo script, è necessario installare la libreria paho-mqtt e pyserial. #
 # Puoi installare le libreria eseguendo il seguente comando:                            #
@@ -17,12 +23,17 @@
 #########################################################################################
 
 # Importa le librerie necessarie
-import serial # Importa la libreria serial per la comunicazione seriale
+from serial_reader import open_serial, SerialLineReader # Importa il lettore di linee condiviso (letture bloccanti con timeout)
 import time # Importa la libreria time per gestire la temporizzazione delle operazioni e introdurre ritardi
-import paho.mqtt.client as mqtt # Importa la libreria paho-mqtt per la comunicazione MQTT
+import logging # Importa la libreria logging per i messaggi
+import threading # Importa la libreria threading per il thread del canale degli eventi
+from events import EventChannel, EventPublisher, low_latency_client, DEBOUNCE # Importa il canale a bassa latenza
+from metrics import MetricsRegistry, MetricsServer # Importa gli istogrammi delle latenze e il server delle metriche
+from logging_setup import setup_logging # Importa la configurazione del logging (scrittura in un thread separato)
 
 # Configurazione della porta seriale
-ser = serial.Serial('COM5', 9600)  # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_COM_PORT = 'COM5' # Sostituisci 'COM3' con la porta seriale corretta
+SERIAL_DATARATE = 9600 # Velocità della porta
 
 # Configurazione MQTT
 broker = "localhost" # Indirizzo del broker MQTT
@@ -31,34 +42,61 @@ username = ""  # Inserisci il tuo username di shiftr.io
 password = ""  # Inserisci la tua password di shiftr.io
 topic = "pulsante" # Topic MQTT in cui inviare i dati
 
+# Configurazione del canale degli eventi
+EVENT_QOS = 1 # 0 = nessuna conferma, 1 = conferma del broker (latenza misurata fino alla conferma)
+STATS_INTERVAL = 10 # Secondi tra due riepiloghi delle latenze
+METRICS_PORT = 0 # Porta delle metriche Prometheus (0 = disattivate)
+
+log = logging.getLogger(__name__) # Logger dello script
+
+
 # Funzione callback per la connessione
 def on_connect(client, userdata, flags, rc):
-    print("Connesso con codice risultato: " + str(rc)) # Stampa il codice di connessione
+    log.info("Connesso con codice risultato: %s", rc) # Registra il codice di connessione
+
+
+def main():
+    setup_logging() # Messaggi scritti da un thread separato: non rallentano la pubblicazione
+
+    ser = open_serial(SERIAL_COM_PORT, SERIAL_DATARATE, timeout=DEBOUNCE) # Timeout breve: lo stato finale dopo un rimbalzo esce puntuale
+    try:
+        ser.set_low_latency_mode(True) # Linux: il driver USB-seriale consegna i byte senza attendere
+    except (AttributeError, NotImplementedError, ValueError, OSError): # Non supportato (es. Windows o driver CDC)
+        pass
+    reader = SerialLineReader(ser) # Crea il lettore che restituisce le linee complete
+
+    # Client MQTT dedicato agli eventi
+    client = low_latency_client(username, password, on_connect) # TCP_NODELAY a ogni connessione
+    client.connect(broker, port, 60) # Connessione al broker MQTT
+    client.loop_start() # Avvia il loop del client MQTT (riceve le conferme)
 
-# Inizializza il client MQTT
-client = mqtt.Client() # Crea un'istanza del client MQTT
-client.username_pw_set(username, password) # Imposta username e password
-client.on_connect = on_connect # Imposta la funzione di callback per la connessione
+    metrics = MetricsRegistry() # Istogrammi delle latenze
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = MetricsServer(metrics, METRICS_PORT)
+        metrics_server.start()
+    publisher = EventPublisher(client, topic, EVENT_QOS, metrics, {'topic': topic})
+    channel = EventChannel(reader, publisher, DEBOUNCE)
+    thread = threading.Thread(target=channel.run, daemon=True) # Lettura e pubblicazione nello stesso thread, senza code
+    thread.start()
 
-# Connessione al broker MQTT
-client.connect(broker, port, 60) # Connessione al broker MQTT
-client.loop_start() # Avvia il loop del client MQTT
+    # Riepilogo periodico delle latenze
+    try:
+        while thread.is_alive():
+            thread.join(STATS_INTERVAL)
+            log.info(channel.stats())
+    except KeyboardInterrupt:
+        log.info("Interruzione manuale") # Messaggio di interruzione manuale
+    finally:
+        channel.stop() # Il lettore termina entro il timeout della porta
+        thread.join()
+        ser.close() # Chiudi la porta seriale
+        if metrics_server:
+            metrics_server.stop()
+        client.loop_stop() # Ferma il loop del client MQTT
+        client.disconnect() # Disconnetti il client MQTT
 
-# Leggi i dati dalla seriale e inviali al broker MQTT
-try:
-    while True:
-        if ser.in_waiting > 0:
-            # Leggi la linea dalla seriale
-            line = ser.readline().decode('utf-8').rstrip() # Rimuovi i caratteri di newline e carriage return
-            print(line) # Stampa la linea letta
 
-            # Pubblica il messaggio MQTT
-            client.publish(topic, line) # Invia la temperatura al topic 'temperature'
-                        
-            #time.sleep(1) # Ritardo di 1 secondo
-except KeyboardInterrupt:
-    print("Interruzione manuale") # Stampa un messaggio di interruzione manuale
-finally:
-    ser.close() # Chiudi la porta seriale
-    client.loop_stop() # Ferma il loop del client MQTT
-    client.disconnect() # Disconnetti il client MQTT
\ No newline at end of file
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
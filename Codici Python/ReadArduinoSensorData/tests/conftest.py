@@ -0,0 +1,20 @@
+#########################################################################################
+# conftest.py                                                                           #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Configurazione comune dei test (pytest): i moduli del gateway sono file singoli nella #
+# cartella superiore, che viene aggiunta al percorso di ricerca dei moduli.             #
+# Esecuzione: python -m pytest -q (dalla cartella ReadArduinoSensorData)                #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per il percorso della cartella dei moduli
+import sys  # Importa la libreria sys per il percorso di ricerca dei moduli
+
+
+MODULES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Cartella ReadArduinoSensorData
+if MODULES_DIR not in sys.path:
+    sys.path.insert(0, MODULES_DIR)
@@ -0,0 +1,60 @@
+#########################################################################################
+# test_aggregation.py                                                                   #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test dell'aggregazione a finestre (aggregation.py): stimatore P², finestre            #
+# consecutive e mobili, costruzione da AGGREGATE_WINDOWS.                               #
+#########################################################################################
+
+# Importa le librerie necessarie
+import random  # Importa la libreria random per i campioni del test P²
+import pytest
+from aggregation import (P2Quantile, exact_quantile, TumblingWindow, SlidingWindow, build_aggregator,
+                         MODE_SLIDING)
+
+
+def test_p2_exact_for_few_samples():
+    sketch = P2Quantile(0.5)
+    assert sketch.value() is None
+    for value in (5, 1, 4):
+        sketch.add(value)
+    assert sketch.value() == 4  # Rango più vicino su [1, 4, 5]
+
+
+@pytest.mark.parametrize("p", [0.5, 0.95])
+def test_p2_tracks_the_quantile(p):
+    rng = random.Random(1)
+    values = [rng.gauss(20, 5) for _ in range(20000)]
+    sketch = P2Quantile(p)
+    for value in values:
+        sketch.add(value)
+    assert sketch.value() == pytest.approx(exact_quantile(sorted(values), p), abs=0.2)
+
+
+def test_tumbling_window_summary():
+    window = TumblingWindow("10s", 10, fields=('x',), quantiles=(0.5,))
+    assert [window.add(t, (float(t),)) for t in range(10, 20)] == [None] * 10
+    summary = window.add(20, (100.0,))  # Il primo campione della finestra successiva chiude la precedente
+    assert summary == {'start': 10, 'end': 20, 'count': 10,
+                       'x': {'mean': 14.5, 'min': 10.0, 'max': 19.0, 'p50': 14.0}}
+    assert window.poll(29) is None
+    assert window.poll(30)['count'] == 1  # Chiusa anche senza nuovi campioni
+
+
+def test_sliding_window_evicts_old_samples():
+    window = SlidingWindow("5s", 5, 1, fields=('x',), quantiles=(0.5,))
+    summaries = [window.add(t, (float(v),)) for t, v in enumerate([9, 1, 5, 7, 3, 8, 2])]
+    last = summaries[-1]
+    assert last['count'] == 5  # Campioni con t in (1, 6]
+    assert last['x'] == {'mean': 5.0, 'min': 2.0, 'max': 8.0, 'p50': 5.0}
+
+
+def test_build_aggregator():
+    assert build_aggregator([]) is None
+    aggregator = build_aggregator([{'length': 60}, {'name': "5m", 'length': 300, 'mode': MODE_SLIDING, 'step': 30}])
+    assert [window.name for window in aggregator.windows] == ["60s", "5m"]
+    with pytest.raises(ValueError):
+        build_aggregator([{'length': 60, 'mode': "hopping"}])
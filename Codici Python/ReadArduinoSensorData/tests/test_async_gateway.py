@@ -0,0 +1,113 @@
+#########################################################################################
+# test_async_gateway.py                                                                 #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test end-to-end del gateway asyncio: un Arduino simulato (load_generator.py) scrive   #
+# su una pseudo-seriale (pty), run_gateway() legge, decodifica e pubblica sul broker    #
+# interno al processo (memory_broker.py). Anche una registrazione (capture.py) come     #
+# sorgente, al posto della porta, la chiusura della porta e una coroutine che fallisce. #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per il sistema operativo
+import json  # Importa la libreria json per il contenuto dei messaggi
+import time  # Importa la libreria time per l'orario della registrazione
+import asyncio  # Importa la libreria asyncio per il ciclo di eventi
+import threading  # Importa la libreria threading per l'Arduino simulato
+import pytest
+from async_gateway import run_gateway  # Importa il gateway asyncio
+from capture import HEADER, RECORD, MAGIC, VERSION  # Importa il formato del file di registrazione
+from config import validate  # Importa il controllo dei parametri
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from load_generator import LoadGenerator, open_pty  # Importa l'Arduino simulato
+
+LINE = "Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F\n".encode('utf-8')
+PARAMS = {'broker': "localhost", 'port': 1883, 'username': "", 'password': "", 'PUBLISH_MODE': "json"}
+
+
+async def run_until(params, broker, count, timeout=10.0, on_ready=None, stages=()):
+    """Avvia run_gateway() finché il broker non ha ricevuto 'count' messaggi; ritorna il task terminato"""
+    ready = asyncio.Event()  # Impostato quando le porte sono aperte
+    task = asyncio.create_task(run_gateway(params, broker, stages, stats_interval=0.1, ready=ready))
+    await asyncio.wait([task, asyncio.create_task(ready.wait())], return_when=asyncio.FIRST_COMPLETED)
+    if on_ready and ready.is_set():
+        on_ready()  # Aprendo la porta pyserial svuota il buffer: si scrive solo dopo
+    deadline = time.monotonic() + timeout
+    while broker.published < count and time.monotonic() < deadline and not task.done():
+        await asyncio.sleep(0.01)
+    if not task.done():
+        task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return task
+
+
+def opened(slave, then):
+    """Callback di avvio: chiude il lato 'porta seriale' del pty (ora aperto dal gateway) e poi chiama then()"""
+    def callback():
+        os.close(slave)
+        then()
+    return callback
+
+
+def pty_params(port, **extra):
+    return validate({**PARAMS, **extra, 'DEVICES': [{'port': port, 'topic_prefix': "lab/dev1"}]})
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="pseudo-terminali solo su POSIX")
+def test_pty_to_memory_broker():
+    master, slave, port = open_pty()
+    broker = InMemoryBroker()
+    generator = LoadGenerator(master, rate=0, sequence=True)
+    writer = threading.Thread(target=generator.run, kwargs={'count': 200}, daemon=True)
+    asyncio.run(run_until(pty_params(port), broker, 200, on_ready=opened(slave, writer.start)))  # Scrive mentre il gateway legge
+    writer.join(5)
+    os.close(master)
+    assert broker.published == 200
+    sequence = [json.loads(payload)['idc_f'] for _, topic, payload in broker.messages]
+    assert sequence == [float(i) for i in range(200)]  # Tutte, nell'ordine di invio
+    assert {topic for _, topic, _ in broker.messages} == {"lab/dev1/sample"}
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="pseudo-terminali solo su POSIX")
+def test_hangup_ends_the_stream():
+    master, slave, port = open_pty()
+    broker = InMemoryBroker()
+
+    def write_and_hang_up():
+        os.write(master, LINE)
+        time.sleep(0.2)  # Il gateway legge la linea prima della chiusura
+        os.close(master)  # Cavo scollegato: la porta risponde con EIO
+
+    task = asyncio.run(run_until(pty_params(port, SERIAL_RECONNECT=False), broker, 2, timeout=3,
+                                 on_ready=opened(slave, threading.Thread(target=write_and_hang_up).start)))
+    assert not task.cancelled() and task.exception() is None  # Il gateway termina da solo, senza errori
+    assert broker.published == 1  # La linea letta prima della chiusura è pubblicata
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="pseudo-terminali solo su POSIX")
+def test_failing_coroutine_stops_the_gateway():
+    master, slave, port = open_pty()
+
+    def broken_stage(item):
+        raise ValueError("stadio guasto")
+
+    task = asyncio.run(run_until(pty_params(port), InMemoryBroker(), 1, timeout=3, stages=(broken_stage,),
+                                 on_ready=opened(slave, lambda: os.write(master, LINE))))
+    os.close(master)
+    assert isinstance(task.exception(), ValueError)  # L'errore arriva a chi ha avviato il gateway
+
+
+def test_replay_device(tmp_path):
+    path = str(tmp_path / "dev.scap")
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, time.time() - 60))
+        for i in range(20):
+            data = f"Humidity: {40 + i}.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F\r\n".encode('utf-8')
+            file.write(RECORD.pack(1000, len(data)) + data)
+    params = validate({**PARAMS, 'DEVICES': [{'replay': path, 'speed': 0, 'topic_prefix': "lab/replay"}]})
+    broker = InMemoryBroker()
+    asyncio.run(run_until(params, broker, 20))
+    assert [json.loads(payload)['humidity'] for _, _, payload in broker.messages] == [40.0 + i for i in range(20)]
@@ -0,0 +1,58 @@
+#########################################################################################
+# test_binary_protocol.py                                                               #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del protocollo binario (binary_protocol.py): CRC-8, frame completi e grezzi,     #
+# risincronizzazione dopo byte corrotti e riconoscimento del formato.                   #
+#########################################################################################
+
+# Importa le librerie necessarie
+import math  # Importa la libreria math per i campi NaN dei frame grezzi
+from binary_protocol import (crc8, encode_frame, encode_raw_frame, FrameDecoder, detect_format,
+                             FRAME_SIZE, RAW_FRAME_SIZE, SYNC, FORMAT_TEXT, FORMAT_BINARY)
+from sensor_parser import SensorReading
+
+READING = SensorReading(45.0, 23.0, 73.4, 22.8, 73.05)
+
+
+def test_crc8_reference_value():
+    assert crc8(b"123456789") == 0xF4  # Valore di controllo del CRC-8 con polinomio 0x07
+    assert crc8(b"") == 0
+
+
+def test_frame_round_trip_split_in_pieces():
+    data = encode_frame(READING) * 3
+    assert len(data) == 3 * FRAME_SIZE and data[0] == SYNC
+    decoder = FrameDecoder()
+    readings = []
+    for i in range(len(data)):  # Un byte per volta, come da una seriale lenta
+        readings += decoder.feed(data[i:i + 1])
+    assert readings == [READING] * 3
+    assert (decoder.frames, decoder.crc_errors, decoder.skipped_bytes) == (3, 0, 0)
+
+
+def test_raw_frame_has_missing_fields():
+    data = encode_raw_frame(READING)
+    assert len(data) == RAW_FRAME_SIZE
+    (reading,) = FrameDecoder().feed(data)
+    assert (reading.humidity, reading.temp_c) == (45.0, 23.0)
+    assert all(math.isnan(value) for value in reading[2:])
+
+
+def test_resync_after_corruption():
+    good = encode_frame(READING)
+    corrupted = bytearray(good)
+    corrupted[5] ^= 0xFF  # Un byte dei dati cambiato: CRC errato
+    decoder = FrameDecoder()
+    readings = decoder.feed(b"\x00\x13" + bytes(corrupted) + good + b"rumore" + good)
+    assert readings == [READING, READING]
+    assert decoder.crc_errors >= 1 and decoder.skipped_bytes >= 2 + len(b"rumore")
+
+
+def test_detect_format():
+    assert detect_format(b"xx" + encode_frame(READING)) == FORMAT_BINARY
+    assert detect_format("Humidity: 45.00%,".encode('utf-8')) == FORMAT_TEXT
+    assert detect_format(encode_frame(READING)[:10]) is None  # Servono altri byte
@@ -0,0 +1,68 @@
+#########################################################################################
+# test_config.py                                                                        #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del controllo dei parametri (config.py): tutti gli errori insieme, dispositivi   #
+# completati con i default, finestre di aggregazione controllate una per una.           #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per scrivere il file dei parametri
+import pytest
+from config import validate, load_config, ConfigError
+
+BASE = {'broker': "localhost", 'port': 1883, 'username': "", 'password': "", 'SERIAL_COM_PORT': "COM5"}
+
+
+def errors_of(params):
+    with pytest.raises(ConfigError) as info:
+        validate(params)
+    return info.value.errors
+
+
+def test_valid_parameters_complete_the_device():
+    config = validate({**BASE, 'SERIAL_DATARATE': 115200, 'TOPIC_PREFIX': "aula"})
+    assert config.broker == "localhost"
+    assert config['DEVICES'] == [{'port': "COM5", 'datarate': 115200, 'vid': None, 'pid': None,
+                                  'format': "text", 'topic_prefix': "aula/dev1"}]
+
+
+def test_all_errors_are_reported_together():
+    errors = errors_of({'broker': "localhost", 'port': 70000, 'SERIAL_DATARATE': True, 'PUBLISH_QOS': 3,
+                        'SERIAL_COM_PORT': "COM5"})
+    assert "username: parametro obbligatorio mancante" in errors
+    assert "password: parametro obbligatorio mancante" in errors
+    assert any(error.startswith("port:") for error in errors)
+    assert any(error.startswith("SERIAL_DATARATE: atteso un numero") for error in errors)  # true non è un numero
+    assert any(error.startswith("PUBLISH_QOS:") for error in errors)
+
+
+def test_devices_need_a_source():
+    errors = errors_of({**BASE, 'DEVICES': [{'port': "COM3"}, {'datarate': 9600}, "COM4"]})
+    assert errors == ["DEVICES[1].port: serve 'port', 'replay' oppure 'vid' e 'pid'", "DEVICES[2]: atteso un oggetto"]
+
+
+def test_aggregate_windows_are_checked():
+    errors = errors_of({**BASE, 'AGGREGATE_WINDOWS': [{'mode': "tumbling"}, {'length': 60, 'mode': "hopping"},
+                                                     {'length': 300, 'mode': "sliding", 'step': 0}, {'length': -1}]})
+    assert errors == ["AGGREGATE_WINDOWS[0].length: parametro obbligatorio mancante",
+                      "AGGREGATE_WINDOWS[1].mode: 'hopping' non è tra 'tumbling', 'sliding'",
+                      "AGGREGATE_WINDOWS[2].step: 0 non valido (secondi maggiore di 0)",
+                      "AGGREGATE_WINDOWS[3].length: -1 non valido (secondi maggiore di 0)"]
+    windows = [{'name': "1m", 'length': 60}, {'length': 300, 'mode': "sliding", 'step': 30}]
+    assert validate({**BASE, 'AGGREGATE_WINDOWS': windows})['AGGREGATE_WINDOWS'] == windows
+
+
+def test_load_config_reports_file_errors(tmp_path):
+    with pytest.raises(ConfigError, match="il file non esiste"):
+        load_config(str(tmp_path / "assente.json"))
+    broken = tmp_path / "rotto.json"
+    broken.write_text("{", encoding='utf-8')
+    with pytest.raises(ConfigError, match="errore nel parsing"):
+        load_config(str(broken))
+    good = tmp_path / "parameters.json"
+    good.write_text(json.dumps(BASE), encoding='utf-8')
+    assert load_config(str(good)).path == str(good)
@@ -0,0 +1,51 @@
+#########################################################################################
+# test_deadband.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del filtro a banda morta (deadband.py): soglie assolute e relative, heartbeat,   #
+# campioni interi e valori NaN.                                                         #
+#########################################################################################
+
+# Importa le librerie necessarie
+from deadband import DeadbandFilter, build_deadband
+from sensor_parser import SensorReading
+
+
+def test_absolute_and_relative_bands():
+    deadband = DeadbandFilter({'temp_c': {'absolute': 0.5}, 'humidity': {'relative': 0.1}}, heartbeat=0)
+    assert [deadband.accept("t", 'temp_c', value, now=0) for value in (20.0, 20.4, 20.6, 20.1, 21.2)] == \
+        [True, False, True, False, True]  # Confronto con l'ultimo valore pubblicato, non con il precedente
+    assert [deadband.accept("h", 'humidity', value, now=0) for value in (50.0, 54.0, 56.0)] == [True, False, True]
+    assert (deadband.published, deadband.suppressed) == (5, 3)
+
+
+def test_heartbeat_republishes_unchanged_value():
+    deadband = DeadbandFilter({'temp_c': {'absolute': 1.0}}, heartbeat=300)
+    assert deadband.accept("t", 'temp_c', 20.0, now=0)
+    assert not deadband.accept("t", 'temp_c', 20.0, now=299)
+    assert deadband.accept("t", 'temp_c', 20.0, now=300)
+
+
+def test_sample_passes_if_any_field_changes():
+    deadband = DeadbandFilter({field: {'absolute': 1.0} for field in SensorReading._fields}, heartbeat=0)
+    reading = SensorReading(45.0, 23.0, 73.4, 22.8, 73.05)
+    assert deadband.accept_sample("dev1", reading, now=0)
+    assert not deadband.accept_sample("dev1", reading._replace(temp_c=23.5), now=1)
+    assert deadband.accept_sample("dev1", reading._replace(humidity=47.0), now=2)
+
+
+def test_nan_is_a_change():
+    deadband = DeadbandFilter({'temp_c': {'absolute': 0.5}}, heartbeat=300)
+    nan = float('nan')
+    assert [deadband.accept("t", 'temp_c', value, now=0) for value in (20.0, nan, nan, 20.1, 20.2)] == \
+        [True, True, False, True, False]  # Guasto e ritorno pubblicati subito, non all'heartbeat
+
+
+def test_build_deadband():
+    assert build_deadband({}) is None
+    assert build_deadband({'DEADBAND': {}, 'DEADBAND_HEARTBEAT': 300}) is None  # Come in parameters.json: disattivato
+    deadband = build_deadband({'DEADBAND': {'temp_c': {'absolute': 0.2}}, 'DEADBAND_HEARTBEAT': 60})
+    assert deadband.heartbeat == 60 and deadband.bands == {'temp_c': {'absolute': 0.2}}
@@ -0,0 +1,68 @@
+#########################################################################################
+# test_delivery.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test della consegna QoS 1 a finestra (delivery.py) con un client che imita paho:      #
+# nessuna ripubblicazione a client connesso, ritrasmissioni contate alla riconnessione, #
+# finestra di paho senza limite.                                                        #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per le scadenze
+from delivery import ReliablePublisher, MQTT_ERR_NO_CONN  # Importa la consegna a finestra
+from memory_broker import InMemoryBroker, MessageInfo  # Importa il broker interno al processo
+
+
+# Client come paho: conferme perse, connessione che si può interrompere
+class FlakyClient(InMemoryBroker):
+    def __init__(self):
+        super().__init__(ack_loss=1.0)  # Nessuna conferma: solo le scadenze liberano la finestra
+        self.connected = True
+        self.max_inflight = 20  # Default di paho
+
+    def max_inflight_messages_set(self, inflight):
+        self.max_inflight = inflight
+
+    def is_connected(self):
+        return self.connected
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        info = super().publish(topic, payload, qos, retain)
+        if not self.connected:  # paho accoda il messaggio QoS 1 e lo invierà alla connessione
+            info.rc = MQTT_ERR_NO_CONN
+        return info
+
+
+def test_lost_acks_are_not_republished():
+    client = FlakyClient()
+    acker = ReliablePublisher(client, window=2, ack_timeout=10)
+    assert client.max_inflight == 0  # La finestra è quella di ReliablePublisher, non quella di paho
+    for seq in range(2):
+        acker.publish("t/seq", str(seq))
+    acker.expire_overdue(time.monotonic() + 11)  # Conferme scadute a client connesso
+    assert client.published == 2  # Nessun nuovo mid: paho tiene ancora i messaggi originali
+    assert acker.inflight == 0 and acker.expired == 2 and acker.retried == 0
+    acker.publish("t/seq", "2")  # La finestra è di nuovo libera
+    assert acker.inflight == 1
+    acker.close()
+
+
+def test_retransmissions_are_counted_at_reconnect():
+    client = FlakyClient()
+    acker = ReliablePublisher(client, window=10, ack_timeout=10, max_retries=2)
+    acker.publish("t/seq", "sent")  # Inviato, conferma persa
+    client.connected = False
+    acker.publish("t/seq", "queued")  # Accodato da paho senza connessione
+    acker.expire_overdue(time.monotonic() + 11)  # Senza connessione non scade nulla
+    assert acker.inflight == 2 and acker.expired == 0
+    for _ in range(3):  # Ogni riconnessione: paho ritrasmette con lo stesso mid
+        acker.on_connect()
+    assert acker.retried == 2 + 2  # Due per ciascuno: il messaggio accodato è partito alla prima connessione
+    assert acker.inflight == 1 and acker.expired == 1  # Il primo ha superato max_retries
+    acker.on_connect()
+    assert acker.inflight == 0 and acker.expired == 2
+    assert client.published == 2  # Mai ripubblicati: le ritrasmissioni sono di paho
+    acker.close()
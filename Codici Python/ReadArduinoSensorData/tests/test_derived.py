@@ -0,0 +1,54 @@
+#########################################################################################
+# test_derived.py                                                                       #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test dei campi calcolati sul PC (derived.py) contro le linee dello sketch completo    #
+# DHT11_CORSO_IoT.ino: °F, IdC °C e IdC °F devono coincidere con quelli stampati.       #
+# Le linee sono prodotte da readHumidity/readTemperature (DHT11), convertCtoF,          #
+# computeHeatIndex e Print::printFloat compilati in float a 32 bit, come su Arduino     #
+# Uno (double = float): formula semplice, Rothfusz, correzioni per aria secca e umida,  #
+# temperature negative.                                                                 #
+#########################################################################################
+
+# Importa le librerie necessarie
+import numpy as np
+from derived import derive, check
+from sensor_parser import parse_line, format_raw_line, complete_raw
+
+SKETCH_LINES = """\
+Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.53°C 72.55°F
+Humidity: 60.00%,  Temperature: 26.40°C 79.52°F,  IdC: 27.36°C 81.25°F
+Humidity: 38.00%,  Temperature: 18.70°C 65.66°F,  IdC: 17.62°C 63.71°F
+Humidity: 90.00%,  Temperature: 28.20°C 82.76°F,  IdC: 34.62°C 94.32°F
+Humidity: 86.00%,  Temperature: 30.10°C 86.18°F,  IdC: 39.81°C 103.65°F
+Humidity: 10.00%,  Temperature: 35.00°C 95.00°F,  IdC: 31.92°C 89.45°F
+Humidity: 12.00%,  Temperature: 42.50°C 108.50°F,  IdC: 40.03°C 104.06°F
+Humidity: 55.00%,  Temperature: 33.80°C 92.84°F,  IdC: 39.69°C 103.45°F
+Humidity: 70.00%,  Temperature: 31.00°C 87.80°F,  IdC: 37.60°C 99.68°F
+Humidity: 20.00%,  Temperature: -0.70°C 30.74°F,  IdC: -4.19°C 24.45°F
+Humidity: 80.00%,  Temperature: -5.40°C 22.28°F,  IdC: -7.80°C 17.97°F
+Humidity: 95.00%,  Temperature: 46.90°C 116.42°F,  IdC: 160.75°C 321.36°F
+Humidity: 33.00%,  Temperature: 27.30°C 81.14°F,  IdC: 26.74°C 80.13°F
+Humidity: 75.00%,  Temperature: 29.90°C 85.82°F,  IdC: 36.03°C 96.85°F
+"""
+
+
+def test_derive_matches_sketch():
+    readings = np.array([parse_line(line) for line in SKETCH_LINES.splitlines()])
+    computed = np.column_stack(derive(readings[:, 0], readings[:, 1]))
+    assert np.abs(computed - readings[:, 2:]).max() < 0.005  # Stesse cifre stampate (due decimali)
+
+
+def test_raw_lines_are_completed_like_the_sketch():
+    sketch = [parse_line(line) for line in SKETCH_LINES.splitlines()]
+    raw = [parse_line(format_raw_line(reading)) for reading in sketch]  # Le stesse letture in modalità grezza
+    assert complete_raw(raw) == sketch
+
+
+def test_check_command(tmp_path):
+    path = tmp_path / "sketch.log"
+    path.write_text(SKETCH_LINES, encoding='utf-8')
+    assert check(str(path)) == 0  # Nessuna linea diversa
@@ -0,0 +1,52 @@
+#########################################################################################
+# test_events.py                                                                        #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del canale degli eventi (events.py): filtro dei rimbalzi e conteggio delle       #
+# pubblicazioni quando il client non è connesso.                                        #
+#########################################################################################
+
+# Importa le librerie necessarie
+from delivery import MQTT_ERR_NO_CONN  # Importa il codice di paho "non connesso"
+from events import EdgeFilter, EventPublisher
+from memory_broker import InMemoryBroker, MessageInfo  # Importa il broker interno al processo
+
+
+# Client che non risponde: paho accoda i messaggi QoS > 0 e ritorna MQTT_ERR_NO_CONN
+class OfflineClient(InMemoryBroker):
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self._mid += 1
+        info = MessageInfo(self._mid)
+        info.rc = MQTT_ERR_NO_CONN
+        return info
+
+
+def test_edge_filter_debounce():
+    edges = EdgeFilter(debounce=0.05)
+    assert edges.feed("1", 0.0) == "1"
+    assert edges.feed("0", 0.01) is None  # Rimbalzo dentro la finestra
+    assert edges.feed("1", 0.02) is None  # Rientrato: stato già pubblicato
+    assert edges.due(0.1) is None
+    assert edges.feed("0", 0.2) == "0"
+    assert edges.feed("1", 0.21) is None
+    assert edges.due(0.3) == ("1", 0.21)  # Stato finale della finestra
+    assert (edges.events, edges.bounced, edges.repeated) == (3, 2, 1)
+
+
+def test_no_conn_at_qos1_is_queued_not_failed():
+    client = OfflineClient()
+    publisher = EventPublisher(client, "switch/state", qos=1)
+    publisher.publish("1", 0.0)
+    assert (publisher.sent, publisher.queued, publisher.failed, publisher.pending) == (1, 1, 0, 1)
+    assert publisher.publish_latency.count == 0  # Non ancora scritto sul socket
+    publisher.on_publish(client, None, 1)  # Conferma dopo la riconnessione
+    assert publisher.acked == 1 and publisher.pending == 0
+
+
+def test_no_conn_at_qos0_fails():
+    publisher = EventPublisher(OfflineClient(), "switch/state", qos=0)
+    publisher.publish("1", 0.0)
+    assert (publisher.sent, publisher.failed) == (0, 1)
@@ -0,0 +1,45 @@
+#########################################################################################
+# test_gateway.py                                                                       #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test dell'avvio del gateway multi-porta (gateway.py): se una porta non si apre, ciò   #
+# che era già stato creato (porte, loop MQTT, spool, archivio) viene chiuso.            #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per il pseudo-terminale
+import threading  # Importa la libreria threading per contare i thread rimasti
+import pytest
+import serial  # Importa la libreria pyserial per l'errore di apertura
+import gateway
+from config import validate  # Importa il controllo dei parametri
+from load_generator import open_pty  # Importa la pseudo-seriale
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="pseudo-terminali solo su POSIX")
+def test_failed_port_closes_what_was_opened(tmp_path, monkeypatch):
+    monkeypatch.setattr(gateway, 'setup_logging_from', lambda params: None)  # Logging del processo di pytest invariato
+    opened = []
+
+    class RecordingDevice(gateway.Device):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(gateway, 'Device', RecordingDevice)
+    master, slave, port = open_pty()
+    params = validate({'broker': "127.0.0.1", 'port': 1, 'username': "", 'password': "", 'SERIAL_RECONNECT': False,
+                       'SPOOL_DIR': str(tmp_path / "spool"), 'TSDB_DIR': str(tmp_path / "tsdb"),
+                       'DEVICES': [{'port': port}, {'port': str(tmp_path / "assente")}]})
+    threads = set(threading.enumerate())
+    with pytest.raises(serial.SerialException):
+        gateway.main(params)
+    os.close(master)
+    os.close(slave)
+    assert len(opened) == 1 and not opened[0].serial.is_open  # La prima porta è stata chiusa
+    assert not opened[0].publisher_thread.is_alive()
+    leftover = [thread for thread in threading.enumerate() if thread not in threads and thread.is_alive()]
+    assert leftover == []  # Nessun thread rimasto (loop MQTT, svuotamento dello spool, lettori)
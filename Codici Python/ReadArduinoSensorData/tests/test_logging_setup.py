@@ -0,0 +1,67 @@
+#########################################################################################
+# test_logging_setup.py                                                                 #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del filtro dei messaggi ripetitivi (logging_setup.py), con un orologio finto.    #
+#########################################################################################
+
+# Importa le librerie necessarie
+import types  # Importa la libreria types per l'orologio finto
+import logging  # Importa la libreria logging per creare i record
+import logging_setup
+from logging_setup import RateLimitFilter, IDLE_BUCKET
+
+
+def make_record(msg, lineno=10, args=()):
+    return logging.LogRecord("gateway", logging.INFO, "gateway.py", lineno, msg, args, None)
+
+
+def test_preformatted_messages_share_one_bucket(monkeypatch):
+    clock = types.SimpleNamespace(monotonic=lambda: 100.0)
+    monkeypatch.setattr(logging_setup, 'time', clock)
+    limiter = RateLimitFilter(rate=2)
+    passed = [limiter.filter(make_record(f"Ricevuto: {i}")) for i in range(10)]  # Testi tutti diversi, stessa riga
+    assert passed == [True, True] + [False] * 8
+    assert len(limiter._buckets) == 1
+    assert limiter.filter(make_record("altro messaggio", lineno=20))  # Un'altra riga ha il suo limite
+    clock.monotonic = lambda: 101.0  # Dopo un secondo i gettoni sono ricaricati
+    record = make_record("Ricevuto: 10")
+    assert limiter.filter(record)
+    assert record.msg.endswith("[+8 messaggi simili soppressi]")
+
+
+def test_stats_of_every_device_pass(monkeypatch):
+    clock = types.SimpleNamespace(monotonic=lambda: 100.0)
+    monkeypatch.setattr(logging_setup, 'time', clock)
+    limiter = RateLimitFilter(rate=10)
+    for tick in range(3):  # Tre giri di statistiche di 40 porte dalla stessa riga di codice
+        clock.monotonic = lambda: 100.0 + 5 * tick
+        for port in range(40):
+            record = make_record(f"COM{port}: {tick} campioni/s")
+            record.rate_key = f"COM{port}"  # Come extra={'rate_key': ...}
+            assert limiter.filter(record)
+    assert limiter.suppressed == 0
+
+
+def test_warnings_are_never_suppressed(monkeypatch):
+    monkeypatch.setattr(logging_setup, 'time', types.SimpleNamespace(monotonic=lambda: 100.0))
+    limiter = RateLimitFilter(rate=1)
+    records = [logging.LogRecord("gateway", level, "gateway.py", 10, "porta chiusa", (), None)
+               for level in (logging.WARNING, logging.ERROR) for _ in range(5)]
+    assert all(limiter.filter(record) for record in records)
+    assert not limiter._buckets
+
+
+def test_idle_buckets_are_removed(monkeypatch):
+    clock = types.SimpleNamespace(monotonic=lambda: 0.0)
+    monkeypatch.setattr(logging_setup, 'time', clock)
+    limiter = RateLimitFilter(rate=10)
+    for line in range(50):
+        limiter.filter(make_record("messaggio", lineno=line))
+    assert len(limiter._buckets) == 50
+    clock.monotonic = lambda: IDLE_BUCKET + 1
+    limiter.filter(make_record("messaggio", lineno=1000))
+    assert len(limiter._buckets) == 1
@@ -0,0 +1,69 @@
+#########################################################################################
+# test_replay.py                                                                        #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test della riproduzione di una registrazione (capture.py) attraverso un dispositivo   #
+# del gateway: i campioni recuperati entrano nell'archivio (tsdb.py) con i timestamp    #
+# originali e restano interrogabili accanto ai dati in tempo reale.                     #
+#########################################################################################
+
+# Importa le librerie necessarie
+import time  # Importa la libreria time per l'orario della registrazione
+from capture import HEADER, RECORD, MAGIC, VERSION  # Importa il formato del file di registrazione
+from config import validate  # Importa il controllo dei parametri
+from gateway import Device  # Importa il dispositivo del gateway
+from memory_broker import InMemoryBroker  # Importa il broker interno al processo
+from sensor_parser import SensorReading
+from tsdb import TimeSeriesStore
+
+LINE = "Humidity: {:.2f}%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F\r\n"
+
+
+def write_capture(path, start_time, count):
+    """Registrazione di 'count' linee, una al secondo a partire da 'start_time'"""
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, start_time))
+        for i in range(count):
+            data = LINE.format(40.0 + i).encode('utf-8')
+            file.write(RECORD.pack(0 if i == 0 else 1_000_000, len(data)) + data)
+
+
+def replay(tmp_path, store, device_config, count):
+    """Riproduce la registrazione alla velocità massima attraverso un Device"""
+    params = validate({'broker': "localhost", 'port': 1883, 'username': "", 'password': "",
+                       'DEVICES': [device_config]})
+    broker = InMemoryBroker()
+    device = Device(params['DEVICES'][0], broker, params, store=store)
+    device.start()
+    deadline = time.monotonic() + 10
+    while device.publisher.samples < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    device.stop()
+    return broker
+
+
+def test_replay_backfills_live_series(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "tsdb"), chunk_size=8)
+    now = time.time()
+    for i in range(20):  # Dati in tempo reale già archiviati
+        store.append("aula1", now + i, SensorReading(50.0, 23.0, 73.4, 22.8, 73.05))
+    start = now - 3600  # Registrazione di un'ora prima
+    path = str(tmp_path / "aula1.scap")
+    write_capture(path, start, 30)
+    replay(tmp_path, store, {'replay': path, 'speed': 0, 'topic_prefix': "aula1"}, 30)
+    result = store.query("aula1", start - 1, start + 60, fields=('humidity',))
+    assert result['ts'] == [round(start + i, 3) for i in range(30)]
+    assert result['humidity'] == [40.0 + i for i in range(30)]
+    assert store.aggregate("aula1", start - 1, now + 60, 'humidity')['count'] == 50
+
+
+def test_replay_to_own_series(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "tsdb"))
+    path = str(tmp_path / "aula1.scap")
+    write_capture(path, time.time() - 600, 5)
+    replay(tmp_path, store, {'replay': path, 'speed': 0, 'topic_prefix': "aula1", 'series': "aula1_replay"}, 5)
+    assert store.series_names() == ["aula1_replay"]
+    assert store.aggregate("aula1_replay", 0, time.time(), 'humidity')['count'] == 5
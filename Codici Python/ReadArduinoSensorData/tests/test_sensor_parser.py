@@ -0,0 +1,78 @@
+#########################################################################################
+# test_sensor_parser.py                                                                 #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test del parser delle linee dello sketch (sensor_parser.py): linee complete e grezze, #
+# byte spuri, linee troncate o alterate, classificazione delle linee scartate e         #
+# completamento delle letture grezze.                                                   #
+#########################################################################################
+
+# Importa le librerie necessarie
+import math
+import pytest
+from sensor_parser import (SensorReading, parse_line, is_raw, complete_raw, classify_line, format_line,
+                           format_raw_line, LINE_SENSOR_ERROR, LINE_CORRUPTED, LINE_UNKNOWN)
+
+
+LINE = "Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F"
+
+
+def test_full_line():
+    assert parse_line(LINE) == SensorReading(45.0, 23.0, 73.4, 22.8, 73.05)
+    assert parse_line(LINE + "\r\n") == parse_line(LINE)  # Fine linea della seriale
+    assert parse_line("\x00\xffHum" + LINE) == parse_line(LINE)  # Byte spuri dopo il reset: percorso di riserva
+    reading = SensorReading(12.5, -3.25, 26.15, -4.0, 24.8)
+    assert parse_line(format_line(reading)) == reading  # Valori negativi
+
+
+def test_raw_line():
+    reading = parse_line("Humidity: 45.00%,  Temperature: 23.00°C")
+    assert reading[:2] == (45.0, 23.0) and is_raw(reading)
+    assert not is_raw(parse_line(LINE))
+    completed, = complete_raw([reading])  # °F e indice di calore calcolati sul PC
+    assert completed[:3] == (45.0, 23.0, 73.4) and not is_raw(completed)  # Valori dell'indice: vedi test_derived.py
+    assert complete_raw([parse_line(LINE)]) == [parse_line(LINE)]  # Le letture complete non cambiano
+
+
+@pytest.mark.parametrize("line", [
+    "Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C",  # Troncata
+    "Humidity: 45.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.",  # Troncata nel valore
+    "Humidity: 45.00%,  Temp",  # Troncata dal reset
+    "",
+])
+def test_truncated_line(line):
+    assert parse_line(line) is None
+    assert classify_line(line) == LINE_UNKNOWN
+
+
+@pytest.mark.parametrize("line", [
+    "Humidity: 45.00X,  Temperature: 23.00°F 73.40°F,  IdC: 22.80°C 73.05°F",  # Unità alterate
+    "Humidity: 45.00%,  Temperature: 23.00°C 73.40°C,  IdC: 22.80°C 73.05°F",
+    "Humidity: 45.00%,  Tempurature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F",
+    "Humidity: 4.5.00%,  Temperature: 23.00°C 73.40°F,  IdC: 22.80°C 73.05°F",  # Non è un numero
+    "Humidity: 45.00X,  Temperature: 23.00°C",  # Linea grezza alterata
+])
+def test_corrupted_line(line):
+    assert parse_line(line) is None
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf"])
+def test_non_finite_values(value):
+    assert parse_line(LINE.replace("45.00", value)) is None  # float() li accetta, lo sketch non li stampa
+    assert parse_line(f"Humidity: {value}%,  Temperature: {value}°C") is None  # Non è una linea grezza
+
+
+def test_classify_line():
+    assert classify_line("Lettura dal sensore DHT fallita!") == LINE_SENSOR_ERROR
+    assert classify_line("\x07Lettura dal sensore DHT fallita!") == LINE_SENSOR_ERROR  # Con byte spuri
+    assert classify_line("Humidity: 45.�0%,") == LINE_CORRUPTED  # Byte non UTF-8
+    assert classify_line("Humidity: 45.00%\x1b") == LINE_CORRUPTED  # Carattere di controllo
+    assert classify_line("Avvio...") == LINE_UNKNOWN
+
+
+def test_format_raw_line():
+    reading = parse_line(format_raw_line(SensorReading(45.0, 23.0, 0.0, 0.0, 0.0)))
+    assert reading[:2] == (45.0, 23.0) and all(math.isnan(value) for value in reading[2:])
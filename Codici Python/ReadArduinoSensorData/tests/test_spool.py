@@ -0,0 +1,140 @@
+#########################################################################################
+# test_spool.py                                                                         #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test della memorizzazione su disco (spool.py), da sola e davanti alla consegna QoS 1  #
+# a finestra (delivery.py): nessun blocco a finestra piena, nessun doppio invio, fsync  #
+# degli ultimi messaggi anche senza nuove scritture.                                    #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per la dimensione dei segmenti
+import time  # Importa la libreria time per le attese e i tempi di publish()
+from delivery import ReliablePublisher, MQTT_ERR_NO_CONN  # Importa la consegna a finestra e il codice di paho "non connesso"
+from memory_broker import InMemoryBroker, MessageInfo  # Importa il broker interno al processo
+import spool
+from spool import DiskSpool, StoreAndForward
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+# Client che non risponde: paho accoda i messaggi QoS > 0 e ritorna MQTT_ERR_NO_CONN
+class OfflineClient(InMemoryBroker):
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        info = MessageInfo(0)
+        info.rc = MQTT_ERR_NO_CONN
+        return info
+
+
+def test_full_window_does_not_block(tmp_path):
+    broker = InMemoryBroker(ack_delay=0.05)
+    received = []
+    broker.subscribe("t/#", lambda topic, payload, arrival: received.append(int(payload)))
+    acker = ReliablePublisher(broker, window=2, ack_timeout=10, block=False)
+    forwarder = StoreAndForward(acker, DiskSpool(str(tmp_path)))
+    start = time.monotonic()
+    for seq in range(50):
+        forwarder.publish("t/seq", str(seq))
+    assert time.monotonic() - start < 1.0  # Nessuna attesa di ACK_TIMEOUT a finestra piena
+    assert wait_until(lambda: len(received) == 50 and not forwarder.spool.pending)
+    assert received == list(range(50))  # Nell'ordine originale, senza duplicati
+    assert acker.flush(5)
+    forwarder.close()
+    acker.close()
+
+
+def test_no_conn_at_qos1_is_not_spooled(tmp_path):
+    client = OfflineClient()
+    acker = ReliablePublisher(client, qos=1, window=10, ack_timeout=10, block=False)
+    forwarder = StoreAndForward(acker, DiskSpool(str(tmp_path)))
+    forwarder.publish("t/seq", "1")  # Accodato da paho: inviato alla riconnessione
+    assert forwarder.spool.pending == 0 and forwarder.spooled == 0
+    assert acker.inflight == 1 and acker.failed == 0
+    forwarder.close()
+    acker.close()
+
+
+def test_no_conn_at_qos0_is_spooled(tmp_path):
+    forwarder = StoreAndForward(OfflineClient(), DiskSpool(str(tmp_path)))
+    forwarder.publish("t/seq", "1", qos=0)  # paho non accoda i messaggi QoS 0
+    assert forwarder.spool.pending == 1
+    forwarder.close()
+
+
+def test_disk_spool_fifo_across_segments(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_size=64)  # Pochi record per segmento
+    for seq in range(20):
+        spool.append("t/seq", str(seq))
+    assert spool.pending == 20 and len(spool._segments()) > 2
+    drained = []
+    while spool.pending:
+        batch = spool.read_batch(7)
+        drained += [int(payload) for _, payload in batch]
+        spool.commit(len(batch))
+    assert drained == list(range(20))
+    spool.close()
+
+
+def test_disk_spool_resumes_after_restart(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    for seq in range(10):
+        spool.append("t/seq", str(seq))
+    spool.commit(len(spool.read_batch(4)))  # Quattro messaggi inviati prima dell'interruzione
+    spool.close()
+    reopened = DiskSpool(str(tmp_path))
+    assert reopened.pending == 6
+    assert [int(payload) for _, payload in reopened.read_batch()] == list(range(4, 10))
+    reopened.close()
+
+
+def test_disk_spool_drops_torn_tail(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    for seq in range(5):
+        spool.append("t/seq", str(seq))
+    spool.close()
+    (segment,) = tmp_path.glob("spool-*.log")
+    size = segment.stat().st_size
+    with open(segment, 'ab') as file:  # Ultimo record scritto a metà (interruzione di corrente)
+        file.write(b"\x01\x02\x03\x04\x05\x00")
+    reopened = DiskSpool(str(tmp_path))
+    assert segment.stat().st_size == size  # Il record incompleto è stato tagliato
+    assert reopened.pending == 5
+    reopened.append("t/seq", "5")  # I nuovi record seguono quelli validi
+    assert [int(payload) for _, payload in reopened.read_batch()] == list(range(6))
+    reopened.close()
+
+
+def test_idle_spool_is_synced(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(spool.os, 'fsync', lambda fd: synced.append(fd))
+    disk_spool = DiskSpool(str(tmp_path), fsync_interval=10)
+    disk_spool.append("t/seq", "1")  # Ultimo messaggio prima di una pausa: resta nel buffer
+    segment = os.path.join(str(tmp_path), "spool-0000000001.log")
+    assert os.path.getsize(segment) == 0 and not synced
+    disk_spool.flush_due(time.monotonic() + 5)  # Intervallo non ancora passato
+    assert not synced
+    disk_spool.flush_due(time.monotonic() + 10)
+    assert os.path.getsize(segment) > 0 and len(synced) == 1
+    disk_spool.flush_due(time.monotonic() + 20)  # Niente di nuovo da scrivere
+    assert len(synced) == 1
+    disk_spool.close()
+
+
+def test_drainer_syncs_without_new_messages(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(spool.os, 'fsync', lambda fd: synced.append(fd))
+    client = OfflineClient()
+    client.is_connected = lambda: False  # Broker assente: il thread non svuota il log (né lo rilegge)
+    forwarder = StoreAndForward(client, DiskSpool(str(tmp_path), fsync_interval=0.05))
+    forwarder.publish("t/seq", "1")  # Ultimo messaggio prima di una pausa
+    segment = os.path.join(str(tmp_path), "spool-0000000001.log")
+    assert wait_until(lambda: synced and os.path.getsize(segment) > 0, timeout=2)  # Senza altri append né close()
+    forwarder.close()
@@ -0,0 +1,52 @@
+#########################################################################################
+# test_tsdb.py                                                                          #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Test dell'archivio delle serie temporali (tsdb.py): codifica dei timestamp e dei      #
+# valori, query e aggregati, anche con blocchi scritti fuori ordine.                    #
+#########################################################################################
+
+# Importa le librerie necessarie
+from tsdb import TimeSeriesStore, encode_timestamps, decode_timestamps, encode_floats, decode_floats
+from sensor_parser import SensorReading
+
+
+def reading(value):
+    """Lettura con tutti i campi ricavati da 'value'"""
+    return SensorReading(value, value / 2, value * 2, value / 3, value * 3)
+
+
+def test_gorilla_round_trip():
+    timestamps = [1_700_000_000_000 + i * 1000 for i in range(50)] + [1_700_000_100_000, 1_700_000_099_000, 1_800_000_000_000]
+    assert decode_timestamps(encode_timestamps(timestamps), len(timestamps)) == timestamps
+    values = [23.0, 23.0, 23.5, -1.25, 0.0, float('inf'), 1e-300, 45.1, 45.1, 1e300]
+    assert decode_floats(encode_floats(values), len(values)) == values
+
+
+def test_query_and_aggregate_in_order(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), chunk_size=10)
+    for i in range(35):  # 3 blocchi su disco e 5 campioni in memoria
+        store.append("dev1", 1000.0 + i, reading(float(i)))
+    result = store.query("dev1", 1005, 1024, fields=('humidity',))
+    assert result['ts'] == [1000.0 + i for i in range(5, 25)]
+    assert result['humidity'] == [float(i) for i in range(5, 25)]
+    stats = store.aggregate("dev1", 1000, 1034, 'humidity')
+    assert stats == {'count': 35, 'min': 0.0, 'max': 34.0, 'mean': 17.0}
+
+
+def test_out_of_order_chunk(tmp_path):
+    """Un blocco precedente ai blocchi già scritti (es. riproduzione di una cattura) resta interrogabile"""
+    store = TimeSeriesStore(str(tmp_path), chunk_size=10)
+    for i in range(40):  # Dati in tempo reale
+        store.append("dev1", 2000.0 + i, reading(100.0))
+    for i in range(30):  # Dati recuperati, più vecchi e con un campione fuori ordine nel blocco
+        store.append("dev1", 1029.0 - i, reading(float(i)))
+    store.flush()
+    for reopened in (store, TimeSeriesStore(str(tmp_path), chunk_size=10)):  # Anche dopo aver riletto l'indice
+        assert len(reopened.query("dev1", 1000, 1029)['ts']) == 30
+        assert reopened.aggregate("dev1", 1000, 1029, 'humidity')['count'] == 30
+        assert reopened.aggregate("dev1", 1010, 1019, 'humidity') == {'count': 10, 'min': 10.0, 'max': 19.0, 'mean': 14.5}
+        assert reopened.aggregate("dev1", 0, 3000, 'humidity')['count'] == 70
@@ -0,0 +1,413 @@
+#########################################################################################
+# tsdb.py                                                                               #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Archivio locale delle serie temporali (una serie per dispositivo), compresso a        #
+# colonne come nel formato Gorilla:                                                     #
+# - i campioni sono raggruppati in blocchi ("chunk") di al più CHUNK_SIZE campioni;     #
+# - i timestamp (millisecondi) sono codificati come differenza delle differenze:        #
+#   con un periodo di campionamento regolare bastano 1-2 bit per campione;              #
+# - ogni campo è codificato con lo XOR rispetto al valore precedente: valori uguali     #
+#   costano 1 bit, valori vicini pochi bit;                                             #
+# - ogni colonna del blocco è codificata separatamente (si decodifica solo ciò che      #
+#   serve alla query).                                                                  #
+# Per ogni serie ci sono due file in sola aggiunta:                                     #
+#   <serie>.dat  blocchi compressi                                                      #
+#   <serie>.idx  indice a record fissi: posizione, numero di campioni, tempo minimo e   #
+#                massimo, e per ogni campo minimo, massimo e somma                      #
+# Le query leggono solo i blocchi nell'intervallo richiesto; gli aggregati (conteggio,  #
+# minimo, massimo, media) dei blocchi interamente compresi usano solo l'indice.         #
+# I blocchi possono arrivare fuori ordine (es. riproduzione di una cattura): l'indice   #
+# registra il tempo minimo e massimo di ogni blocco e, se i blocchi si sovrappongono,   #
+# la ricerca li controlla tutti invece di fermarsi al primo blocco successivo.          #
+#                                                                                       #
+# Uso da riga di comando:                                                               #
+#   python tsdb.py tsdb                     elenca le serie                             #
+#   python tsdb.py tsdb dht11_dev1 --hours 24   aggregati delle ultime 24 ore           #
+#########################################################################################
+
+# Importa le librerie necessarie
+import os  # Importa la libreria os per file e cartelle
+import time  # Importa la libreria time per l'età dei blocchi e le query da riga di comando
+import bisect  # Importa la libreria bisect per la ricerca dei blocchi nell'indice
+import struct  # Importa la libreria struct per l'indice e la conversione dei float
+import argparse  # Importa la libreria argparse per le opzioni da riga di comando
+import threading  # Importa la libreria threading per la scrittura da più thread
+from sensor_parser import SensorReading  # Importa il record con i cinque valori
+
+
+# Valori di default
+CHUNK_SIZE = 1024  # Campioni massimi per blocco
+FLUSH_INTERVAL = 60.0  # Secondi massimi di un blocco in memoria prima di scriverlo su disco
+FIELDS = SensorReading._fields  # Campi memorizzati per ogni campione
+
+CHUNK_HEADER = struct.Struct('<I')  # Numero di campioni del blocco
+COLUMN_SIZE = struct.Struct('<I')  # Lunghezza in byte di ogni colonna
+FLOAT_BITS = struct.Struct('<d')  # Per convertire un float nei suoi 64 bit
+INT_BITS = struct.Struct('<Q')
+
+
+def index_record(fields):
+    """Struttura di un record dell'indice: posizione, lunghezza, campioni, tempi e (min, max, somma) per campo"""
+    return struct.Struct('<QII2d' + '3d' * len(fields))
+
+
+# Classe che scrive bit in un bytearray
+class BitWriter:
+    """Accoda valori di 'n' bit, dal più significativo"""
+
+    def __init__(self):
+        self.data = bytearray()  # Byte completi
+        self._acc = 0  # Bit in attesa di formare un byte
+        self._bits = 0  # Numero di bit in attesa
+
+    def write(self, value, bits):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:  # Sposta i byte completi
+            self._bits -= 8
+            self.data.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1  # Tiene solo i bit non ancora scritti
+
+    def getvalue(self):
+        """Ritorna i byte, con l'ultimo completato da zeri"""
+        if self._bits:
+            return bytes(self.data) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.data)
+
+
+# Classe che legge bit da un oggetto bytes
+class BitReader:
+    """Legge valori di 'n' bit, dal più significativo"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0  # Posizione in bit
+
+    def read(self, bits):
+        start, end = self.pos >> 3, (self.pos + bits + 7) >> 3  # Byte che contengono i bit richiesti
+        chunk = int.from_bytes(self.data[start:end], 'big')
+        shift = (end << 3) - self.pos - bits  # Bit in eccesso a destra
+        self.pos += bits
+        return (chunk >> shift) & ((1 << bits) - 1)
+
+
+# Codifica dei timestamp: differenza delle differenze (delta-of-delta)
+# (limite, bit di prefisso, valore del prefisso, bit del valore); oltre: prefisso 1111 e 64 bit
+DOD_CLASSES = ((64, 2, 0b10, 7), (256, 3, 0b110, 9), (2048, 4, 0b1110, 12))
+DOD_BITS = (7, 9, 12, 64)  # Bit del valore per 1, 2, 3 o 4 '1' nel prefisso
+
+
+def encode_timestamps(timestamps):
+    """Codifica una lista di timestamp interi (ms)"""
+    writer = BitWriter()
+    writer.write(timestamps[0], 64)  # Primo timestamp per intero
+    previous, delta = timestamps[0], 0
+    for timestamp in timestamps[1:]:
+        new_delta = timestamp - previous
+        dod = new_delta - delta  # Differenza delle differenze
+        previous, delta = timestamp, new_delta
+        if dod == 0:  # Periodo invariato: un solo bit
+            writer.write(0, 1)
+            continue
+        for limit, prefix_bits, prefix, bits in DOD_CLASSES:
+            if -limit <= dod < limit:
+                writer.write(prefix, prefix_bits)
+                writer.write(dod, bits)  # Complemento a due su 'bits' bit
+                break
+        else:  # Salto grande (pausa, cambio d'ora): valore intero
+            writer.write(0b1111, 4)
+            writer.write(dod, 64)
+    return writer.getvalue()
+
+
+def decode_timestamps(data, count):
+    """Decodifica 'count' timestamp interi (ms)"""
+    reader = BitReader(data)
+    timestamp = reader.read(64)
+    timestamps = [timestamp]
+    delta = 0
+    for _ in range(count - 1):
+        if reader.read(1) == 0:
+            dod = 0
+        else:
+            ones = 1  # Conta gli '1' del prefisso (al massimo 4)
+            while ones < 4 and reader.read(1):
+                ones += 1
+            bits = DOD_BITS[ones - 1]
+            dod = reader.read(bits)
+            if dod >= 1 << (bits - 1):  # Complemento a due
+                dod -= 1 << bits
+        delta += dod
+        timestamp += delta
+        timestamps.append(timestamp)
+    return timestamps
+
+
+def encode_floats(values):
+    """Codifica una lista di float con lo XOR rispetto al valore precedente"""
+    writer = BitWriter()
+    previous = INT_BITS.unpack(FLOAT_BITS.pack(values[0]))[0]
+    writer.write(previous, 64)  # Primo valore per intero
+    leading, trailing = 65, 0  # Finestra dei bit significativi del valore precedente (nessuna)
+    for value in values[1:]:
+        bits = INT_BITS.unpack(FLOAT_BITS.pack(value))[0]
+        xor = bits ^ previous
+        previous = bits
+        if xor == 0:  # Valore ripetuto: un solo bit
+            writer.write(0, 1)
+            continue
+        new_leading = min(64 - xor.bit_length(), 31)  # Zeri iniziali (al massimo 31, 5 bit)
+        new_trailing = (xor & -xor).bit_length() - 1  # Zeri finali
+        if new_leading >= leading and new_trailing >= trailing:  # Sta nella finestra precedente
+            writer.write(0b10, 2)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:  # Nuova finestra: zeri iniziali (5 bit), lunghezza (6 bit, 64 = 0), bit significativi
+            leading, trailing = new_leading, new_trailing
+            length = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(length & 63, 6)
+            writer.write(xor >> trailing, length)
+    return writer.getvalue()
+
+
+def decode_floats(data, count):
+    """Decodifica 'count' float"""
+    reader = BitReader(data)
+    previous = reader.read(64)
+    values = [FLOAT_BITS.unpack(INT_BITS.pack(previous))[0]]
+    leading = trailing = 0
+    for _ in range(count - 1):
+        if reader.read(1):  # Valore diverso dal precedente
+            if reader.read(1):  # Nuova finestra
+                leading = reader.read(5)
+                length = reader.read(6) or 64
+                trailing = 64 - leading - length
+            previous ^= reader.read(64 - leading - trailing) << trailing
+        values.append(FLOAT_BITS.unpack(INT_BITS.pack(previous))[0])
+    return values
+
+
+# Classe che gestisce una serie (un dispositivo)
+class Series:
+    """File dei blocchi e indice di una serie, più il blocco in costruzione"""
+
+    def __init__(self, directory, name, fields=FIELDS):
+        self.name = name
+        self.fields = tuple(fields)
+        self.record = index_record(self.fields)  # Struttura dell'indice
+        self.data_path = os.path.join(directory, f"{name}.dat")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.index = self._load_index()  # Un elemento per blocco scritto
+        self.t_max = [entry[4] for entry in self.index]  # Tempo massimo dei blocchi (per bisect)
+        self.ordered = all(a[4] <= b[3] for a, b in zip(self.index, self.index[1:]))  # Blocchi in ordine di tempo, senza sovrapposizioni
+        self._ts = []  # Timestamp (ms) del blocco in costruzione
+        self._columns = [[] for _ in self.fields]  # Valori del blocco in costruzione
+        self._started = 0.0  # Istante (monotono) del primo campione del blocco
+
+    def _load_index(self):
+        """Legge l'indice; scarta un eventuale record incompleto e i dati senza indice"""
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'rb') as file:
+            raw = file.read()
+        count = len(raw) // self.record.size
+        index = [self.record.unpack_from(raw, i * self.record.size) for i in range(count)]
+        end = index[-1][0] + index[-1][1] if index else 0  # Fine dell'ultimo blocco indicizzato
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > end:  # Blocco scritto senza indice
+            with open(self.data_path, 'r+b') as file:
+                file.truncate(end)
+        if len(raw) > count * self.record.size:
+            with open(self.index_path, 'r+b') as file:
+                file.truncate(count * self.record.size)
+        return index
+
+    def append(self, timestamp, values):
+        if not self._ts:
+            self._started = time.monotonic()
+        self._ts.append(int(round(timestamp * 1000)))
+        for column, value in zip(self._columns, values):
+            column.append(float(value))
+
+    def due(self, chunk_size, flush_interval):
+        """True se il blocco in costruzione va scritto su disco"""
+        return len(self._ts) >= chunk_size or (self._ts and time.monotonic() - self._started >= flush_interval)
+
+    def flush(self):
+        """Comprime il blocco in costruzione e lo aggiunge ai file"""
+        if not self._ts:
+            return
+        streams = [encode_timestamps(self._ts)] + [encode_floats(column) for column in self._columns]
+        blob = CHUNK_HEADER.pack(len(self._ts)) + b"".join(COLUMN_SIZE.pack(len(stream)) for stream in streams) + b"".join(streams)
+        stats = []
+        for column in self._columns:
+            stats += [min(column), max(column), sum(column)]
+        with open(self.data_path, 'ab') as file:
+            offset = file.tell()
+            file.write(blob)
+        # Tempo minimo e massimo del blocco (i campioni possono arrivare fuori ordine, es. da una riproduzione)
+        entry = (offset, len(blob), len(self._ts), min(self._ts) / 1000, max(self._ts) / 1000, *stats)
+        with open(self.index_path, 'ab') as file:  # L'indice è scritto dopo i dati
+            file.write(self.record.pack(*entry))
+        if self.index and entry[3] < self.index[-1][4]:  # Blocco che si sovrappone o precede i blocchi già scritti
+            self.ordered = False
+        self.index.append(entry)
+        self.t_max.append(entry[4])
+        self._ts = []
+        self._columns = [[] for _ in self.fields]
+
+    def read_chunk(self, entry, fields):
+        """Decodifica le colonne richieste di un blocco: ritorna (timestamp, {campo: valori})"""
+        with open(self.data_path, 'rb') as file:
+            file.seek(entry[0])
+            blob = file.read(entry[1])
+        count = CHUNK_HEADER.unpack_from(blob)[0]
+        sizes = [COLUMN_SIZE.unpack_from(blob, CHUNK_HEADER.size + COLUMN_SIZE.size * i)[0] for i in range(len(self.fields) + 1)]
+        start = CHUNK_HEADER.size + COLUMN_SIZE.size * len(sizes)
+        offsets = [start + sum(sizes[:i]) for i in range(len(sizes))]
+        timestamps = [t / 1000 for t in decode_timestamps(blob[offsets[0]:offsets[0] + sizes[0]], count)]
+        columns = {}
+        for field in fields:  # Solo le colonne richieste
+            i = self.fields.index(field) + 1
+            columns[field] = decode_floats(blob[offsets[i]:offsets[i] + sizes[i]], count)
+        return timestamps, columns
+
+    def chunks(self, t0, t1):
+        """Blocchi scritti che si sovrappongono a [t0, t1]"""
+        if not self.ordered:  # Blocchi fuori ordine: si controllano tutti
+            for entry in self.index:
+                if entry[3] <= t1 and entry[4] >= t0:
+                    yield entry
+            return
+        first = bisect.bisect_left(self.t_max, t0)  # Primo blocco che finisce dopo t0
+        for entry in self.index[first:]:
+            if entry[3] > t1:  # Il blocco inizia dopo t1 (i blocchi sono in ordine di tempo)
+                break
+            yield entry
+
+    def pending(self, fields):
+        """Blocco in costruzione, nello stesso formato di read_chunk()"""
+        return [t / 1000 for t in self._ts], {field: list(self._columns[self.fields.index(field)]) for field in fields}
+
+
+# Archivio con una serie per dispositivo
+class TimeSeriesStore:
+    """Scrittura dei campioni e query per intervalli e aggregati"""
+
+    def __init__(self, directory, chunk_size=CHUNK_SIZE, flush_interval=FLUSH_INTERVAL, fields=FIELDS):
+        self.directory = directory
+        self.chunk_size = chunk_size  # Campioni per blocco
+        self.flush_interval = flush_interval  # Età massima di un blocco in memoria
+        self.fields = tuple(fields)
+        self._lock = threading.Lock()  # Più dispositivi scrivono dallo stesso processo
+        self._series = {}  # Serie aperte
+        self.samples = 0  # Campioni scritti in questa esecuzione
+        os.makedirs(directory, exist_ok=True)
+
+    def _get(self, name):
+        name = name.replace('/', '_')  # Il nome della serie è anche il nome del file
+        series = self._series.get(name)
+        if series is None:
+            series = self._series[name] = Series(self.directory, name, self.fields)
+        return series
+
+    def series_names(self):
+        """Nomi delle serie presenti su disco o in memoria"""
+        names = {name[:-4] for name in os.listdir(self.directory) if name.endswith('.idx')}
+        return sorted(names | set(self._series))
+
+    def append(self, name, timestamp, reading):
+        """Aggiunge un campione alla serie 'name'"""
+        with self._lock:
+            series = self._get(name)
+            series.append(timestamp, reading)
+            self.samples += 1
+            if series.due(self.chunk_size, self.flush_interval):
+                series.flush()
+
+    def flush(self):
+        """Scrive su disco tutti i blocchi in costruzione"""
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+
+    def flush_due(self):
+        """Scrive i blocchi più vecchi di flush_interval (da chiamare periodicamente)"""
+        with self._lock:
+            for series in self._series.values():
+                if series.due(self.chunk_size, self.flush_interval):
+                    series.flush()
+
+    def query(self, name, t0, t1, fields=None):
+        """Campioni tra t0 e t1: ritorna {'ts': [...], campo: [...]}"""
+        fields = tuple(fields or self.fields)
+        result = {'ts': []}
+        result.update((field, []) for field in fields)
+        with self._lock:
+            series = self._get(name)
+            parts = [series.read_chunk(entry, fields) for entry in series.chunks(t0, t1)]
+            parts.append(series.pending(fields))
+        for timestamps, columns in parts:
+            selected = [i for i, t in enumerate(timestamps) if t0 <= t <= t1]
+            result['ts'] += [timestamps[i] for i in selected]
+            for field in fields:
+                result[field] += [columns[field][i] for i in selected]
+        return result
+
+    def aggregate(self, name, t0, t1, field):
+        """Conteggio, minimo, massimo e media di un campo tra t0 e t1"""
+        column = self.fields.index(field)
+        count, low, high, total = 0, float('inf'), float('-inf'), 0.0
+        partial = []  # Valori dei blocchi compresi solo in parte
+        with self._lock:
+            series = self._get(name)
+            for entry in series.chunks(t0, t1):
+                if t0 <= entry[3] and entry[4] <= t1:  # Blocco interamente compreso: basta l'indice
+                    chunk_low, chunk_high, chunk_sum = entry[5 + 3 * column:8 + 3 * column]
+                    count += entry[2]
+                    low, high, total = min(low, chunk_low), max(high, chunk_high), total + chunk_sum
+                else:  # Blocco ai bordi dell'intervallo: va decodificato
+                    partial.append(series.read_chunk(entry, (field,)))
+            partial.append(series.pending((field,)))
+        for timestamps, columns in partial:
+            values = [value for t, value in zip(timestamps, columns[field]) if t0 <= t <= t1]
+            if values:
+                count += len(values)
+                low, high, total = min(low, min(values)), max(high, max(values)), total + sum(values)
+        if not count:
+            return {'count': 0, 'min': None, 'max': None, 'mean': None}
+        return {'count': count, 'min': low, 'max': high, 'mean': total / count}
+
+    def close(self):
+        self.flush()
+
+
+# Funzione principale: elenca le serie o stampa gli aggregati recenti
+def main():
+    arg_parser = argparse.ArgumentParser(description="Interroga l'archivio locale delle serie temporali")
+    arg_parser.add_argument("directory", help="cartella dell'archivio (TSDB_DIR)")
+    arg_parser.add_argument("series", nargs='?', help="serie da interrogare (senza: elenca le serie)")
+    arg_parser.add_argument("--hours", type=float, default=24, help="ore da considerare fino ad ora")
+    args = arg_parser.parse_args()
+    store = TimeSeriesStore(args.directory)
+    if not args.series:
+        for name in store.series_names():
+            print(name)
+        return
+    t1 = time.time()
+    t0 = t1 - args.hours * 3600
+    for field in store.fields:
+        stats = store.aggregate(args.series, t0, t1, field)
+        if stats['count']:
+            print(f"{field}: {stats['count']} campioni, min {stats['min']:.2f}, max {stats['max']:.2f}, media {stats['mean']:.2f}")
+        else:
+            print(f"{field}: nessun campione")
+
+
+# Avvio del programma
+if __name__ == "__main__":
+    main()  # Chiama la funzione principale per avviare il programma
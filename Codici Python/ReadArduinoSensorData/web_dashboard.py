@@ -0,0 +1,172 @@
+#########################################################################################
+# web_dashboard.py                                                                      #
+# author: Pietro Boccadoro                                                              #
+# email: pieroboccadoro13[at]gmail[dot]com                                              #
+# date: 2025-02-01                                                                      #
+# version: 0.1                                                                          #
+#                                                                                       #
+# Cruscotto web senza interfaccia grafica locale: il gateway serve una pagina HTTP      #
+# con i grafici in tempo reale, aggiornata con server-sent events (SSE).                #
+# Aprire http://<indirizzo del gateway>:<DASHBOARD_PORT>/ da uno o più browser.         #
+#                                                                                       #
+# Ogni campione viene codificato una sola volta come evento SSE e scritto in un buffer  #
+# circolare condiviso: il lavoro del gateway per campione è costante, qualunque sia il  #
+# numero di browser collegati. Ogni browser ha un proprio thread che invia gli eventi   #
+# nuovi a partire dall'ultimo ricevuto (con Last-Event-ID anche dopo una riconnessione);#
+# un browser troppo lento perde gli eventi più vecchi invece di rallentare gli altri.   #
+#                                                                                       #
+# Percorsi: /          pagina con i grafici (nessuna libreria esterna)                  #
+#           /events    flusso SSE dei campioni                                          #
+#########################################################################################
+
+# Importa le librerie necessarie
+import json  # Importa la libreria json per codificare i campioni
+import logging  # Importa la libreria logging per i messaggi
+import time  # Importa la libreria time per i timestamp
+import threading  # Importa la libreria threading per il server e la sincronizzazione
+from mqtt_publisher import sample_to_dict  # Importa la conversione di un campione in dizionario
+
+
+# Valori di default
+DASHBOARD_PORT = 8080  # Porta HTTP del cruscotto
+EVENT_BUFFER = 1000  # Eventi conservati per i browser che si collegano o restano indietro
+KEEPALIVE = 15  # Secondi massimi senza eventi prima di un commento di keepalive
+
+
+# Pagina HTML con quattro grafici disegnati su canvas
+PAGE = """<!DOCTYPE html>
+<html lang="it"><head><meta charset="utf-8"><title>Dati Sensore in Tempo Reale</title>
+<style>body{font-family:sans-serif;margin:1em}#grid{display:grid;grid-template-columns:1fr 1fr;gap:1em}
+canvas{width:100%;height:260px;border:1px solid #ccc}h3{margin:.2em 0}</style></head>
+<body><h2>Dati Sensore in Tempo Reale</h2><div id="stato">connessione...</div><div id="grid"></div>
+<script>
+const PANELS=[["humidity","Umidità (%)"],["temp_c","Temperatura (°C)"],["temp_f","Temperatura (°F)"],["idc_c","IdC (°C)"]];
+const COLORS=["blue","red","orange","green","purple","brown","teal","black"];
+const MAX_POINTS=600, series={}, canvases={};
+for(const [f,t] of PANELS){const d=document.createElement("div");d.innerHTML="<h3>"+t+"</h3>";
+ const c=document.createElement("canvas");d.appendChild(c);document.getElementById("grid").appendChild(d);canvases[f]=c;}
+let dirty=false;
+function draw(){dirty=false;const devs=Object.keys(series);
+ for(const [f] of PANELS){const c=canvases[f],g=c.getContext("2d");c.width=c.clientWidth;c.height=c.clientHeight;
+  let lo=Infinity,hi=-Infinity;for(const d of devs)for(const s of series[d]){lo=Math.min(lo,s[f]);hi=Math.max(hi,s[f]);}
+  if(lo===Infinity)continue;if(hi-lo<1){lo-=.5;hi+=.5;}
+  g.fillStyle="#000";g.fillText(hi.toFixed(2),2,10);g.fillText(lo.toFixed(2),2,c.height-2);
+  devs.forEach((d,i)=>{const pts=series[d];g.strokeStyle=COLORS[i%COLORS.length];g.beginPath();
+   pts.forEach((s,j)=>{const x=j*c.width/(MAX_POINTS-1),y=c.height-(s[f]-lo)/(hi-lo)*c.height;j?g.lineTo(x,y):g.moveTo(x,y);});
+   g.stroke();g.fillStyle=g.strokeStyle;g.fillText(d,c.width-120,12+12*i);});}}
+const es=new EventSource("events");
+es.onopen=()=>document.getElementById("stato").textContent="collegato";
+es.onerror=()=>document.getElementById("stato").textContent="riconnessione...";
+es.addEventListener("sample",e=>{const s=JSON.parse(e.data);(series[s.device]=series[s.device]||[]).push(s);
+ if(series[s.device].length>MAX_POINTS)series[s.device].shift();if(!dirty){dirty=true;requestAnimationFrame(draw);}});
+</script></body></html>""".encode('utf-8')
+
+
+# Classe con il buffer circolare degli eventi condiviso da tutti i browser
+class EventBroadcaster:
+    """Codifica ogni campione una volta e lo rende disponibile a tutti i client"""
+
+    def __init__(self, size=EVENT_BUFFER):
+        self.size = size  # Eventi conservati
+        self._events = [b""] * size  # Buffer circolare: l'evento 'seq' è in posizione seq % size
+        self._cond = threading.Condition()  # Sveglia i client quando arriva un evento
+        self.seq = 0  # Numero dell'ultimo evento (0 = nessuno)
+        self.running = True
+
+    def add_sample(self, device, timestamp, reading):
+        """Aggiunge un campione: costo costante, indipendente dal numero di client"""
+        sample = sample_to_dict(timestamp, reading)
+        sample['device'] = device
+        with self._cond:
+            self.seq += 1
+            self._events[self.seq % self.size] = f"id: {self.seq}\nevent: sample\ndata: {json.dumps(sample)}\n\n".encode('utf-8')
+            self._cond.notify_all()
+
+    def wait_events(self, last_seq, timeout=KEEPALIVE):
+        """Attende eventi successivi a 'last_seq'; ritorna (nuovo ultimo numero, byte da inviare)"""
+        with self._cond:
+            if last_seq > self.seq:  # Numero di una sessione precedente del gateway: riparte da capo
+                last_seq = 0
+            self._cond.wait_for(lambda: self.seq > last_seq or not self.running, timeout)
+            first = max(last_seq + 1, self.seq - self.size + 1)  # I più vecchi potrebbero essere già sovrascritti
+            chunk = b"".join(self._events[seq % self.size] for seq in range(first, self.seq + 1))
+            return self.seq, chunk
+
+    def close(self):
+        """Sveglia e termina tutti i client"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+
+# Gestore delle richieste HTTP (unito a BaseHTTPRequestHandler da DashboardServer)
+class DashboardHandler:
+    """Serve la pagina e il flusso SSE"""
+
+    broadcaster = None  # Impostato da DashboardServer
+
+    def do_GET(self):
+        if self.path in ('/', '/index.html'):
+            self._send(200, 'text/html; charset=utf-8', PAGE)
+        elif self.path == '/events':
+            self._stream()
+        else:
+            self._send(404, 'text/plain', b"not found")
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        """Invia gli eventi finché il browser resta collegato"""
+        broadcaster = self.broadcaster
+        try:
+            last_seq = int(self.headers.get('Last-Event-ID', 0))  # Riprende dopo una riconnessione
+        except ValueError:
+            last_seq = 0
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while broadcaster.running:
+                last_seq, chunk = broadcaster.wait_events(last_seq)
+                self.wfile.write(chunk or b": keepalive\n\n")  # Commento SSE se non ci sono eventi
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):  # Il browser ha chiuso la pagina
+            pass
+
+    def log_message(self, format, *args):
+        pass  # Nessuna riga di log per ogni richiesta
+
+
+# Server HTTP del cruscotto in un thread separato
+class DashboardServer:
+    """Avvia il server HTTP e riceve i campioni da pubblicare"""
+
+    def __init__(self, port=DASHBOARD_PORT, host='', buffer_size=EVENT_BUFFER):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # Importato qui: solo se il cruscotto è attivo
+        self.broadcaster = EventBroadcaster(buffer_size)  # Eventi condivisi
+        handler = type('Handler', (DashboardHandler, BaseHTTPRequestHandler), {'broadcaster': self.broadcaster})  # Gestore legato a questo server
+        self.server = ThreadingHTTPServer((host, port), handler)  # Un thread per ogni browser
+        self.server.daemon_threads = True  # I thread dei browser non bloccano la chiusura
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logging.getLogger(__name__).info("Cruscotto web su http://localhost:%d/", self.server.server_address[1])
+
+    def add_sample(self, device, reading, arrival=None):
+        """Pubblica una lettura; 'arrival' è l'istante monotono di arrivo dalla seriale"""
+        timestamp = time.time()  # Orario attuale (epoch)
+        if arrival is not None:  # Riporta il timestamp all'istante di arrivo
+            timestamp -= time.monotonic() - arrival
+        self.broadcaster.add_sample(device, timestamp, reading)
+
+    def stop(self):
+        self.broadcaster.close()  # Termina i flussi SSE aperti
+        self.server.shutdown()  # Ferma serve_forever()
+        self.server.server_close()